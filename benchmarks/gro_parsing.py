@@ -0,0 +1,77 @@
+"""Micro-benchmark of the GRO coordinates parsing.
+
+Compare the per-atom Python loop formerly used by GroReader.read_frame against the fixed-width parser.
+
+Usage:
+    python benchmarks/gro_parsing.py [gro_file] [n_repeats]
+"""
+
+import os
+import sys
+import timeit
+
+import numpy as np
+
+from waterstay.extensions.parse_coordinates import parse_coordinates
+
+
+def parse_with_loop(data, n_atoms, coords_size):
+    """The reference implementation: slice each record and call float() on each field.
+    """
+
+    coords = np.empty((n_atoms, 3), dtype=np.float64)
+
+    for i in range(n_atoms):
+        start = i*coords_size
+        end = start + coords_size
+        line = data[start:end]
+        x = float(line[20:28])
+        y = float(line[28:36])
+        z = float(line[36:44])
+        coords[i, :] = [x, y, z]
+
+    return coords
+
+
+def parse_with_kernel(data, n_atoms, coords_size):
+    """The fixed-width parser used by GroReader.read_frame.
+    """
+
+    coords = np.empty((n_atoms, 3), dtype=np.float64)
+
+    parse_coordinates(data.encode('ascii'), coords_size, 20, 8, coords)
+
+    return coords
+
+
+def main():
+
+    default_file = os.path.join(os.path.dirname(__file__), os.pardir, 'data', 'frames.gro')
+    gro_file = sys.argv[1] if len(sys.argv) > 1 else default_file
+    n_repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    # Extract the atom records of the first frame
+    with open(gro_file, 'r') as fin:
+        fin.readline()
+        n_atoms = int(fin.readline())
+        lines = [fin.readline() for _ in range(n_atoms)]
+    data = ''.join(lines)
+    coords_size = len(lines[0])
+
+    reference = parse_with_loop(data, n_atoms, coords_size)
+    if not np.array_equal(reference, parse_with_kernel(data, n_atoms, coords_size)):
+        raise AssertionError('The fixed-width parser and the reference loop disagree')
+
+    results = {}
+    for name, func in [('python loop', parse_with_loop), ('fixed-width kernel', parse_with_kernel)]:
+        timer = timeit.Timer(lambda: func(data, n_atoms, coords_size))
+        results[name] = min(timer.repeat(repeat=n_repeats, number=1))
+
+    print('{} atoms per frame'.format(n_atoms))
+    for name, elapsed in results.items():
+        print('{:20s} {:10.3f} ms/frame'.format(name, 1000.0*elapsed))
+    print('speedup: {:.1f}x'.format(results['python loop']/results['fixed-width kernel']))
+
+
+if __name__ == '__main__':
+    main()
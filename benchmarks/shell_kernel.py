@@ -0,0 +1,61 @@
+"""Benchmark of the thread scaling of the shell occupancy kernel.
+
+A block of random frames is scanned by atoms_in_shell_batch with an increasing number of threads. The occupancies must
+not depend on the number of threads and must match the ones computed frame by frame with atoms_in_shell.
+
+Usage:
+    python benchmarks/shell_kernel.py [n_molecules] [n_frames] [n_repeats]
+"""
+
+import sys
+import timeit
+
+import numpy as np
+
+from waterstay.extensions.atoms_in_shell import atoms_in_shell, atoms_in_shell_batch, max_threads
+
+
+def main():
+
+    n_molecules = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    n_frames = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    n_repeats = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+
+    # Water-like molecules of three atoms whose first atom is the atomic center
+    n_atoms = 3*n_molecules + 1
+    box_size = (30.0*n_molecules)**(1.0/3.0)
+
+    random = np.random.RandomState(0)
+    coords = random.uniform(0.0, box_size, (n_frames, n_atoms, 3))
+    cells = np.tile(box_size*np.eye(3), (n_frames, 1, 1))
+    rcells = np.linalg.inv(cells)
+    offsets = np.arange(0, 3*n_molecules + 1, 3, dtype=np.int32)
+    atom_indices = np.arange(1, n_atoms, dtype=np.int32)
+    radius = 0.25*box_size
+
+    reference = np.empty((n_frames, n_molecules), dtype=np.int32)
+    for frame in range(n_frames):
+        atoms_in_shell(coords[frame], cells[frame], rcells[frame], offsets, atom_indices, 0, radius, reference[frame])
+
+    print('{} frames of {} molecules, {} threads available'.format(n_frames, n_molecules, max_threads()))
+
+    thread_counts = sorted(set([1, 2, 4, 8, 16, 32, 64, max_threads()]))
+    thread_counts = [n for n in thread_counts if n <= max_threads()] or [1]
+
+    occupancies = np.empty((n_frames, n_molecules), dtype=np.int32)
+    serial = None
+    for num_threads in thread_counts:
+        atoms_in_shell_batch(coords, cells, rcells, offsets, atom_indices, 0, radius, occupancies, num_threads)
+        if not np.array_equal(occupancies, reference):
+            raise AssertionError('The occupancies computed with {} threads are wrong'.format(num_threads))
+
+        timer = timeit.Timer(lambda: atoms_in_shell_batch(coords, cells, rcells, offsets, atom_indices, 0, radius,
+                                                          occupancies, num_threads))
+        elapsed = min(timer.repeat(repeat=n_repeats, number=1))
+        serial = elapsed if serial is None else serial
+        print('{:3d} threads {:10.3f} ms/frame   speedup {:6.1f}x   efficiency {:5.1f}%'.format(
+            num_threads, 1000.0*elapsed/n_frames, serial/elapsed, 100.0*serial/elapsed/num_threads))
+
+
+if __name__ == '__main__':
+    main()
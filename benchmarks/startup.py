@@ -0,0 +1,85 @@
+"""Benchmark of the startup cost of the trajectory readers.
+
+Each scenario is run in a fresh interpreter and reports its wall time and whether MDAnalysis got imported:
+    - importing waterstay.readers
+    - opening a trajectory through the registry (the reader module is imported at that point)
+    - importing all the builtin reader modules up front, as the registry used to do
+
+Usage:
+    python benchmarks/startup.py [trajectory_file] [n_repeats]
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+CHILD_TEMPLATE = '''
+import json
+import sys
+import time
+
+start = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - start
+
+print(json.dumps({{'elapsed': elapsed, 'mdanalysis': 'MDAnalysis' in sys.modules}}))
+'''
+
+IMPORT_REGISTRY = 'import waterstay.readers'
+
+OPEN_TRAJECTORY = '''
+from waterstay.readers import find_reader
+reader = find_reader({filename!r})({filename!r})
+'''
+
+IMPORT_ALL_READERS = '''
+import importlib
+from waterstay.readers.reader_registry import BUILTIN_READERS
+for path in set(BUILTIN_READERS.values()):
+    importlib.import_module(path.split(':')[0])
+'''
+
+
+def run(code, n_repeats):
+    """Run a snippet in fresh interpreters and return its best time.
+
+    Args:
+        code (str): the snippet
+        n_repeats (int): the number of runs
+
+    Returns:
+        2-tuple: the best wall time in seconds and whether MDAnalysis was imported
+    """
+
+    best = None
+    mdanalysis = False
+    for _ in range(n_repeats):
+        output = subprocess.run([sys.executable, '-c', CHILD_TEMPLATE.format(code=code)],
+                                check=True,
+                                stdout=subprocess.PIPE,
+                                universal_newlines=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        best = result['elapsed'] if best is None else min(best, result['elapsed'])
+        mdanalysis |= result['mdanalysis']
+
+    return best, mdanalysis
+
+
+def main():
+
+    default_file = os.path.join(os.path.dirname(__file__), os.pardir, 'data', 'frames.gro')
+    filename = os.path.abspath(sys.argv[1] if len(sys.argv) > 1 else default_file)
+    n_repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    scenarios = [('import waterstay.readers', IMPORT_REGISTRY),
+                 ('open {}'.format(os.path.basename(filename)), OPEN_TRAJECTORY.format(filename=filename)),
+                 ('import all readers', IMPORT_ALL_READERS)]
+
+    for name, code in scenarios:
+        elapsed, mdanalysis = run(code, n_repeats)
+        print('{:30s} {:10.3f} s   MDAnalysis loaded: {}'.format(name, elapsed, mdanalysis))
+
+
+if __name__ == '__main__':
+    main()
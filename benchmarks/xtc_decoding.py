@@ -0,0 +1,79 @@
+"""Benchmark of the XTC decoding.
+
+Compare the throughput of MDAnalysis against the native decoder used by XTCReader for:
+    - reading all the frames sequentially
+    - reading frames at random
+    - reading the first atoms of the frames only (partial decoding)
+
+The native decoder must give the same coordinates as MDAnalysis.
+
+Usage:
+    python benchmarks/xtc_decoding.py xtc_file topology_file [n_repeats]
+"""
+
+import sys
+import timeit
+
+import numpy as np
+
+import MDAnalysis
+
+from waterstay.readers.xtc_reader import scan_xtc_frames
+from waterstay.extensions.xtc_decoder import decode_frame
+
+
+def main():
+
+    if len(sys.argv) < 3:
+        print(__doc__)
+        sys.exit(1)
+
+    xtc_file = sys.argv[1]
+    topology_file = sys.argv[2]
+    n_repeats = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+
+    universe = MDAnalysis.Universe(topology_file, xtc_file)
+    trajectory = universe.trajectory
+    n_atoms = trajectory.n_atoms
+
+    frame_starts, _, end_offset = scan_xtc_frames(xtc_file)
+    frame_offsets = np.append(frame_starts, end_offset)
+    n_frames = len(frame_starts)
+
+    with open(xtc_file, 'rb') as fin:
+        data = np.frombuffer(fin.read(), dtype=np.uint8)
+
+    buffer = np.empty((n_atoms, 3), dtype=np.float32)
+
+    def native(frames, n_decode=-1):
+        for frame in frames:
+            decode_frame(data[frame_offsets[frame]:frame_offsets[frame + 1]], buffer, None, n_decode)
+
+    def mdanalysis(frames, n_decode=-1):
+        for frame in frames:
+            trajectory[frame].positions[:n_decode]
+
+    # Check that both decoders agree
+    for frame in range(n_frames):
+        native([frame])
+        if not np.array_equal(buffer, trajectory[frame].positions):
+            raise AssertionError('The native decoder and MDAnalysis disagree at frame {}'.format(frame))
+
+    random_frames = np.random.RandomState(0).permutation(n_frames)
+
+    scenarios = [('sequential', range(n_frames), -1),
+                 ('random', random_frames, -1),
+                 ('first 1% of the atoms', range(n_frames), max(n_atoms//100, 1))]
+
+    print('{} frames of {} atoms'.format(n_frames, n_atoms))
+    for name, frames, n_decode in scenarios:
+        results = {}
+        for decoder_name, decoder in [('MDAnalysis', mdanalysis), ('native', native)]:
+            timer = timeit.Timer(lambda: decoder(frames, n_decode))
+            results[decoder_name] = min(timer.repeat(repeat=n_repeats, number=1))/n_frames
+        print('{:25s} MDAnalysis {:8.3f} ms/frame   native {:8.3f} ms/frame   speedup {:.1f}x'.format(
+            name, 1000.0*results['MDAnalysis'], 1000.0*results['native'], results['MDAnalysis']/results['native']))
+
+
+if __name__ == '__main__':
+    main()
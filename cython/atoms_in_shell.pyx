@@ -1,67 +1,80 @@
 import cython
-cimport numpy as cnp 
 
-import numpy as np
+cimport openmp
 
+from cython.parallel cimport prange
 
-cdef extern from "math.h":
+
+cdef extern from "math.h" nogil:
 
     double floor(double x)
     double ceil(double x)
     double sqrt(double x)
 
-cdef inline double round(double r):
+cdef inline double round(double r) noexcept nogil:
     return floor(r + 0.5) if (r > 0.0) else ceil(r - 0.5)
 
+# The number of tasks per thread in which a block of frames is split by atoms_in_shell_batch. Several tasks per thread
+# balance the load between the threads as the molecules far from the center are more expensive to process.
+cdef int TASKS_PER_THREAD = 4
+
 @cython.cdivision(True)
 @cython.boundscheck(False)
 @cython.wraparound(False)
-def atoms_in_shell(cnp.ndarray[cnp.float64_t, ndim=2] coords not None,
-                   cnp.ndarray[cnp.float64_t, ndim=2] cell not None,
-                   cnp.ndarray[cnp.float64_t, ndim=2] rcell not None,
-                   list indexes not None,
-                   cnp.int32_t center,
-                   cnp.float64_t radius,
-                   cnp.ndarray[cnp.int32_t, ndim=1] in_shell):
+cdef void _molecules_in_shell(const cython.floating *coords,
+                              const double *cell,
+                              const double *rcell,
+                              const int *offsets,
+                              const int *atom_indices,
+                              int center,
+                              double radius,
+                              Py_ssize_t first,
+                              Py_ssize_t last,
+                              int *in_shell) noexcept nogil:
+    """Mark the molecules first to last - 1 which have at least one of their selected atoms within a shell around an
+    atomic center.
 
-    cdef double x, y, z, x_boxed, y_boxed, z_boxed, sdx, sdy, sdz, rx, ry, rz, r, r2
+    The coordinates and the cells of the frame are given as pointers to their C-contiguous data.
+    """
 
-    cdef int i, j, idx, n_molecules, n_atoms
+    cdef double x, y, z, x_boxed, y_boxed, z_boxed, sdx, sdy, sdz, rx, ry, rz, r, r2
 
-    cdef cnp.ndarray[cnp.float64_t, ndim=1] shell_center = coords[center,:]
-    cdef cnp.ndarray[cnp.float64_t, ndim=1] shell_center_boxed = np.empty(3,dtype=np.float)
+    cdef double cx, cy, cz, cx_boxed, cy_boxed, cz_boxed
 
-    n_molecules = len(indexes)
+    cdef Py_ssize_t i, j, idx
 
     r2 = radius*radius
 
-    shell_center_boxed[0] = shell_center[0]*rcell[0,0] + shell_center[1]*rcell[0,1] + shell_center[2]*rcell[0,2]
-    shell_center_boxed[1] = shell_center[0]*rcell[1,0] + shell_center[1]*rcell[1,1] + shell_center[2]*rcell[1,2]
-    shell_center_boxed[2] = shell_center[0]*rcell[2,0] + shell_center[1]*rcell[2,1] + shell_center[2]*rcell[2,2]
-        
+    cx = coords[3*center]
+    cy = coords[3*center+1]
+    cz = coords[3*center+2]
+
+    cx_boxed = cx*rcell[0] + cy*rcell[1] + cz*rcell[2]
+    cy_boxed = cx*rcell[3] + cy*rcell[4] + cz*rcell[5]
+    cz_boxed = cx*rcell[6] + cy*rcell[7] + cz*rcell[8]
+
     # Loop over the molecules
-    for 0 <= i < n_molecules:
+    for i in range(first, last):
 
-        # Get the number of selected atoms in molecule i
-        n_atoms = len(indexes[i])
+        in_shell[i] = 0
 
         # Loop over the selected atoms j of molecule i
-        for 0 <= j < n_atoms:
+        for j in range(offsets[i], offsets[i+1]):
 
-            idx = indexes[i][j]
+            idx = atom_indices[j]
 
-            x = coords[idx,0]
-            y = coords[idx,1]
-            z = coords[idx,2]
+            x = coords[3*idx]
+            y = coords[3*idx+1]
+            z = coords[3*idx+2]
 
             # Convert real coordinates to box coordinates
-            x_boxed = x*rcell[0,0] + y*rcell[0,1] + z*rcell[0,2]
-            y_boxed = x*rcell[1,0] + y*rcell[1,1] + z*rcell[1,2]
-            z_boxed = x*rcell[2,0] + y*rcell[2,1] + z*rcell[2,2]
+            x_boxed = x*rcell[0] + y*rcell[1] + z*rcell[2]
+            y_boxed = x*rcell[3] + y*rcell[4] + z*rcell[5]
+            z_boxed = x*rcell[6] + y*rcell[7] + z*rcell[8]
 
-            sdx = x_boxed - shell_center_boxed[0]
-            sdy = y_boxed - shell_center_boxed[1]
-            sdz = z_boxed - shell_center_boxed[2]
+            sdx = x_boxed - cx_boxed
+            sdy = y_boxed - cy_boxed
+            sdz = z_boxed - cz_boxed
 
             # Apply the PBC to the box coordinates distance vector between atom j and the center of the shell
             sdx -= round(sdx)
@@ -69,17 +82,181 @@ def atoms_in_shell(cnp.ndarray[cnp.float64_t, ndim=2] coords not None,
             sdz -= round(sdz)
 
             # Convert back the box coordinates distance vector to real coordinates distance vector
-            rx = sdx*cell[0,0] + sdy*cell[0,1] + sdz*cell[0,2]
-            ry = sdx*cell[1,0] + sdy*cell[1,1] + sdz*cell[1,2]
-            rz = sdx*cell[2,0] + sdy*cell[2,1] + sdz*cell[2,2]
+            rx = sdx*cell[0] + sdy*cell[1] + sdz*cell[2]
+            ry = sdx*cell[3] + sdy*cell[4] + sdz*cell[5]
+            rz = sdx*cell[6] + sdy*cell[7] + sdz*cell[8]
 
             # Compute the squared norm of the distance vector in real coordinates
             r = rx*rx + ry*ry + rz*rz
-    
+
             # If the distance is below the cutoff mark the molecule i as being in the shell
             if r < r2:
                 in_shell[i] = 1
                 break
 
 
+@cython.cdivision(True)
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef void _atoms_in_shell_batch(const cython.floating[:, :, ::1] coords,
+                                const double[:, :, ::1] cells,
+                                const double[:, :, ::1] rcells,
+                                const int[::1] offsets,
+                                const int[::1] atom_indices,
+                                int center,
+                                double radius,
+                                int[:, ::1] occupancies,
+                                int num_threads) noexcept nogil:
+    """Fill the occupancies of a block of frames.
+
+    See atoms_in_shell_batch.
+    """
+
+    cdef Py_ssize_t n_frames, n_molecules, n_chunks, chunk_size, n_tasks, task, frame, first, last
+
+    n_frames = coords.shape[0]
+
+    n_molecules = offsets.shape[0] - 1
+
+    if n_frames == 0 or n_molecules <= 0:
+        return
+
+    # Split each frame in chunks of molecules so that there are enough tasks to keep all the threads busy even when
+    # the block has fewer frames than threads
+    n_chunks = (TASKS_PER_THREAD*num_threads + n_frames - 1)//n_frames
+    n_chunks = max(1, min(n_chunks, n_molecules))
+    chunk_size = (n_molecules + n_chunks - 1)//n_chunks
+    n_chunks = (n_molecules + chunk_size - 1)//chunk_size
+
+    n_tasks = n_frames*n_chunks
+
+    # Each task fills a disjoint part of the occupancies, hence no synchronization is needed between the threads
+    for task in prange(n_tasks, num_threads=num_threads, schedule='dynamic'):
+        frame = task//n_chunks
+        first = (task % n_chunks)*chunk_size
+        last = min(first + chunk_size, n_molecules)
+        _molecules_in_shell(&coords[frame, 0, 0],
+                            &cells[frame, 0, 0],
+                            &rcells[frame, 0, 0],
+                            &offsets[0],
+                            &atom_indices[0],
+                            center,
+                            radius,
+                            first,
+                            last,
+                            &occupancies[frame, 0])
+
+
+def max_threads():
+    """Return the number of threads used by atoms_in_shell_batch by default.
+
+    This is the OpenMP default which can be set through the OMP_NUM_THREADS environment variable.
+
+    Returns:
+        int: the number of threads
+    """
+
+    return openmp.omp_get_max_threads()
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def atoms_in_shell(const cython.floating[:, ::1] coords not None,
+                   const double[:, ::1] cell not None,
+                   const double[:, ::1] rcell not None,
+                   const int[::1] offsets not None,
+                   const int[::1] atom_indices not None,
+                   int center,
+                   double radius,
+                   int[::1] in_shell not None):
+    """Mark the molecules which have at least one of their selected atoms within a shell around an atomic center.
+
+    The molecules are given in a compressed sparse row layout: the selected atoms of the molecule i are
+    atom_indices[offsets[i]:offsets[i+1]]. The occupancy row is owned by the caller and is fully overwritten: 1 for
+    the molecules in the shell, 0 for the others.
+
+    The coordinates can be either float64 or float32. The computation is performed in double precision in both cases
+    and without the GIL.
+
+    Args:
+        coords (numpy.ndarray): the (n_atoms, 3) C-contiguous coordinates
+        cell (numpy.ndarray): the (3, 3) direct cell
+        rcell (numpy.ndarray): the (3, 3) reverse cell
+        offsets (numpy.ndarray): the (n_molecules + 1,) int32 offsets of the molecules in atom_indices
+        atom_indices (numpy.ndarray): the int32 indexes of the selected atoms of the molecules
+        center (int): the index of the atomic center
+        radius (float): the radius of the shell
+        in_shell (numpy.ndarray): the (n_molecules,) int32 occupancy row
+    """
+
+    cdef Py_ssize_t n_molecules = offsets.shape[0] - 1
+
+    if in_shell.shape[0] < n_molecules:
+        raise ValueError('The occupancy row is too small for the number of molecules')
+
+    if center < 0 or center >= coords.shape[0]:
+        raise IndexError('Invalid atomic center {}'.format(center))
+
+    if n_molecules <= 0:
+        return
+
+    with nogil:
+        _molecules_in_shell(&coords[0, 0],
+                            &cell[0, 0],
+                            &rcell[0, 0],
+                            &offsets[0],
+                            &atom_indices[0],
+                            center,
+                            radius,
+                            0,
+                            n_molecules,
+                            &in_shell[0])
+
+
+def atoms_in_shell_batch(const cython.floating[:, :, ::1] coords not None,
+                         const double[:, :, ::1] cells not None,
+                         const double[:, :, ::1] rcells not None,
+                         const int[::1] offsets not None,
+                         const int[::1] atom_indices not None,
+                         int center,
+                         double radius,
+                         int[:, ::1] occupancies not None,
+                         int num_threads=0):
+    """Mark, for each frame of a block, the molecules which have at least one of their selected atoms within a shell
+    around an atomic center.
+
+    This is the multi-frame counterpart of atoms_in_shell: the frames and the molecules of the block are processed in
+    parallel by OpenMP threads without the GIL. The row i of the occupancies is fully overwritten with the occupancy of
+    frame i. The results do not depend on the number of threads.
+
+    Args:
+        coords (numpy.ndarray): the (n_frames, n_atoms, 3) C-contiguous coordinates
+        cells (numpy.ndarray): the (n_frames, 3, 3) direct cells
+        rcells (numpy.ndarray): the (n_frames, 3, 3) reverse cells
+        offsets (numpy.ndarray): the (n_molecules + 1,) int32 offsets of the molecules in atom_indices
+        atom_indices (numpy.ndarray): the int32 indexes of the selected atoms of the molecules
+        center (int): the index of the atomic center
+        radius (float): the radius of the shell
+        occupancies (numpy.ndarray): the (n_frames, n_molecules) int32 occupancies
+        num_threads (int): the number of threads. If <= 0, the OpenMP default is used.
+    """
+
+    cdef Py_ssize_t n_frames = coords.shape[0]
+
+    if cells.shape[0] < n_frames or rcells.shape[0] < n_frames:
+        raise ValueError('The number of cells does not match the number of frames')
+
+    if cells.shape[1] != 3 or cells.shape[2] != 3 or rcells.shape[1] != 3 or rcells.shape[2] != 3:
+        raise ValueError('The cells must be 3x3 matrices')
+
+    if occupancies.shape[0] < n_frames or occupancies.shape[1] < offsets.shape[0] - 1:
+        raise ValueError('The occupancies are too small for the number of frames and molecules')
+
+    if center < 0 or center >= coords.shape[1]:
+        raise IndexError('Invalid atomic center {}'.format(center))
+
+    if num_threads <= 0:
+        num_threads = openmp.omp_get_max_threads()
 
+    with nogil:
+        _atoms_in_shell_batch(coords, cells, rcells, offsets, atom_indices, center, radius, occupancies, num_threads)
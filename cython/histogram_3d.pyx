@@ -16,18 +16,24 @@ cdef inline double round(double r):
 @cython.cdivision(True)
 @cython.boundscheck(False)
 @cython.wraparound(False)
-def histogram_3d(cnp.ndarray[cnp.float64_t, ndim=2] coords,
-                 cnp.ndarray[cnp.float64_t, ndim=2] lower_bounds,
-                 cnp.ndarray[cnp.float64_t, ndim=2] upper_bounds,
+def histogram_3d(cnp.ndarray[cython.floating, ndim=2] coords,
+                 cnp.ndarray[cython.floating, ndim=2] lower_bounds,
+                 cnp.ndarray[cython.floating, ndim=2] upper_bounds,
                  int n_bin_x,
                  int n_bin_y,
                  int n_bin_z):
+    """Compute the 3D histogram of the positions of an atom through a trajectory.
 
-    cdef int n_frames
+    The coordinates and the bounds can be either float64 or float32.
+    """
+
+    cdef int i, n_frames, bin_x, bin_y, bin_z
 
     cdef float dx, dy, dz
 
-    cdef cnp.ndarray[cnp.float64_t, ndim=1] min_coord, max_coord
+    cdef double eps = np.finfo(np.float64).eps
+
+    cdef double min_x, min_y, min_z, max_x, max_y, max_z
 
     cdef cnp.ndarray[cnp.int32_t, ndim=3] histogram
 
@@ -38,16 +44,21 @@ def histogram_3d(cnp.ndarray[cnp.float64_t, ndim=2] coords,
     # Loop over the frames
     for 0 <= i < n_frames:
 
-        min_coord = lower_bounds[i,:] - np.finfo(np.float).eps
-        max_coord = upper_bounds[i,:] + np.finfo(np.float).eps
+        min_x = lower_bounds[i,0] - eps
+        min_y = lower_bounds[i,1] - eps
+        min_z = lower_bounds[i,2] - eps
+
+        max_x = upper_bounds[i,0] + eps
+        max_y = upper_bounds[i,1] + eps
+        max_z = upper_bounds[i,2] + eps
 
-        dx = (max_coord[0] - min_coord[0])/n_bin_x
-        dy = (max_coord[1] - min_coord[1])/n_bin_y
-        dz = (max_coord[2] - min_coord[2])/n_bin_z
+        dx = (max_x - min_x)/n_bin_x
+        dy = (max_y - min_y)/n_bin_y
+        dz = (max_z - min_z)/n_bin_z
 
-        bin_x = int((coords[i,0] - min_coord[0])/dx)
-        bin_y = int((coords[i,1] - min_coord[1])/dy)
-        bin_z = int((coords[i,2] - min_coord[2])/dz)
+        bin_x = <int>((coords[i,0] - min_x)/dx)
+        bin_y = <int>((coords[i,1] - min_y)/dy)
+        bin_z = <int>((coords[i,2] - min_z)/dz)
 
         if bin_x < 0 or bin_x >= n_bin_x:
             continue
@@ -0,0 +1,172 @@
+import cython
+cimport numpy as cnp
+
+import numpy as np
+
+
+cdef inline bint parse_field(const unsigned char[:] data, Py_ssize_t start, int width, double *out) noexcept nogil:
+    """Parse a fixed-width decimal field (e.g. '  -1.265') without going through a Python float.
+
+    The field must be made of optional leading spaces, an optional minus sign, digits with at most one decimal point
+    and optional trailing spaces. Anything else (e.g. an overflow field '********', 'nan' or an exponent) makes the
+    field invalid.
+
+    Returns:
+        bool: True if the field is valid
+    """
+
+    cdef double value = 0.0
+    cdef double scale = 1.0
+    cdef double sign = 1.0
+    cdef bint decimal = False
+    cdef bint started = False
+    cdef bint ended = False
+    cdef int n_digits = 0
+    cdef unsigned char c
+    cdef int k
+
+    for 0 <= k < width:
+        c = data[start + k]
+        if c == 32:
+            # Spaces are only allowed before and after the number
+            if started:
+                ended = True
+            continue
+        if ended:
+            return False
+        if c >= 48 and c <= 57:
+            value = value*10.0 + (c - 48)
+            if decimal:
+                scale *= 10.0
+            n_digits += 1
+        elif c == 46 and not decimal:
+            decimal = True
+        elif c == 45 and not started:
+            sign = -1.0
+        else:
+            return False
+        started = True
+
+    if n_digits == 0:
+        return False
+
+    # Both value and scale are exact integers so that the division is correctly rounded like a float() call would be
+    out[0] = sign*value/scale
+
+    return True
+
+
+cdef inline bint parse_record(const unsigned char[:] data, Py_ssize_t start, int field_width,
+                              cnp.float64_t[:, :] coords, Py_ssize_t i) noexcept nogil:
+    """Parse the x, y and z fields of an atom record into the row i of coords.
+
+    Returns:
+        bool: True if the three fields are valid
+    """
+
+    cdef double x, y, z
+
+    if not (parse_field(data, start, field_width, &x) and
+            parse_field(data, start + field_width, field_width, &y) and
+            parse_field(data, start + 2*field_width, field_width, &z)):
+        return False
+
+    coords[i, 0] = x
+    coords[i, 1] = y
+    coords[i, 2] = z
+
+    return True
+
+def _record_text(const unsigned char[:] data, Py_ssize_t index, int line_size):
+    """Return the text of a record for the error messages.
+    """
+
+    return bytes(data[index*line_size:(index + 1)*line_size]).rstrip(b'\r\n').decode('ascii', 'replace')
+
+
+@cython.cdivision(True)
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def parse_coordinates(const unsigned char[:] data not None,
+                      int line_size,
+                      int first_column,
+                      int field_width,
+                      cnp.float64_t[:, :] coords not None):
+    """Parse the x, y and z columns of a block of fixed-width atom records.
+
+    Args:
+        data (bytes-like): the block of atom records, one record every line_size bytes
+        line_size (int): the size of a record including its newline character
+        first_column (int): the column where the x field starts
+        field_width (int): the width of each of the x, y and z fields
+        coords (numpy.ndarray): the (n_atoms, 3) output array
+    """
+
+    cdef Py_ssize_t i, start
+
+    cdef Py_ssize_t n_atoms = coords.shape[0]
+
+    # The first record whose coordinates could not be parsed
+    cdef Py_ssize_t invalid = -1
+
+    if data.shape[0] < n_atoms*line_size:
+        raise ValueError('Not enough data for {} atoms'.format(n_atoms))
+
+    with nogil:
+        for 0 <= i < n_atoms:
+            start = i*line_size + first_column
+            if not parse_record(data, start, field_width, coords, i):
+                invalid = i
+                break
+
+    if invalid >= 0:
+        raise ValueError('Invalid coordinates in record {}: {!r}'.format(invalid,
+                                                                         _record_text(data, invalid, line_size)))
+
+@cython.cdivision(True)
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def parse_selected_coordinates(const unsigned char[:] data not None,
+                               const cnp.int64_t[:] indices not None,
+                               int line_size,
+                               int first_column,
+                               int field_width,
+                               cnp.float64_t[:, :] coords not None):
+    """Parse the x, y and z columns of a selection of fixed-width atom records.
+
+    Args:
+        data (bytes-like): the block of atom records, one record every line_size bytes
+        indices (numpy.ndarray): the indexes of the records to parse
+        line_size (int): the size of a record including its newline character
+        first_column (int): the column where the x field starts
+        field_width (int): the width of each of the x, y and z fields
+        coords (numpy.ndarray): the (n_selected_atoms, 3) output array
+    """
+
+    cdef Py_ssize_t i, idx, start
+
+    cdef Py_ssize_t n_records = data.shape[0]//line_size
+
+    cdef Py_ssize_t n_selected_atoms = indices.shape[0]
+
+    # The first record whose coordinates could not be parsed
+    cdef Py_ssize_t invalid = -1
+
+    if coords.shape[0] < n_selected_atoms:
+        raise ValueError('The output array is too small for {} atoms'.format(n_selected_atoms))
+
+    for 0 <= i < n_selected_atoms:
+        if indices[i] < 0 or indices[i] >= n_records:
+            raise IndexError('Invalid record index {}'.format(indices[i]))
+
+    with nogil:
+        for 0 <= i < n_selected_atoms:
+            idx = indices[i]
+            start = idx*line_size + first_column
+            if not parse_record(data, start, field_width, coords, i):
+                invalid = idx
+                break
+
+    if invalid >= 0:
+        raise ValueError('Invalid coordinates in record {}: {!r}'.format(invalid,
+                                                                         _record_text(data, invalid, line_size)))
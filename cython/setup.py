@@ -14,6 +14,8 @@ if 'linux' in sys.platform:
 
 INCLUDE_DIR = [numpy.get_include()]
 
+OPENMP_ARGS = ["/openmp"] if sys.platform == "win32" else ["-fopenmp"]
+
 EXTENSIONS = [Extension('connectivity',
                         include_dirs=INCLUDE_DIR,
                         sources=["connectivity.pyx"],
@@ -22,10 +24,18 @@ EXTENSIONS = [Extension('connectivity',
                         extra_link_args=["-std=c++11"]),
               Extension('atoms_in_shell',
                         include_dirs=INCLUDE_DIR,
-                        sources=["atoms_in_shell.pyx"]),
+                        sources=["atoms_in_shell.pyx"],
+                        extra_compile_args=OPENMP_ARGS,
+                        extra_link_args=OPENMP_ARGS),
               Extension('histogram_3d',
                         include_dirs=INCLUDE_DIR,
-                        sources=["histogram_3d.pyx"])]
+                        sources=["histogram_3d.pyx"]),
+              Extension('parse_coordinates',
+                        include_dirs=INCLUDE_DIR,
+                        sources=["parse_coordinates.pyx"]),
+              Extension('xtc_decoder',
+                        include_dirs=INCLUDE_DIR,
+                        sources=["xtc_decoder.pyx"])]
 
 setup(ext_modules=EXTENSIONS,
       cmdclass={'build_ext': build_ext},
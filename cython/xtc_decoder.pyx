@@ -0,0 +1,373 @@
+import cython
+cimport numpy as cnp
+
+from libc.string cimport memcpy
+
+import numpy as np
+
+# The magic number which starts each frame of a XTC file
+cdef int MAGIC = 1995
+XTC_MAGIC = MAGIC
+
+# The size of the header of a XTC frame: magic number, number of atoms, step, time, box and number of atoms again
+cdef int HEADER_SIZE = 56
+XTC_HEADER_SIZE = HEADER_SIZE
+
+# The conversion factor from nm (XTC units) to angstrom (waterstay units)
+cdef float SCALE = 10.0
+NM_TO_ANGSTROM = SCALE
+
+# The table of the sizes used to encode the small differences between consecutive atoms (see xdrfile.c)
+cdef int MAGICINTS[73]
+MAGICINTS[:] = [0, 0, 0, 0, 0, 0, 0, 0, 0, 8, 10, 12, 16, 20, 25, 32, 40, 50, 64,
+                80, 101, 128, 161, 203, 256, 322, 406, 512, 645, 812, 1024, 1290,
+                1625, 2048, 2580, 3250, 4096, 5060, 6501, 8192, 10321, 13003,
+                16384, 20642, 26007, 32768, 41285, 52015, 65536, 82570, 104031,
+                131072, 165140, 208063, 262144, 330280, 416127, 524287, 660561,
+                832255, 1048576, 1321122, 1664510, 2097152, 2642245, 3329021,
+                4194304, 5284491, 6658042, 8388607, 10568983, 13316085, 16777216]
+
+cdef int FIRSTIDX = 9
+
+cdef int LASTIDX = 73
+
+
+class XTCDecodingError(Exception):
+    """This class implements an exception raised when a XTC frame can not be decoded.
+    """
+
+
+cdef struct BitReader:
+    const unsigned char *data
+    Py_ssize_t size
+    Py_ssize_t count
+    unsigned int lastbits
+    unsigned int lastbyte
+    bint overflow
+
+
+cdef inline unsigned int read_byte(BitReader *reader) noexcept nogil:
+    if reader.count >= reader.size:
+        reader.overflow = True
+        return 0
+    reader.count += 1
+    return reader.data[reader.count - 1]
+
+
+cdef inline int receive_bits(BitReader *reader, int nbits) noexcept nogil:
+    """Read nbits bits from the compressed stream.
+    """
+
+    cdef unsigned int mask = (1u << nbits) - 1u if nbits < 32 else 0xffffffffu
+    cdef unsigned int num = 0
+
+    while nbits >= 8:
+        reader.lastbyte = (reader.lastbyte << 8) | read_byte(reader)
+        num |= (reader.lastbyte >> reader.lastbits) << (nbits - 8)
+        nbits -= 8
+
+    if nbits > 0:
+        if reader.lastbits < <unsigned int>nbits:
+            reader.lastbits += 8
+            reader.lastbyte = (reader.lastbyte << 8) | read_byte(reader)
+        reader.lastbits -= nbits
+        num |= (reader.lastbyte >> reader.lastbits) & ((1u << nbits) - 1u)
+
+    return <int>(num & mask)
+
+
+@cython.cdivision(True)
+cdef inline void receive_ints(BitReader *reader, int num_of_bits, unsigned int *sizes, int *nums) noexcept nogil:
+    """Read three integers packed together in num_of_bits bits.
+    """
+
+    cdef unsigned int bytes[32]
+    cdef int i, j, num_of_bytes = 0
+    cdef unsigned int num, p
+
+    bytes[1] = bytes[2] = bytes[3] = 0
+
+    while num_of_bits > 8:
+        bytes[num_of_bytes] = receive_bits(reader, 8)
+        num_of_bytes += 1
+        num_of_bits -= 8
+
+    if num_of_bits > 0:
+        bytes[num_of_bytes] = receive_bits(reader, num_of_bits)
+        num_of_bytes += 1
+
+    for i in range(2, 0, -1):
+        num = 0
+        for j in range(num_of_bytes - 1, -1, -1):
+            num = (num << 8) | bytes[j]
+            p = num // sizes[i]
+            bytes[j] = p
+            num = num - p*sizes[i]
+        nums[i] = <int>num
+
+    nums[0] = <int>(bytes[0] | (bytes[1] << 8) | (bytes[2] << 16) | (bytes[3] << 24))
+
+
+cdef int size_of_int(unsigned int size) noexcept nogil:
+    """Return the number of bits needed to store an integer up to size.
+    """
+
+    cdef unsigned int num = 1
+    cdef int num_of_bits = 0
+
+    while size >= num and num_of_bits < 32:
+        num_of_bits += 1
+        num <<= 1
+
+    return num_of_bits
+
+
+cdef int size_of_ints(unsigned int *sizes) noexcept nogil:
+    """Return the number of bits needed to store three integers up to the given sizes packed together.
+    """
+
+    cdef unsigned int bytes[32]
+    cdef unsigned int num_of_bytes = 1, num_of_bits = 0, bytecnt, tmp, num
+    cdef int i
+
+    bytes[0] = 1
+
+    for i in range(3):
+        tmp = 0
+        bytecnt = 0
+        while bytecnt < num_of_bytes:
+            tmp = bytes[bytecnt]*sizes[i] + tmp
+            bytes[bytecnt] = tmp & 0xff
+            tmp >>= 8
+            bytecnt += 1
+        while tmp != 0:
+            bytes[bytecnt] = tmp & 0xff
+            bytecnt += 1
+            tmp >>= 8
+        num_of_bytes = bytecnt
+
+    num = 1
+    num_of_bytes -= 1
+    while bytes[num_of_bytes] >= num:
+        num_of_bits += 1
+        num *= 2
+
+    return num_of_bits + num_of_bytes*8
+
+
+cdef inline int read_int(const unsigned char *data) noexcept nogil:
+    return <int>((<unsigned int>data[0] << 24) | (<unsigned int>data[1] << 16) | (<unsigned int>data[2] << 8) |
+                 <unsigned int>data[3])
+
+
+cdef inline float read_float(const unsigned char *data) noexcept nogil:
+    cdef unsigned int bits = (<unsigned int>data[0] << 24) | (<unsigned int>data[1] << 16) | \
+        (<unsigned int>data[2] << 8) | <unsigned int>data[3]
+    cdef float value
+    # Copy the bits rather than casting the pointer, which would break the strict aliasing rules
+    memcpy(&value, &bits, 4)
+    return value
+
+
+@cython.cdivision(True)
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef int decompress_coords(const unsigned char *data, Py_ssize_t size, int n_atoms, int n_decode,
+                           float[:, ::1] coords) noexcept nogil:
+    """Decompress the coordinates of a XTC frame.
+
+    Returns:
+        int: 0 on success, -1 if the compressed data is corrupted
+    """
+
+    cdef float precision, inv_precision, scale = SCALE
+    cdef int minint[3]
+    cdef int maxint[3]
+    cdef unsigned int sizeint[3]
+    cdef int bitsizeint[3]
+    cdef unsigned int sizesmall[3]
+    cdef int thiscoord[3]
+    cdef int prevcoord[3]
+    cdef int bitsize, smallidx, smaller, smallnum, is_smaller, run, flag, k, i, atom, tmp, d
+    cdef Py_ssize_t byte_count
+    cdef BitReader reader
+
+    if size < 36:
+        return -1
+
+    precision = read_float(data)
+    for d in range(3):
+        minint[d] = read_int(data + 4 + 4*d)
+        maxint[d] = read_int(data + 16 + 4*d)
+    smallidx = read_int(data + 28)
+    byte_count = read_int(data + 32)
+
+    if precision <= 0 or smallidx < FIRSTIDX or smallidx >= LASTIDX or byte_count < 0 or 36 + byte_count > size:
+        return -1
+
+    inv_precision = 1.0/precision
+
+    for d in range(3):
+        sizeint[d] = <unsigned int>(maxint[d] - minint[d] + 1)
+        bitsizeint[d] = 0
+
+    # Large systems are encoded with one number of bits per dimension
+    if (sizeint[0] | sizeint[1] | sizeint[2]) > 0xffffff:
+        for d in range(3):
+            bitsizeint[d] = size_of_int(sizeint[d])
+        bitsize = 0
+    else:
+        bitsize = size_of_ints(sizeint)
+
+    smaller = MAGICINTS[max(FIRSTIDX, smallidx - 1)]//2
+    smallnum = MAGICINTS[smallidx]//2
+    for d in range(3):
+        sizesmall[d] = MAGICINTS[smallidx]
+
+    reader.data = data + 36
+    reader.size = byte_count
+    reader.count = 0
+    reader.lastbits = 0
+    reader.lastbyte = 0
+    reader.overflow = False
+
+    run = 0
+    i = 0
+    atom = 0
+    while i < n_atoms and atom < n_decode:
+
+        if bitsize == 0:
+            for d in range(3):
+                thiscoord[d] = receive_bits(&reader, bitsizeint[d])
+        else:
+            receive_ints(&reader, bitsize, sizeint, thiscoord)
+
+        i += 1
+        for d in range(3):
+            thiscoord[d] += minint[d]
+            prevcoord[d] = thiscoord[d]
+
+        flag = receive_bits(&reader, 1)
+        is_smaller = 0
+        if flag == 1:
+            run = receive_bits(&reader, 5)
+            is_smaller = run % 3
+            run -= is_smaller
+            is_smaller -= 1
+
+        if run > 0:
+            k = 0
+            while k < run:
+                receive_ints(&reader, smallidx, sizesmall, thiscoord)
+                i += 1
+                for d in range(3):
+                    thiscoord[d] += prevcoord[d] - smallnum
+                if k == 0:
+                    # The first two atoms of a run are swapped for a better compression of the water molecules
+                    for d in range(3):
+                        tmp = thiscoord[d]
+                        thiscoord[d] = prevcoord[d]
+                        prevcoord[d] = tmp
+                    if atom < n_decode:
+                        for d in range(3):
+                            coords[atom, d] = (<float>prevcoord[d]*inv_precision)*scale
+                    atom += 1
+                else:
+                    for d in range(3):
+                        prevcoord[d] = thiscoord[d]
+                if atom < n_decode:
+                    for d in range(3):
+                        coords[atom, d] = (<float>thiscoord[d]*inv_precision)*scale
+                atom += 1
+                k += 3
+        else:
+            for d in range(3):
+                coords[atom, d] = (<float>thiscoord[d]*inv_precision)*scale
+            atom += 1
+
+        smallidx += is_smaller
+        if smallidx < FIRSTIDX or smallidx >= LASTIDX or reader.overflow:
+            return -1
+        if is_smaller < 0:
+            smallnum = smaller
+            if smallidx > FIRSTIDX:
+                smaller = MAGICINTS[smallidx - 1]//2
+            else:
+                smaller = 0
+        elif is_smaller > 0:
+            smaller = smallnum
+            smallnum = MAGICINTS[smallidx]//2
+        for d in range(3):
+            sizesmall[d] = MAGICINTS[smallidx]
+
+    return 0
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def decode_frame(const unsigned char[::1] frame not None,
+                 float[:, ::1] coords not None,
+                 float[:, ::1] box=None,
+                 int n_decode=-1):
+    """Decode a XTC frame.
+
+    The coordinates and the box are converted from nm to angstrom. As the atoms are compressed sequentially, decoding
+    only the first atoms of a frame is cheaper than decoding the whole frame.
+
+    Args:
+        frame (bytes-like): the bytes of the frame, starting at its magic number
+        coords (numpy.ndarray): the (n_atoms, 3) float32 output array. Only its n_decode first rows are written.
+        box (numpy.ndarray): the (3, 3) float32 output array for the box. If None, the box is not decoded.
+        n_decode (int): the number of atoms to decode from the first one. If -1, all the atoms are decoded.
+
+    Returns:
+        2-tuple: the step and the time of the frame
+
+    Raises:
+        XTCDecodingError: if the frame is corrupted
+    """
+
+    cdef const unsigned char *data = &frame[0]
+    cdef Py_ssize_t size = frame.shape[0]
+    cdef int n_atoms, step, lsize, i, d, status
+    cdef float time, scale = SCALE
+
+    if size < HEADER_SIZE or read_int(data) != MAGIC:
+        raise XTCDecodingError('Invalid XTC frame header')
+
+    n_atoms = read_int(data + 4)
+    step = read_int(data + 8)
+    time = read_float(data + 12)
+    lsize = read_int(data + 52)
+
+    if lsize != n_atoms:
+        raise XTCDecodingError('Inconsistent number of atoms in XTC frame')
+
+    if n_decode < 0 or n_decode > n_atoms:
+        n_decode = n_atoms
+
+    if coords.shape[0] < n_decode or coords.shape[1] != 3:
+        raise XTCDecodingError('The output array is too small for the decoded atoms')
+
+    if box is not None:
+        for i in range(3):
+            for d in range(3):
+                box[i, d] = read_float(data + 16 + 12*i + 4*d)*scale
+
+    with nogil:
+        # Small systems are stored uncompressed
+        if n_atoms <= 9:
+            status = 0
+            if HEADER_SIZE + 12*n_atoms > size:
+                status = -1
+            else:
+                for i in range(n_decode):
+                    for d in range(3):
+                        coords[i, d] = read_float(data + HEADER_SIZE + 12*i + 4*d)*scale
+        else:
+            status = decompress_coords(data + HEADER_SIZE, size - HEADER_SIZE, n_atoms, n_decode, coords)
+
+    if status != 0:
+        raise XTCDecodingError('Corrupted XTC frame')
+
+    return step, time
@@ -75,6 +75,9 @@ scripts = glob.glob(os.path.join('scripts', '*'))
 
 INCLUDE_DIR = [np.get_include()]
 
+# The flags enabling OpenMP for the extensions running parallel loops
+OPENMP_ARGS = ['/openmp'] if sys.platform == 'win32' else ['-fopenmp']
+
 if 'linux' in sys.platform:
     (opt,) = get_config_vars('OPT')
     os.environ['OPT'] = " ".join(flag for flag in opt.split() if flag != '-Wstrict-prototypes')
@@ -90,7 +93,15 @@ EXTENSIONS = [Extension('waterstay.extensions.connectivity',
                         sources=[os.path.join('cython', 'histogram_3d.pyx')]),
               Extension('waterstay.extensions.atoms_in_shell',
                         include_dirs=INCLUDE_DIR,
-                        sources=[os.path.join('cython', 'atoms_in_shell.pyx')])]
+                        sources=[os.path.join('cython', 'atoms_in_shell.pyx')],
+                        extra_compile_args=OPENMP_ARGS,
+                        extra_link_args=OPENMP_ARGS),
+              Extension('waterstay.extensions.parse_coordinates',
+                        include_dirs=INCLUDE_DIR,
+                        sources=[os.path.join('cython', 'parse_coordinates.pyx')]),
+              Extension('waterstay.extensions.xtc_decoder',
+                        include_dirs=INCLUDE_DIR,
+                        sources=[os.path.join('cython', 'xtc_decoder.pyx')])]
 
 CMDCLASS = {'build_ext': cython_build_ext}
 
@@ -10,8 +10,9 @@ from PyQt5 import QtCore, QtGui, QtWidgets
 import waterstay
 from waterstay.__pkginfo__ import __version__
 from waterstay.database import STANDARD_RESIDUES
+from waterstay.readers.chain_reader import ChainReader, natural_sort_key
 from waterstay.readers.i_reader import InvalidFileError
-from waterstay.readers.reader_registry import REGISTERED_READERS
+from waterstay.readers.reader_registry import find_reader, registered_extensions
 from waterstay.gui.logger_widget import QTextEditLogger
 from waterstay.gui.molecular_viewer import MolecularViewer
 from waterstay.gui.residence_times_dialog import ResidenceTimesDialog
@@ -289,28 +290,38 @@ class MainWindow(QtWidgets.QMainWindow):
         self._molecular_viewer.set_coordinates(frame)
 
     def on_open_trajectory_file(self):
-        """Opens a trajectory file.
+        """Opens a trajectory file. If several files are selected, they are chained in the order of their names.
         """
 
         # Pop up a file browser
         options = QtWidgets.QFileDialog.Options()
         options |= QtWidgets.QFileDialog.DontUseNativeDialog
-        supported_files = ['(*{})'.format(ext) for ext in REGISTERED_READERS]
+        supported_files = ['(*{})'.format(ext) for ext in registered_extensions()]
         supported_files = ';;'.join(supported_files)
-        trajectory_file, _ = QtWidgets.QFileDialog.getOpenFileName(self, 'Open trajectory file', '', supported_files, options=options)
+        trajectory_files, _ = QtWidgets.QFileDialog.getOpenFileNames(self, 'Open trajectory file(s)', '', supported_files, options=options)
 
         # If not trajectory file was selected, exit
-        if not trajectory_file:
+        if not trajectory_files:
             return
 
         # Take the trajectory reader corresponding to the selected trajectory based on the trajectory file extension
-        _, ext = os.path.splitext(trajectory_file)
+        for trajectory_file in trajectory_files:
+            if find_reader(trajectory_file) is None:
+                logging.error('Unknown trajectory format for {}'.format(trajectory_file))
+                return
+
         try:
-            self._reader = REGISTERED_READERS[ext](trajectory_file)
+            if len(trajectory_files) == 1:
+                self._reader = find_reader(trajectory_files[0])(trajectory_files[0])
+            else:
+                self._reader = ChainReader(sorted(trajectory_files, key=natural_sort_key))
         except InvalidFileError as error:
             logging.error(str(error))
             return
 
+        # The same frames are read over and over by the viewer, the atoms table and the analyses
+        self._reader.enable_cache()
+
         # Update the atoms table
         self.fill_atoms_table(self._reader, 0)
 
@@ -324,7 +335,7 @@ class MainWindow(QtWidgets.QMainWindow):
 
         # Update the target residues combo box
         self._target_residues.clear()
-        self._target_residues.addItems(sorted(set(self._reader.residue_names)))
+        self._target_residues.addItems(self._reader.selection.distinct('residue_names'))
 
         # Update the target times listview
         self._target_times.clear()
@@ -381,14 +392,10 @@ class MainWindow(QtWidgets.QMainWindow):
         if not selected_target_residues:
             return
 
-        atom_names = self._reader.atom_names
-
-        target_atoms = set()
-        for i, res_name in enumerate(self._reader.residue_names):
-            if res_name in selected_target_residues:
-                target_atoms.add(atom_names[i])
-
-        target_atoms = sorted(target_atoms)
+        # The atoms of the selected residues are looked up through the inverted index of the residue names
+        selection = self._reader.selection
+        mask = selection.select_values('residue_names', selected_target_residues)
+        target_atoms = selection.distinct('atom_names', mask)
 
         self._target_atoms.clear()
         self._target_atoms.addItems(target_atoms)
@@ -514,9 +514,8 @@ class MolecularViewer(QtWidgets.QWidget):
 
     def set_connectivity_builder(self, coords, covalent_radii):
 
-        # Compute the bounding box of the system
-        lower_bound = coords.min(axis=0)
-        upper_bound = coords.max(axis=0)
+        # Retrieve the bounding box of the system, computed once per frame by the reader
+        lower_bound, upper_bound = self._reader.frame_bounds(self._current_frame, coords)
 
         # Enlarge it a bit to not miss any atom
         lower_bound -= 1.0e-6
@@ -577,7 +576,8 @@ class MolecularViewer(QtWidgets.QWidget):
             frame (int): the selected frame
         """
 
-        if (self._reader is not None) and (reader.filename == self._reader.filename):
+        # A chained trajectory is only the same trajectory if all its parts are the same
+        if (self._reader is not None) and (reader.filenames == self._reader.filenames):
             return
 
         self.clear_trajectory()
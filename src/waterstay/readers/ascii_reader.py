@@ -1,32 +1,327 @@
 import abc
+import logging
+import mmap
+import os
 
-from waterstay.readers.i_reader import IReader
+import numpy as np
+
+from waterstay.readers.compressed_file import compression_format, open_compressed
+from waterstay.readers.i_reader import InvalidFileError, IReader
+from waterstay.readers.index_builder import build_index
+from waterstay.readers.trajectory_index import CompressedTrajectoryIndex, TrajectoryIndex
 from waterstay.database import CHEMICAL_ELEMENTS, STANDARD_RESIDUES
 
 
+# The size of trajectory data to index above which the index is built in parallel
+PARALLEL_INDEX_THRESHOLD = 256*1024*1024
+
+# The maximum size of the blocks of consecutive frames read at once
+MAX_BLOCK_SIZE = 64*1024*1024
+
+
 class ASCIIReader(IReader):
     """This class implements an interface for trajectory readers based on ASCII trajectory file.
+
+    The trajectory file can be compressed with gzip (.gz) or xz (.xz). The offsets of the frames are then offsets in
+    the decompressed stream, which is read through a seekable decompressor.
     """
 
-    def __init__(self, filename):
+    # The prefix of the lines which hold the time of a frame
+    title_prefix = b''
+
+    def __init__(self, filename, use_mmap=False):
         """Constructor.
 
         Args:
             filename (str): the trajectory filename
+            use_mmap (bool): if True the trajectory file is memory-mapped and the frames are read as zero-copy slices
+                of the mapped file. Not available for compressed trajectories.
         """
 
         super(ASCIIReader, self).__init__(filename)
 
-        self._fin = open(self._filename, "r")
+        self._compression = compression_format(self._filename)
+
+        # The file is opened in binary mode so that the offsets are byte offsets and the records are never decoded
+        if self._compression is None:
+            self._fin = open(self._filename, "rb")
+        else:
+            self._fin = open_compressed(self._filename, self._compression)
+            if use_mmap:
+                logging.warning('Compressed trajectories can not be memory-mapped')
+                use_mmap = False
+
+        self._mmap = mmap.mmap(self._fin.fileno(), 0, access=mmap.ACCESS_READ) if use_mmap else None
 
     def __del__(self):
         """Called when the object is destructed.
         """
 
+        # Release the mapping. It may still be exported by some frame buffers held by the caller, in which case it will
+        # be released with the last of them.
+        if getattr(self, '_mmap', None) is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass
+
         # Close the opened file
-        self._fin.close()
+        if getattr(self, '_fin', None) is not None:
+            self._fin.close()
+
+    def open_arguments(self):
+        """Return the arguments with which the reader can be opened again, e.g. by a worker process.
+
+        Returns:
+            2-tuple: the positional and the keyword arguments of the constructor
+        """
+
+        return (self._filename,), {'use_mmap': self._mmap is not None}
+
+    @property
+    def compression(self):
+        return self._compression
+
+    @property
+    def use_mmap(self):
+        return self._mmap is not None
+
+    def read_block(self, offset, size):
+        """Read a block of bytes of the trajectory file.
+
+        In mmap mode, the block is a zero-copy view of the mapped file.
+
+        Args:
+            offset (int): the offset of the block
+            size (int): the size of the block
+
+        Returns:
+            bytes or memoryview: the block
+        """
+
+        if self._mmap is not None:
+            return memoryview(self._mmap)[offset:offset + size]
+
+        self._fin.seek(offset)
+
+        return self._fin.read(size)
+
+    def _read_frame(self, frame, indices=None, dtype=np.float64, copy=True):
+        """Read the coordinates at a given frame.
+
+        The coordinates are parsed as float64 and converted to the requested type.
+
+        Args:
+            frame (int): the selected frame
+            indices (list of int): the indexes of the atoms to read. If None, all the atoms are read.
+            dtype (numpy.dtype): the floating point type of the coordinates
+            copy (bool): unused, the parsed coordinates are always a new array
+        """
+
+        # Fold the frame
+        frame %= self._n_frames
+
+        if indices is None:
+            data = self.read_block(self._frame_starts[frame], self._frame_size)
+            coords = np.empty((self._n_atoms, 3), dtype=np.float64)
+            self.parse_frame(data, coords)
+            return coords.astype(dtype, copy=False)
+
+        indices = self.check_indices(indices)
+
+        coords = np.empty((len(indices), 3), dtype=np.float64)
+        if len(indices) == 0:
+            return coords.astype(dtype, copy=False)
+
+        # Only read the span of records which contains the selected atoms
+        first, last = indices.min(), indices.max()
+        data = self.read_block(self._frame_starts[frame] + first*self._coords_size, (last - first + 1)*self._coords_size)
+
+        self.parse_frame(data, coords, indices - first)
+
+        return coords.astype(dtype, copy=False)
+
+    def _read_frames(self, frames, indices=None, out=None, dtype=np.float64):
+        """Read the coordinates at several frames.
+
+        The runs of consecutive frames are read from the trajectory file with a single read.
+
+        Args:
+            frames (list of int): the selected frames
+            indices (list of int): the indexes of the atoms to read. If None, all the atoms are read.
+            out (numpy.ndarray): the (n_selected_frames, n_selected_atoms, 3) output array. If None, a new array is
+                allocated.
+            dtype (numpy.dtype): the floating point type of the allocated output array
+
+        Returns:
+            numpy.ndarray: the coordinates
+        """
+
+        # The coordinates are parsed as float64 and converted afterwards for the other types
+        out_dtype = np.dtype(dtype) if out is None else out.dtype
+        if out_dtype != np.float64:
+            coords = self._read_frames(frames, indices)
+            if out is None:
+                return coords.astype(out_dtype)
+            out[:] = coords
+            return out
+
+        # Fold the frames
+        frames = np.asarray(frames, dtype=np.int64) % self._n_frames
+
+        # Define the span of records to read in each frame
+        if indices is None:
+            n_selected_atoms = self._n_atoms
+            first = 0
+            span = self._frame_size
+        else:
+            indices = self.check_indices(indices)
+            n_selected_atoms = len(indices)
+            if n_selected_atoms == 0:
+                return np.empty((len(frames), 0, 3), dtype=np.float64) if out is None else out
+            first = indices.min()
+            span = (indices.max() - first + 1)*self._coords_size
+            indices = indices - first
+
+        if out is None:
+            out = np.empty((len(frames), n_selected_atoms, 3), dtype=np.float64)
+
+        # The maximum number of frames read at once
+        max_run_size = max(MAX_BLOCK_SIZE//self._frame_size, 1)
+
+        i = 0
+        while i < len(frames):
+
+            # Find the run of consecutive frames starting at frame i
+            j = i + 1
+            while j < len(frames) and j - i < max_run_size and frames[j] == frames[j-1] + 1:
+                j += 1
+
+            block_start = self._frame_starts[frames[i]] + first*self._coords_size
+            block_end = self._frame_starts[frames[j-1]] + first*self._coords_size + span
+            data = memoryview(self.read_block(block_start, block_end - block_start))
+
+            for k in range(i, j):
+                offset = self._frame_starts[frames[k]] + first*self._coords_size - block_start
+                self.parse_frame(data[offset:offset + span], out[k], indices)
+
+            i = j
+
+        return out
+
+    def read_frame_records(self, frame):
+        """Return the atom records of a given frame as a (n_atoms, record size) array of bytes.
+
+        In mmap mode, the returned array is a read-only view of the mapped file.
+
+        Args:
+            frame (int): the selected frame
+
+        Returns:
+            numpy.ndarray: the records
+        """
+
+        # Fold the frame
+        frame %= self._n_frames
+
+        data = self.read_block(self._frame_starts[frame], self._frame_size)
+
+        return np.frombuffer(data, dtype=np.uint8).reshape(self._n_atoms, self._coords_size)
+
+    def index_frames(self, n_workers=None):
+        """Index the frames of the trajectory.
+
+        The index is loaded from its sidecar file if a valid one exists. Otherwise, or if the trajectory has been
+        appended to since the index was saved, the (new) frames are scanned and the index is saved for the next time.
+        Large trajectories are scanned in parallel.
+
+        Args:
+            n_workers (int): the number of worker processes used to scan large trajectories. If None, use all the cores
+        """
+
+        index_class = TrajectoryIndex if self._compression is None else CompressedTrajectoryIndex
+
+        index = index_class.load(self._filename)
+        if index is None:
+            index = index_class(self._filename,
+                                times=np.empty(0, dtype=np.float64),
+                                frame_starts=np.empty(0, dtype=np.int64),
+                                pbc_starts=np.empty(0, dtype=np.int64))
+            rebuild = True
+        else:
+            rebuild = not index.is_complete
+
+        if rebuild:
+            if n_workers is None:
+                n_workers = os.cpu_count() or 1
+            # Compressed trajectories are scanned sequentially through the decompressed stream
+            if self._compression is not None or \
+                    os.path.getsize(self._filename) - index.end_offset < PARALLEL_INDEX_THRESHOLD:
+                n_workers = 1
+            times, frame_starts, pbc_starts, end_offset = self.scan_frames(index.end_offset, n_workers)
+            index.extend(end_offset, times=times, frame_starts=frame_starts, pbc_starts=pbc_starts)
+            # A trajectory without any frame, e.g. whose title lines have no time, is not saved as an empty index
+            if len(index['times']) == 0:
+                raise InvalidFileError('No frame found in {}: the title lines must hold the time of the frames '
+                                       '(t= ... step= ...)'.format(self._filename))
+            index.save()
+
+        # The index also stores the per-frame properties computed during the full passes over the trajectory
+        self._index = index
+
+        self._times = index['times']
+        self._frame_starts = index['frame_starts']
+        self._pbc_starts = index['pbc_starts']
+        self._n_frames = len(self._times)
+
+    @staticmethod
+    @abc.abstractmethod
+    def frame_layout(fin, title_start, n_atoms, coords_size):
+        """Return the layout of the frame whose title line starts at a given offset.
+
+        Args:
+            fin (file): the trajectory file opened in binary mode
+            title_start (int): the offset of the title line
+            n_atoms (int): the number of atoms
+            coords_size (int): the size of an atom record
+
+        Returns:
+            4-tuple: the starting offset, the offsets of the coordinates and of the box and the ending offset of the
+            frame or None if the frame is incomplete or if the line is not a frame title
+        """
+
+    @abc.abstractmethod
+    def parse_frame(self, data, coords, indices=None):
+        """Parse the atom records of a frame.
+
+        Args:
+            data (bytes-like): the atom records
+            coords (numpy.ndarray): the (n_atoms, 3) output coordinates
+            indices (numpy.ndarray): the indexes of the records to parse. If None, all the records are parsed.
+        """
 
     @abc.abstractmethod
     def parse_first_frame(self):
         """Parse the first frame to define the topology of the system.
         """
+
+    def scan_frames(self, start, n_workers=1):
+        """Scan the trajectory for frames starting from a given offset.
+
+        Args:
+            start (int): the offset of the first frame to scan
+            n_workers (int): the number of worker processes used to scan the trajectory
+
+        Returns:
+            4-tuple: the times, the offsets of the coordinates, the offsets of the boxes of the scanned frames alongside
+            with the offset of the end of the last complete frame
+        """
+
+        return build_index(self._filename,
+                           start,
+                           self.frame_layout,
+                           self.title_prefix,
+                           self._n_atoms,
+                           self._coords_size,
+                           n_workers=n_workers,
+                           fin=None if self._compression is None else self._fin)
@@ -0,0 +1,205 @@
+import hashlib
+import logging
+import os
+import tempfile
+
+import numpy as np
+import yaml
+
+from waterstay.database import CHEMICAL_ELEMENTS, STANDARD_RESIDUES
+from waterstay.readers.topology import CategoricalArray
+from waterstay.readers.trajectory_index import default_file_mode
+
+# The file where the atom types guessed from the atom names are cached across sessions
+ATOM_TYPES_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.waterstay', 'atom_types.yml')
+
+# The in-memory cache of the guessed atom types, keyed by the digest of the chemical symbols they were guessed with
+_cache = {}
+
+
+def chemical_symbols():
+    """Return the chemical symbols of the internal database.
+
+    Returns:
+        set of str: the upperized chemical symbols
+    """
+
+    return {at['symbol'].upper() for at in CHEMICAL_ELEMENTS['atoms'].values()}
+
+
+def symbols_digest(symbols):
+    """Return a digest of a set of chemical symbols, used to invalidate the cached atom types when the chemical
+    elements database changes.
+
+    Args:
+        symbols (set of str): the chemical symbols
+
+    Returns:
+        str: the digest
+    """
+
+    return hashlib.sha1(' '.join(sorted(symbols)).encode('utf-8')).hexdigest()
+
+
+def guess_atom_type(atom_name, standard, symbols):
+    """Guess the atom type (element) from an atom name.
+
+    For standard residues, the strategy is to start from the left and search
+    by increasing length until a valid element is found.
+    For unknown residue, the strategy is opposite. Indeed, we start from the
+    right and search by decreasing length until a valid element is found.
+
+    Args:
+        atom_name (str): the atom name
+        standard (bool): whether the atom belongs to a standard residue
+        symbols (set of str): the upperized chemical symbols
+
+    Returns:
+        str: the atom type
+    """
+
+    # Remove the trailing and initial digits from the upperized atom names
+    upper_atom_name = atom_name.upper()
+    upper_atom_name = upper_atom_name.lstrip('0123456789').rstrip('0123456789')
+
+    # Case of the an atom that belongs to a standard residue
+    # Guess the atom type by the starting from the first alpha letter from the left,
+    # increasing the word by one letter if there was no success in guessing the atom type
+    if standard:
+
+        start = 1
+        while True:
+            upper_atom_name = upper_atom_name[:start]
+            if upper_atom_name in symbols:
+                return upper_atom_name.capitalize()
+            if start > len(atom_name):
+                raise ValueError('Unknown atom type: {}'.format(atom_name))
+            start += 1
+    # Case of the an atom that does not belong to a standard residue
+    # Guess the atom type by the starting from whole atom name,
+    # decreasing the word by one letter from the right if there was no success in guessing the atom type
+    else:
+        start = len(upper_atom_name)
+        while True:
+            upper_atom_name = upper_atom_name[:start]
+            if upper_atom_name in symbols:
+                return upper_atom_name.capitalize()
+            if start == 0:
+                raise ValueError('Unknown atom type: {}'.format(atom_name))
+            start -= 1
+
+
+def load_cache(digest, path=ATOM_TYPES_CACHE_PATH):
+    """Return the cache of the atom types guessed with a given set of chemical symbols.
+
+    The cache is loaded from its file the first time.
+
+    Args:
+        digest (str): the digest of the chemical symbols
+        path (str): the path of the cache file
+
+    Returns:
+        dict: the atom types keyed by (atom name, standard residue flag)
+    """
+
+    if digest in _cache:
+        return _cache[digest]
+
+    cache = {}
+    if os.path.exists(path):
+        try:
+            with open(path, 'r') as fin:
+                data = yaml.safe_load(fin) or {}
+        except (OSError, yaml.YAMLError) as error:
+            logging.warning('Could not load the atom types cache {}: {}'.format(path, error))
+            data = {}
+        if data.get('symbols_digest') == digest:
+            for standard, key in ((True, 'standard'), (False, 'other')):
+                for atom_name, atom_type in (data.get(key) or {}).items():
+                    cache[(str(atom_name), standard)] = atom_type
+
+    _cache[digest] = cache
+
+    return cache
+
+
+def save_cache(digest, cache, path=ATOM_TYPES_CACHE_PATH):
+    """Save the cache of the atom types.
+
+    Args:
+        digest (str): the digest of the chemical symbols
+        cache (dict): the atom types keyed by (atom name, standard residue flag)
+        path (str): the path of the cache file
+    """
+
+    data = {'symbols_digest': digest,
+            'standard': {name: atom_type for (name, standard), atom_type in cache.items() if standard},
+            'other': {name: atom_type for (name, standard), atom_type in cache.items() if not standard}}
+
+    tmp_path = None
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first so that a concurrent process never loads a partially written cache
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'w') as fout:
+            yaml.dump(data, fout)
+        os.chmod(tmp_path, default_file_mode())
+        os.replace(tmp_path, path)
+        tmp_path = None
+    except OSError as error:
+        logging.warning('Could not save the atom types cache {}: {}'.format(path, error))
+    finally:
+        if tmp_path is not None:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+
+def guess_atom_types(residue_names, atom_names, path=ATOM_TYPES_CACHE_PATH):
+    """Guess the atom types (elements) of a system from its atom names.
+
+    The type of an atom only depends on its name and on whether its residue is a standard residue, hence it is guessed
+    once per distinct (atom name, standard residue flag) pair and broadcast to the atoms. The guessed types are cached
+    in memory and on disk so that the next sessions do not have to guess them again.
+
+    Args:
+        residue_names (CategoricalArray): the residue names of the atoms
+        atom_names (CategoricalArray): the atom names of the atoms
+        path (str): the path of the cache file
+
+    Returns:
+        CategoricalArray: the atom types
+    """
+
+    symbols = chemical_symbols()
+    digest = symbols_digest(symbols)
+    cache = load_cache(digest, path)
+
+    # Flag the atoms which belong to a standard residue
+    standard_residues = set(STANDARD_RESIDUES)
+    standard_categories = np.array([name in standard_residues for name in residue_names.categories], dtype=np.int64)
+    standard_flags = standard_categories[residue_names.codes] if len(standard_categories) else \
+        np.zeros(len(atom_names), dtype=np.int64)
+
+    # Encode each (atom name, standard flag) pair as a single integer
+    pairs, inverse = np.unique(atom_names.codes.astype(np.int64)*2 + standard_flags, return_inverse=True)
+
+    n_guessed = 0
+    pair_types = []
+    for pair in pairs.tolist():
+        key = (atom_names.categories[pair//2], bool(pair % 2))
+        atom_type = cache.get(key)
+        if atom_type is None:
+            atom_type = cache[key] = guess_atom_type(key[0], key[1], symbols)
+            n_guessed += 1
+        pair_types.append(atom_type)
+
+    if n_guessed:
+        save_cache(digest, cache, path)
+
+    categories = sorted(set(pair_types))
+    category_codes = {atom_type: code for code, atom_type in enumerate(categories)}
+    pair_codes = np.array([category_codes[atom_type] for atom_type in pair_types], dtype=np.int32)
+
+    return CategoricalArray(pair_codes[inverse] if len(pair_codes) else np.empty(0, dtype=np.int32), categories)
@@ -0,0 +1,365 @@
+import collections
+import glob
+import inspect
+import logging
+import re
+
+import numpy as np
+
+from waterstay.readers.i_reader import FRAME_PROPERTIES, InvalidFileError, IReader
+from waterstay.readers.reader_registry import find_reader
+
+# The default maximum number of parts whose reader is kept opened at the same time
+DEFAULT_MAX_OPEN_PARTS = 8
+
+# The tolerance on the times used to detect the duplicate frames at the boundary between two parts
+DUPLICATE_TIME_TOLERANCE = 1.0e-6
+
+
+def natural_sort_key(filename):
+    """Return a key which sorts the filenames by taking their numbers into account (e.g. part2 before part10).
+
+    Args:
+        filename (str): the filename
+
+    Returns:
+        list: the key
+    """
+
+    return [int(v) if v.isdigit() else v for v in re.split(r'(\d+)', filename)]
+
+
+def reader_arguments(reader_class, kwargs):
+    """Return the keyword arguments accepted by the constructor of a reader class.
+
+    Args:
+        reader_class (class): the reader class
+        kwargs (dict): the keyword arguments
+
+    Returns:
+        dict: the keyword arguments which are parameters of the constructor, or all of them if the constructor
+        accepts arbitrary keyword arguments
+    """
+
+    parameters = inspect.signature(reader_class.__init__).parameters
+    if any(parameter.kind == inspect.Parameter.VAR_KEYWORD for parameter in parameters.values()):
+        return dict(kwargs)
+
+    return {k: v for k, v in kwargs.items() if k in parameters}
+
+
+class ChainReader(IReader):
+    """This class implements a reader which presents an ordered sequence of trajectory files as a single trajectory.
+
+    The parts can be of any registered format. They must share the same topology. The frames of the parts are merged in
+    a global frame index, optionally skipping the first frame of a part when it duplicates the last frame of the
+    previous part (as when a run is restarted from its last checkpoint). The parts are opened lazily and only the most
+    recently used ones are kept opened.
+    """
+
+    def __init__(self, filenames, remove_duplicates=True, max_open_parts=DEFAULT_MAX_OPEN_PARTS, **reader_kwargs):
+        """Constructor.
+
+        Args:
+            filenames (str or list of str): the ordered trajectory files or a glob pattern matching them. The files
+                matching a pattern are sorted by their names, numbers included.
+            remove_duplicates (bool): if True, the first frame of a part is skipped when its time is the time of the
+                last frame of the previous part
+            max_open_parts (int): the maximum number of parts kept opened at the same time
+            reader_kwargs (dict): the keyword arguments passed to the reader of each part. When the parts are of
+                different formats, each reader only gets the arguments its constructor accepts (e.g. use_mmap is
+                passed to the GRO and PDB readers but not to the XTC reader).
+        """
+
+        if isinstance(filenames, str):
+            filenames = sorted(glob.glob(filenames), key=natural_sort_key)
+        else:
+            filenames = list(filenames)
+
+        if not filenames:
+            raise InvalidFileError('No trajectory file to chain')
+
+        super(ChainReader, self).__init__(filenames[0])
+
+        self._filenames = filenames
+
+        self._remove_duplicates = remove_duplicates
+
+        self._reader_kwargs = reader_kwargs
+
+        self._max_open_parts = max(max_open_parts, 1)
+
+        # The opened parts sorted from the least to the most recently used one
+        self._parts = collections.OrderedDict()
+
+        times = []
+        part_indexes = []
+        local_frames = []
+
+        last_time = None
+        for i in range(len(self._filenames)):
+
+            part = self.get_part(i)
+
+            if i == 0:
+                self._topology = part.topology
+                self._n_atoms = part.n_atoms
+            else:
+                self.check_topology(part)
+
+            part_times = np.asarray(part.times, dtype=np.float64)
+
+            first = 0
+            if remove_duplicates and last_time is not None and len(part_times) and \
+                    abs(part_times[0] - last_time) <= DUPLICATE_TIME_TOLERANCE:
+                first = 1
+
+            times.append(part_times[first:])
+            part_indexes.append(np.full(len(part_times) - first, i, dtype=np.int32))
+            local_frames.append(np.arange(first, len(part_times), dtype=np.int64))
+
+            if len(part_times):
+                last_time = part_times[-1]
+
+        self._times = np.concatenate(times)
+
+        # The part and the frame in that part of each global frame
+        self._part_indexes = np.concatenate(part_indexes)
+        self._local_frames = np.concatenate(local_frames)
+
+        self._n_frames = len(self._times)
+
+        logging.info('Chained {} trajectory files ({} frames)'.format(len(self._filenames), self._n_frames))
+
+    def open_arguments(self):
+        """Return the arguments with which the reader can be opened again, e.g. by a worker process.
+
+        Returns:
+            2-tuple: the positional and the keyword arguments of the constructor
+        """
+
+        kwargs = dict(self._reader_kwargs, remove_duplicates=self._remove_duplicates,
+                      max_open_parts=self._max_open_parts)
+
+        return (self._filenames,), kwargs
+
+    @property
+    def filenames(self):
+        return self._filenames
+
+    def check_topology(self, part):
+        """Check that a part has the same topology as the chained trajectory.
+
+        Args:
+            part (IReader): the reader of the part
+
+        Raises:
+            InvalidFileError: if the topologies differ
+        """
+
+        if part.n_atoms != self._n_atoms or part.topology != self._topology:
+            raise InvalidFileError('The topology of {} differs from the one of {}'.format(part.filename,
+                                                                                         self._filenames[0]))
+
+    def get_part(self, part_index):
+        """Return the reader of a given part, opening it if needed.
+
+        Args:
+            part_index (int): the index of the part
+
+        Returns:
+            IReader: the reader
+        """
+
+        part = self._parts.get(part_index)
+        if part is not None:
+            self._parts.move_to_end(part_index)
+            return part
+
+        filename = self._filenames[part_index]
+
+        reader_class = find_reader(filename)
+        if reader_class is None:
+            raise InvalidFileError('Unknown trajectory format for {}'.format(filename))
+
+        part = reader_class(filename, **reader_arguments(reader_class, self._reader_kwargs))
+
+        self._parts[part_index] = part
+
+        # Close the least recently used parts
+        while len(self._parts) > self._max_open_parts:
+            self._parts.popitem(last=False)
+
+        return part
+
+    def locate_frame(self, frame):
+        """Return the part and the frame in that part of a global frame.
+
+        Args:
+            frame (int): the global frame
+
+        Returns:
+            2-tuple: the index of the part and the frame in that part
+        """
+
+        # Fold the frame
+        frame %= self._n_frames
+
+        return int(self._part_indexes[frame]), int(self._local_frames[frame])
+
+    def _read_frame(self, frame, indices=None, dtype=np.float64, copy=True):
+        """Read the coordinates at a given frame.
+
+        Args:
+            frame (int): the selected frame
+            indices (list of int): the indexes of the atoms to read. If None, all the atoms are read.
+            dtype (numpy.dtype): the floating point type of the coordinates
+            copy (bool): if False, the reader of the part may return its internal buffer
+        """
+
+        part_index, local_frame = self.locate_frame(frame)
+
+        return self.get_part(part_index).read_frame(local_frame, indices, dtype=dtype, copy=copy)
+
+    def _read_pbc(self, frame):
+        """Read the bounding box at a given frame.
+
+        Args:
+            frame (int): the selected frame
+        """
+
+        part_index, local_frame = self.locate_frame(frame)
+
+        return self.get_part(part_index).read_pbc(local_frame)
+
+    def get_frame_property(self, name):
+        """Return a cached per-frame property.
+
+        The property is gathered from the parts at the first access.
+
+        Args:
+            name (str): the name of the property (one of FRAME_PROPERTIES)
+
+        Returns:
+            numpy.ndarray: the (n_frames, ...) values of the property
+        """
+
+        values = self._frame_properties.get(name)
+        if values is not None:
+            return values
+
+        values = np.empty((self._n_frames,) + FRAME_PROPERTIES[name], dtype=np.float64)
+        for part_index, start, end, local_frames in self.split_frames(range(self._n_frames)):
+            values[start:end] = self.get_part(part_index).get_frame_property(name)[local_frames]
+
+        self._frame_properties[name] = values
+
+        return values
+
+    def save_frame_properties(self):
+        """Save the cached per-frame properties to the indexes of the parts.
+        """
+
+        for part_index, start, end, local_frames in self.split_frames(range(self._n_frames)):
+            part = self.get_part(part_index)
+            for name, values in self._frame_properties.items():
+                part.get_frame_property(name)[local_frames] = values[start:end]
+            part.save_frame_properties()
+
+    def split_frames(self, frames):
+        """Split a sequence of global frames in runs of frames belonging to the same part.
+
+        Args:
+            frames (list of int): the global frames
+
+        Returns:
+            generator: the index of the part, the start and the end of the run in frames and the frames of the run in
+            that part
+        """
+
+        frames = np.asarray(frames, dtype=np.int64) % self._n_frames
+
+        part_indexes = self._part_indexes[frames]
+        local_frames = self._local_frames[frames]
+
+        boundaries = np.flatnonzero(np.diff(part_indexes)) + 1
+        starts = np.concatenate([[0], boundaries])
+        ends = np.concatenate([boundaries, [len(frames)]])
+
+        for start, end in zip(starts, ends):
+            if start < end:
+                yield int(part_indexes[start]), start, end, local_frames[start:end]
+
+    def _read_frames(self, frames, indices=None, out=None, dtype=np.float64):
+        """Read the coordinates at several frames.
+
+        The frames are read by runs of frames belonging to the same part.
+
+        Args:
+            frames (list of int): the selected frames
+            indices (list of int): the indexes of the atoms to read. If None, all the atoms are read.
+            out (numpy.ndarray): the (n_selected_frames, n_selected_atoms, 3) output array. If None, a new array is
+                allocated.
+            dtype (numpy.dtype): the floating point type of the allocated output array
+
+        Returns:
+            numpy.ndarray: the coordinates
+        """
+
+        if indices is not None:
+            indices = self.check_indices(indices)
+
+        if out is None:
+            n_selected_atoms = self._n_atoms if indices is None else len(indices)
+            out = np.empty((len(frames), n_selected_atoms, 3), dtype=dtype)
+
+        for part_index, start, end, local_frames in self.split_frames(frames):
+            self.get_part(part_index).read_frames(local_frames, indices, out=out[start:end])
+
+        return out
+
+    def _read_pbcs(self, frames, out=None, dtype=np.float64):
+        """Read the bounding boxes at several frames.
+
+        Args:
+            frames (list of int): the selected frames
+            out (numpy.ndarray): the (n_selected_frames, 3, 3) output array. If None, a new array is allocated.
+            dtype (numpy.dtype): the floating point type of the allocated output array
+
+        Returns:
+            numpy.ndarray: the bounding boxes
+        """
+
+        if out is None:
+            out = np.empty((len(frames), 3, 3), dtype=dtype)
+
+        for part_index, start, end, local_frames in self.split_frames(frames):
+            self.get_part(part_index).read_pbcs(local_frames, out=out[start:end])
+
+        return out
+
+    def _iter_frames(self, frames, indices, read_coords, read_pbc, dtype=np.float64, copy=True):
+        """Iterate sequentially over a range of frames.
+
+        The frames of each part are streamed by the reader of that part.
+
+        Args:
+            frames (range): the frames
+            indices (numpy.ndarray): the indexes of the atoms to read. If None, all the atoms are read.
+            read_coords (bool): whether the coordinates should be read
+            read_pbc (bool): whether the bounding boxes should be read
+            dtype (numpy.dtype): the floating point type of the coordinates. The bounding boxes are always float64.
+            copy (bool): whether the readers of the parts must yield new arrays rather than their internal buffers
+
+        Returns:
+            generator: the frame, the coordinates (or None) and the bounding box (or None) of each frame
+        """
+
+        # Within a part, the local frames are a shifted copy of the global frames, hence a range of global frames
+        # is a range of local frames as well. The stop of the local range follows the direction of the step.
+        stop_shift = 1 if frames.step > 0 else -1
+        for part_index, start, end, local_frames in self.split_frames(frames):
+            local_range = range(int(local_frames[0]), int(local_frames[-1]) + stop_shift, frames.step)
+            stream = self.get_part(part_index)._iter_frames(local_range, indices, read_coords, read_pbc, dtype, copy)
+            for frame, (_, coords, pbc) in zip(frames[start:end], stream):
+                yield frame, coords, pbc
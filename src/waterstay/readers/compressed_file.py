@@ -0,0 +1,254 @@
+import bisect
+import io
+import lzma
+import sys
+import zlib
+
+# The compression formats supported for the trajectory files, keyed by their filename suffix
+COMPRESSION_SUFFIXES = {'.gz': 'gzip', '.xz': 'xz'}
+
+# The amount of decompressed data between two checkpoints of the decompressor
+CHECKPOINT_INTERVAL = 32*1024*1024
+
+# The size of the blocks of compressed data fed to the decompressor
+INPUT_BLOCK_SIZE = 256*1024
+
+# The amount of decompressed data kept behind the current position so that short backward seeks do not restart the
+# decompression
+BACKWARD_WINDOW = 4*1024*1024
+
+
+def compression_format(filename):
+    """Return the compression format of a file from its suffix.
+
+    Args:
+        filename (str): the filename
+
+    Returns:
+        str: the compression format ('gzip' or 'xz') or None if the file is not compressed
+    """
+
+    for suffix, fmt in COMPRESSION_SUFFIXES.items():
+        if filename.endswith(suffix):
+            return fmt
+
+    return None
+
+
+class SeekableDecompressor(io.RawIOBase):
+    """This class implements a seekable read-only stream over the decompressed contents of a gzip or xz file.
+
+    While decompressing, a copy of the state of the decompressor is stored every CHECKPOINT_INTERVAL bytes of
+    decompressed data. Seeking to an offset then only decompresses from the closest checkpoint before that offset rather
+    than from the beginning of the file. The checkpoints are built lazily, as the file is read forward.
+
+    The lzma decompressor can not be copied, hence seeking backward in a xz file restarts the decompression from the
+    beginning of the file unless the target is within the last BACKWARD_WINDOW bytes.
+    """
+
+    def __init__(self, filename, fmt, checkpoint_interval=CHECKPOINT_INTERVAL):
+        """Constructor.
+
+        Args:
+            filename (str): the compressed filename
+            fmt (str): the compression format ('gzip' or 'xz')
+            checkpoint_interval (int): the amount of decompressed data between two checkpoints
+        """
+
+        super(SeekableDecompressor, self).__init__()
+
+        if fmt not in COMPRESSION_SUFFIXES.values():
+            raise ValueError('Unknown compression format {}'.format(fmt))
+
+        self._format = fmt
+
+        self._checkpoint_interval = checkpoint_interval
+
+        self._fin = open(filename, 'rb')
+
+        # The checkpoints as (decompressed offset, compressed offset, decompressor) tuples sorted by offset
+        self._checkpoints = [(0, 0, self._new_decompressor())]
+        self._checkpoint_offsets = [0]
+
+        # The decompressed size, known once the end of the file has been reached
+        self._size = None
+
+        self._pos = 0
+
+        self._restart(0)
+
+    def _new_decompressor(self):
+        """Return a new decompressor.
+        """
+
+        if self._format == 'gzip':
+            return zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+
+        return lzma.LZMADecompressor()
+
+    def _restart(self, checkpoint_index):
+        """Restart the decompression from a given checkpoint.
+
+        Args:
+            checkpoint_index (int): the index of the checkpoint
+        """
+
+        out_offset, in_offset, decompressor = self._checkpoints[checkpoint_index]
+
+        self._decompressor = decompressor.copy() if self._format == 'gzip' else self._new_decompressor()
+
+        self._in_offset = in_offset
+
+        # The decompressed data and its offset in the decompressed stream
+        self._buffer = bytearray()
+        self._buffer_start = out_offset
+
+    def _decompress_block(self):
+        """Decompress the next block of compressed data and append it to the buffer.
+
+        Returns:
+            bool: False if the end of the file has been reached
+        """
+
+        self._fin.seek(self._in_offset)
+        data = self._fin.read(INPUT_BLOCK_SIZE)
+        if not data:
+            self._size = self._buffer_start + len(self._buffer)
+            return False
+
+        self._in_offset += len(data)
+
+        # A file may be made of several concatenated members (gzip) or streams (xz)
+        while data:
+            if self._decompressor.eof:
+                self._decompressor = self._new_decompressor()
+            self._buffer += self._decompressor.decompress(data)
+            data = self._decompressor.unused_data if self._decompressor.eof else b''
+
+        # Release the data which is far behind the current position
+        drop = self._pos - BACKWARD_WINDOW - self._buffer_start
+        if drop > BACKWARD_WINDOW:
+            drop = min(drop, len(self._buffer))
+            del self._buffer[:drop]
+            self._buffer_start += drop
+
+        # All the input consumed so far has been decompressed, this is a valid checkpoint
+        out_offset = self._buffer_start + len(self._buffer)
+        if self._format == 'gzip' and out_offset >= self._checkpoint_offsets[-1] + self._checkpoint_interval:
+            self._checkpoints.append((out_offset, self._in_offset, self._decompressor.copy()))
+            self._checkpoint_offsets.append(out_offset)
+
+        return True
+
+    def _fill(self):
+        """Decompress the data up to the current position.
+
+        Returns:
+            bool: False if the current position is past the end of the file
+        """
+
+        buffer_end = self._buffer_start + len(self._buffer)
+
+        checkpoint_index = bisect.bisect_right(self._checkpoint_offsets, self._pos) - 1
+
+        # Seeking backward out of the buffer or forward past a known checkpoint: restart from the closest checkpoint
+        if self._pos < self._buffer_start or self._checkpoint_offsets[checkpoint_index] > buffer_end:
+            self._restart(checkpoint_index)
+
+        while self._pos >= self._buffer_start + len(self._buffer):
+            if not self._decompress_block():
+                return False
+
+        return True
+
+    @property
+    def n_checkpoints(self):
+        return len(self._checkpoints)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        """Move to a given offset of the decompressed stream.
+
+        Args:
+            offset (int): the offset
+            whence (int): the reference of the offset (io.SEEK_SET, io.SEEK_CUR or io.SEEK_END)
+
+        Returns:
+            int: the new position
+        """
+
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            # The decompressed size is only known once the whole file has been decompressed
+            if self._size is None:
+                current_pos = self._pos
+                self._pos = sys.maxsize
+                self._fill()
+                self._pos = current_pos
+            pos = self._size + offset
+        else:
+            raise ValueError('Invalid whence {}'.format(whence))
+
+        if pos < 0:
+            raise ValueError('Negative seek position {}'.format(pos))
+
+        self._pos = pos
+
+        return self._pos
+
+    def readinto(self, b):
+        """Read decompressed data into a pre-allocated writable bytes-like object.
+
+        Args:
+            b (bytes-like): the output buffer
+
+        Returns:
+            int: the number of bytes read, 0 at the end of the file
+        """
+
+        b = memoryview(b).cast('B')
+        if len(b) == 0 or not self._fill():
+            return 0
+
+        offset = self._pos - self._buffer_start
+        n = min(len(b), len(self._buffer) - offset)
+        b[:n] = self._buffer[offset:offset + n]
+
+        self._pos += n
+
+        return n
+
+    def close(self):
+        if not self.closed:
+            self._fin.close()
+        super(SeekableDecompressor, self).close()
+
+
+def open_compressed(filename, fmt=None, buffer_size=io.DEFAULT_BUFFER_SIZE, checkpoint_interval=CHECKPOINT_INTERVAL):
+    """Open a compressed file as a buffered seekable binary stream of its decompressed contents.
+
+    Args:
+        filename (str): the compressed filename
+        fmt (str): the compression format ('gzip' or 'xz'). If None, it is guessed from the filename suffix.
+        buffer_size (int): the size of the read buffer
+        checkpoint_interval (int): the amount of decompressed data between two checkpoints of the decompressor
+
+    Returns:
+        io.BufferedReader: the decompressed stream
+    """
+
+    if fmt is None:
+        fmt = compression_format(filename)
+
+    return io.BufferedReader(SeekableDecompressor(filename, fmt, checkpoint_interval), buffer_size=buffer_size)
@@ -0,0 +1,114 @@
+import collections
+
+
+class FrameCache:
+    """This class implements a least-recently-used cache of NumPy arrays bounded by a memory budget.
+
+    The cached arrays are made read-only so that the callers which get them from the cache can not corrupt them.
+    """
+
+    def __init__(self, max_bytes):
+        """Constructor.
+
+        Args:
+            max_bytes (int): the memory budget of the cache in bytes
+        """
+
+        self._max_bytes = max_bytes
+
+        self._entries = collections.OrderedDict()
+
+        self._n_bytes = 0
+
+        self._hits = 0
+
+        self._misses = 0
+
+        self._evictions = 0
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def max_bytes(self):
+        return self._max_bytes
+
+    @property
+    def n_bytes(self):
+        return self._n_bytes
+
+    @property
+    def stats(self):
+        """Return the statistics of the cache.
+
+        Returns:
+            dict: the number of hits, misses, evictions and entries and the memory used by the cache
+        """
+
+        return {'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'entries': len(self._entries),
+                'n_bytes': self._n_bytes,
+                'max_bytes': self._max_bytes}
+
+    def clear(self):
+        """Empty the cache. The statistics are kept.
+        """
+
+        self._entries.clear()
+        self._n_bytes = 0
+
+    def get(self, key):
+        """Return a cached array.
+
+        Args:
+            key (hashable): the key of the array
+
+        Returns:
+            numpy.ndarray: the read-only cached array or None if the key is not cached
+        """
+
+        array = self._entries.get(key)
+        if array is None:
+            self._misses += 1
+            return None
+
+        self._hits += 1
+        self._entries.move_to_end(key)
+
+        return array
+
+    def put(self, key, array):
+        """Store an array in the cache, evicting the least recently used arrays if the memory budget is exceeded.
+
+        The array is made read-only. It is not cached if it is larger than the memory budget on its own.
+
+        Args:
+            key (hashable): the key of the array
+            array (numpy.ndarray): the array
+
+        Returns:
+            numpy.ndarray: the read-only array
+        """
+
+        array.setflags(write=False)
+
+        if array.nbytes > self._max_bytes:
+            return array
+
+        if key in self._entries:
+            self._n_bytes -= self._entries.pop(key).nbytes
+
+        while self._entries and self._n_bytes + array.nbytes > self._max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._n_bytes -= evicted.nbytes
+            self._evictions += 1
+
+        self._entries[key] = array
+        self._n_bytes += array.nbytes
+
+        return array
@@ -1,20 +1,66 @@
 import logging
-import re
 import sys
 
 import numpy as np
 
+from waterstay.extensions.parse_coordinates import parse_coordinates, parse_selected_coordinates
 from waterstay.readers.ascii_reader import ASCIIReader
-from waterstay.readers.i_reader import InvalidFileError
 from waterstay.readers.reader_registry import register_reader
+from waterstay.readers.topology import Topology
+
+
+def gro_frame_layout(fin, title_start, n_atoms, coords_size):
+    """Return the layout of the GRO frame whose title line starts at a given offset.
+
+    Args:
+        fin (file): the trajectory file opened in binary mode
+        title_start (int): the offset of the title line
+        n_atoms (int): the number of atoms
+        coords_size (int): the size of an atom record
+
+    Returns:
+        4-tuple: the starting offset, the offsets of the coordinates and of the box and the ending offset of the frame
+        or None if the frame is incomplete or if the line is not a frame title
+    """
+
+    fin.seek(title_start)
+    fin.readline()
+
+    # The title must be followed by the number of atoms
+    try:
+        if int(fin.readline()) != n_atoms:
+            return None
+    except ValueError:
+        return None
+
+    frame_start = fin.tell()
+
+    pbc_start = frame_start + n_atoms*coords_size
+
+    # The last atom record must end right before the box line
+    fin.seek(pbc_start - 1)
+    if fin.read(1) != b'\n':
+        return None
+
+    # Only the box line of the last frame of the file may lack its newline character
+    line = fin.readline()
+    if len(line.split()) not in (3, 9):
+        return None
+
+    return title_start, frame_start, pbc_start, fin.tell()
 
 
 @register_reader('.gro')
+@register_reader('.gro.gz')
+@register_reader('.gro.xz')
 class GroReader(ASCIIReader):
 
-    def __init__(self, filename):
+    # The function which locates the different parts of a frame from its title line
+    frame_layout = staticmethod(gro_frame_layout)
+
+    def __init__(self, filename, use_mmap=False, index_workers=None):
 
-        super(GroReader, self).__init__(filename)
+        super(GroReader, self).__init__(filename, use_mmap=use_mmap)
 
         # Read the title line and store its length
         first_title = self._fin.readline()
@@ -28,41 +74,14 @@ class GroReader(ASCIIReader):
             print("Invalid type for number of atoms: must be an int")
             sys.exit(1)
 
-        self._fin.seek(0)
-
-        # Loop over the file to get the length of all title lines (:-( they change over the file)
-        # Compute also the number of frames
-        self._times = []
-        self._pbc_starts = []
-        self._frame_starts = []
-        self._n_frames = 0
-        eof = False
-        while True:
-            for i in range(self._n_atoms + 3):
-                line = self._fin.readline()
-                if not line:
-                    eof = True
-                    break
-                if i == 0:
-                    match = re.search('.* t= (.*) step=', line)
-                    if match is None:
-                        raise InvalidFileError('Invalid PDB file')
-                    self._times.append(float(match.groups()[0]))
-                elif i == 1:
-                    self._frame_starts.append(self._fin.tell())
-                elif i == self._n_atoms + 1:
-                    self._pbc_starts.append(self._fin.tell())
-            if eof:
-                break
-
-            self._n_frames += 1
-
-        self._fin.seek(self._frame_starts[0])
-
-        self._coords_size = 45
+        # The size of an atom record depends on whether the velocities are stored or not
+        self._coords_size = len(self._fin.readline())
 
         self._frame_size = self._n_atoms*self._coords_size
 
+        # Build the frames index or reload it from its sidecar file
+        self.index_frames(index_workers)
+
         self.parse_first_frame()
 
         logging.info('Read {} successfully'.format(filename))
@@ -71,58 +90,33 @@ class GroReader(ASCIIReader):
         """Parse the first frame to get resp. the residue ids and names and the atoms ids and names.
         """
 
-        # Rewind the file to the beginning of the first frame
-        self._fin.seek(self._frame_starts[0])
-        data = self._fin.read(self._frame_size)
-
-        self._atom_names = []
-        self._atom_ids = []
-        self._atom_types = []
-        self._residue_names = []
-        self._residue_ids = []
-
-        for i in range(self._n_atoms):
-            start = i*self._coords_size
-            end = start + self._coords_size
-            line = data[start:end]
-            self._residue_ids.append(int(line[0:5]))
-            self._residue_names.append(line[5:10].strip())
-            self._atom_names.append(line[10:15].strip())
-            self._atom_ids.append(int(line[15:20]))
+        # Parse the fixed-width columns of all the atom records of the first frame at once
+        self._topology = Topology.from_records(self.read_frame_records(0),
+                                               residue_id_columns=slice(0, 5),
+                                               residue_name_columns=slice(5, 10),
+                                               atom_id_columns=slice(15, 20),
+                                               atom_name_columns=slice(10, 15))
 
         self.guess_atom_types()
 
-    def read_frame(self, frame):
-        """Read the coordinates at a given frame.
+    def parse_frame(self, data, coords, indices=None):
+        """Parse the atom records of a frame.
 
         Args:
-            frame (int): the selected frame
+            data (bytes-like): the atom records
+            coords (numpy.ndarray): the (n_atoms, 3) output coordinates
+            indices (numpy.ndarray): the indexes of the records to parse. If None, all the records are parsed.
         """
 
-        # Fold the frame
-        frame %= self._n_frames
-
-        # Rewind the file to the beginning of the frame
-        self._fin.seek(self._frame_starts[frame])
-
-        data = self._fin.read(self._frame_size)
-
-        coords = np.empty((self._n_atoms, 3), dtype=np.float)
-
-        for i in range(self._n_atoms):
-            start = i*self._coords_size
-            end = start + self._coords_size
-            line = data[start:end]
-            x = float(line[20:28])
-            y = float(line[28:36])
-            z = float(line[36:44])
-            coords[i, :] = [x, y, z]
+        # Parse the x, y and z fixed-width columns of all the (selected) atoms at once
+        if indices is None:
+            parse_coordinates(data, self._coords_size, 20, 8, coords)
+        else:
+            parse_selected_coordinates(data, indices, self._coords_size, 20, 8, coords)
 
         coords *= 10.0
 
-        return coords
-
-    def read_pbc(self, frame):
+    def _read_pbc(self, frame):
         """Read the bounding box at a given frame.
 
         Args:
@@ -137,7 +131,7 @@ class GroReader(ASCIIReader):
         # Rewind the file to the beginning of the frame
         self._fin.seek(self._pbc_starts[frame])
 
-        data = self._fin.readline().split()
+        data = [float(v) for v in self._fin.readline().split()]
 
         n_data = len(data)
         if n_data == 3:
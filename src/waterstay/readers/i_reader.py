@@ -1,17 +1,109 @@
 import abc
-import collections
 import logging
+import multiprocessing
 import os
+import queue
+
+from multiprocessing import shared_memory
 
 import pandas as pd
 
 import numpy as np
 
-from waterstay.database import CHEMICAL_ELEMENTS, STANDARD_RESIDUES
-from waterstay.extensions.atoms_in_shell import atoms_in_shell
+from waterstay.extensions.atoms_in_shell import atoms_in_shell_batch, max_threads
+from waterstay.readers.atom_types import guess_atom_types
+from waterstay.readers.frame_cache import FrameCache
+from waterstay.readers.prefetcher import Prefetcher
+from waterstay.readers.selection import SelectionIndex
 from waterstay.utils.progress_bar import progress_bar
 
 
+# The default memory budget in bytes of the frame cache
+DEFAULT_CACHE_SIZE = 512*1024*1024
+
+# The size in bytes of the blocks of frames read at once by iter_frames
+ITER_BATCH_SIZE = 16*1024*1024
+
+# The fields which can be yielded by iter_frames
+FRAME_FIELDS = ('coords', 'pbc', 'time')
+
+# The interval in seconds at which the progress of the worker processes of residues_in_shell is polled
+PROGRESS_POLLING_INTERVAL = 0.1
+
+# The per-frame properties cached by the readers and persisted in their index, with the shape of their value for one
+# frame
+FRAME_PROPERTIES = {'frame_bounds': (2, 3), 'frame_boxes': (3, 3)}
+
+
+def as_range(frames, n_frames):
+    """Return a sequence of frames as a range if the frames are evenly spaced increasing valid frames.
+
+    Args:
+        frames (list of int): the frames
+        n_frames (int): the number of frames of the trajectory
+
+    Returns:
+        range or list of int: the range of frames or the frames themselves if they do not form a range
+    """
+
+    if isinstance(frames, range) or len(frames) < 2:
+        return frames
+
+    frames = list(frames)
+
+    step = frames[1] - frames[0]
+    if step <= 0 or frames[0] < 0 or frames[-1] >= n_frames:
+        return frames
+
+    candidate = range(frames[0], frames[-1] + 1, step)
+    if len(candidate) != len(frames) or any(f != g for f, g in zip(frames, candidate)):
+        return frames
+
+    return candidate
+
+
+# The queue through which a worker process of residues_in_shell reports its progress
+_worker_progress = None
+
+
+def _init_shell_worker(progress):
+    """Initialize a worker process of IReader.residues_in_shell.
+
+    Args:
+        progress (multiprocessing.Queue): the queue through which the worker reports its progress
+    """
+
+    global _worker_progress
+
+    _worker_progress = progress
+
+
+def _scan_shell_shard(args):
+    """Scan a shard of frames in a worker process of IReader.residues_in_shell.
+
+    The worker opens its own reader over the trajectory and writes the occupancies of the shard in the shared
+    occupancy matrix.
+
+    Args:
+        args (tuple): the reader class and its constructor arguments, the name and the shape of the shared occupancy
+            matrix, the first row of the shard in that matrix and the arguments of IReader._scan_shell
+    """
+
+    reader_class, reader_args, reader_kwargs, name, shape, start, frames, layout, radius, dtype, num_threads = args
+
+    reader = reader_class(*reader_args, **reader_kwargs)
+
+    shared = shared_memory.SharedMemory(name=name)
+    try:
+        occupancies = np.ndarray(shape, dtype=np.int32, buffer=shared.buf)
+        reader._scan_shell(frames, layout, radius, occupancies[start:start + len(frames)], dtype, num_threads,
+                           _worker_progress.put)
+        # The view must be released before the shared memory can be closed
+        del occupancies
+    finally:
+        shared.close()
+
+
 class InvalidFileError(Exception):
     """This class implements an exception for invalid file.
     """
@@ -42,43 +134,134 @@ class IReader(abc.ABC):
 
         self._n_atoms = 0
 
+        # The columnar topology of the system. Must be set by the concrete readers.
+        self._topology = None
+
+        # The selection engine over the topology, built at the first selection
+        self._selection = None
+
+        # The compressed sparse row layout of the molecules, built at the first access
+        self._molecule_layout = None
+
+        # The persistent index of the trajectory in which the per-frame properties are stored, if the reader has one
+        self._index = None
+
+        # The per-frame properties (see FRAME_PROPERTIES), NaN for the frames which have not been read in full yet.
+        # Loaded from the index at the first access.
+        self._frame_properties = {}
+
+        self._cache = None
+
     @property
     def filename(self):
         return self._filename
 
+    @property
+    def filenames(self):
+        """Return the files read by the reader.
+
+        Returns:
+            list of str: the files
+        """
+
+        return [self._filename]
+
+    def open_arguments(self):
+        """Return the arguments with which the reader can be opened again, e.g. by a worker process.
+
+        The readers whose constructor takes other arguments than the filename must override this method.
+
+        Returns:
+            2-tuple: the positional and the keyword arguments of the constructor
+        """
+
+        return (self._filename,), {}
+
+    def reopen(self):
+        """Open a new reader over the same trajectory.
+
+        The new reader has its own file handle. It reuses the persistent index of the trajectory if there is one.
+
+        Returns:
+            IReader: the new reader
+        """
+
+        args, kwargs = self.open_arguments()
+
+        return type(self)(*args, **kwargs)
+
     @property
     def n_atoms(self):
         return self._n_atoms
 
+    @property
+    def topology(self):
+        return self._topology
+
     @property
     def atom_ids(self):
-        return self._atom_ids
+        return self._topology.atom_ids
 
     @property
     def atom_names(self):
-        return self._atom_names
+        return self._topology.atom_names
 
     @property
     def atom_types(self):
-        return self._atom_types
+        return self._topology.atom_types
 
     @property
     def molecules(self):
 
-        mol_indexes = collections.OrderedDict()
+        offsets, atom_indices = self.molecule_layout
+
+        atom_indices = atom_indices.tolist()
+        offsets = offsets.tolist()
+
+        return [atom_indices[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+
+    @property
+    def molecule_layout(self):
+        """Return the atoms of the system grouped per molecule (residue id) in a compressed sparse row layout.
+
+        The layout is computed once and cached.
+
+        Returns:
+            2-tuple: the (n_molecules + 1,) int32 offsets and the (n_atoms,) int32 atom indices such that the atoms of
+            the molecule i are atom_indices[offsets[i]:offsets[i+1]]
+        """
 
-        for i, resid in enumerate(self._residue_ids):
-            mol_indexes.setdefault(resid, []).append(i)
+        if self._molecule_layout is None:
+            self._molecule_layout = self.selection.group_by_molecule(np.ones(self._n_atoms, dtype=bool))
 
-        return list(mol_indexes.values())
+        return self._molecule_layout
 
     @property
     def residue_ids(self):
-        return self._residue_ids
+        return self._topology.residue_ids
+
+    @property
+    def selection(self):
+        if self._selection is None:
+            self._selection = SelectionIndex(self._topology)
+        return self._selection
+
+    def select(self, expression):
+        """Return the mask of the atoms matching a selection expression.
+
+        Args:
+            expression (str): the selection expression (e.g. 'resname SOL and name OW' or 'resid 1-10 and not
+                element H'). See waterstay.readers.selection.parse_selection for the syntax.
+
+        Returns:
+            numpy.ndarray: the read-only boolean mask
+        """
+
+        return self.selection.select(expression)
 
     @property
     def residue_names(self):
-        return self._residue_names
+        return self._topology.residue_names
 
     @property
     def n_frames(self):
@@ -88,14 +271,335 @@ class IReader(abc.ABC):
     def times(self):
         return self._times
 
+    @property
+    def cache_stats(self):
+        """Return the statistics of the frame cache.
+
+        Returns:
+            dict: the statistics or None if the cache is disabled
+        """
+
+        return None if self._cache is None else self._cache.stats
+
+    def enable_cache(self, max_bytes=DEFAULT_CACHE_SIZE):
+        """Enable the cache of the frames and of the bounding boxes.
+
+        The frames and the boxes which are read are kept in a least-recently-used cache bounded by a memory budget.
+        The arrays returned by read_frame and read_pbc are then read-only.
+
+        Args:
+            max_bytes (int): the memory budget of the cache in bytes
+        """
+
+        self._cache = FrameCache(max_bytes)
+
+    def disable_cache(self):
+        """Disable the cache of the frames and of the bounding boxes and release its memory.
+        """
+
+        self._cache = None
+
+    def read_frame(self, frame, indices=None, dtype=np.float64, copy=True):
+        """Read the coordinates at a given frame.
+
+        Args:
+            frame (int): the selected frame
+            indices (list of int): the indexes of the atoms to read. If None, all the atoms are read.
+            dtype (numpy.dtype): the floating point type of the coordinates (numpy.float64 or numpy.float32)
+            copy (bool): if False, the reader may return its internal buffer (e.g. the MDAnalysis timestep positions)
+                when it already has the requested type. Such an array is only valid until the next read.
+
+        Returns:
+            numpy.ndarray: the coordinates
+        """
+
+        if self._cache is None:
+            return self._read_frame(frame, indices, dtype=dtype, copy=copy)
+
+        key = ('coords', frame % self._n_frames)
+
+        # Full frames are cached, subsets are extracted from them
+        coords = self._cache.get(key)
+        if coords is None:
+            coords = self._cache.put(key, self._read_frame(frame))
+
+        coords = coords if indices is None else coords[self.check_indices(indices)]
+
+        return coords.astype(dtype, copy=False)
+
+    def read_pbc(self, frame, dtype=np.float64):
+        """Read the bounding box at a given frame.
+
+        Args:
+            frame (int): the selected frame
+            dtype (numpy.dtype): the floating point type of the bounding box
+
+        Returns:
+            numpy.ndarray: the bounding box
+        """
+
+        # The box may have been stored during a previous full pass over the trajectory
+        if 'frame_boxes' in self._frame_properties or (self._index is not None and 'frame_boxes' in self._index):
+            pbc = self.get_frame_boxes()[frame % self._n_frames]
+            if not np.isnan(pbc[0, 0]):
+                return pbc.astype(dtype)
+
+        if self._cache is None:
+            return self._read_pbc(frame).astype(dtype, copy=False)
+
+        key = ('pbc', frame % self._n_frames)
+
+        pbc = self._cache.get(key)
+        if pbc is None:
+            pbc = self._cache.put(key, self._read_pbc(frame).astype(np.float64))
+
+        return pbc.astype(dtype, copy=False)
+
+    def read_frames(self, frames, indices=None, out=None, dtype=np.float64):
+        """Read the coordinates at several frames.
+
+        Args:
+            frames (list of int): the selected frames
+            indices (list of int): the indexes of the atoms to read. If None, all the atoms are read.
+            out (numpy.ndarray): the (n_selected_frames, n_selected_atoms, 3) output array. If None, a new array is
+                allocated.
+            dtype (numpy.dtype): the floating point type of the allocated output array
+
+        Returns:
+            numpy.ndarray: the coordinates
+        """
+
+        if self._cache is None:
+            return self._read_frames(frames, indices, out, dtype=dtype)
+
+        if indices is not None:
+            indices = self.check_indices(indices)
+
+        if out is None:
+            n_selected_atoms = self._n_atoms if indices is None else len(indices)
+            out = np.empty((len(frames), n_selected_atoms, 3), dtype=dtype)
+
+        # Fetch the cached frames, the other ones are read below
+        missing = []
+        for i, frame in enumerate(frames):
+            coords = self._cache.get(('coords', frame % self._n_frames))
+            if coords is None:
+                missing.append(i)
+            else:
+                out[i] = coords if indices is None else coords[indices]
+
+        if not missing:
+            return out
+
+        # The missing frames of a subset read are read as subsets and are not cached: caching them would mean reading
+        # the full frames
+        if indices is not None:
+            out[missing] = self._read_frames([frames[i] for i in missing], indices, dtype=out.dtype)
+            return out
+
+        # The missing full frames are read and cached by blocks bounded in memory
+        batch_size = max(ITER_BATCH_SIZE//max(24*self._n_atoms, 1), 1)
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start:start + batch_size]
+            block = self._read_frames([frames[i] for i in batch])
+            for i, coords in zip(batch, block):
+                out[i] = self._cache.put(('coords', frames[i] % self._n_frames), coords.copy())
+
+        return out
+
+    def read_pbcs(self, frames, out=None, dtype=np.float64):
+        """Read the bounding boxes at several frames.
+
+        Args:
+            frames (list of int): the selected frames
+            out (numpy.ndarray): the (n_selected_frames, 3, 3) output array. If None, a new array is allocated.
+            dtype (numpy.dtype): the floating point type of the allocated output array
+
+        Returns:
+            numpy.ndarray: the bounding boxes
+        """
+
+        if self._cache is None:
+            return self._read_pbcs(frames, out, dtype=dtype)
+
+        if out is None:
+            out = np.empty((len(frames), 3, 3), dtype=dtype)
+
+        for i, frame in enumerate(frames):
+            out[i] = self.read_pbc(frame)
+
+        return out
+
     @abc.abstractmethod
-    def read_frame(self, frame):
+    def _read_frame(self, frame, indices=None, dtype=np.float64, copy=True):
         pass
 
     @abc.abstractmethod
-    def read_pbc(self, frame):
+    def _read_pbc(self, frame):
         pass
 
+    def _read_frames(self, frames, indices=None, out=None, dtype=np.float64):
+        """Read the coordinates at several frames bypassing the frame cache.
+
+        Args:
+            frames (list of int): the selected frames
+            indices (list of int): the indexes of the atoms to read. If None, all the atoms are read.
+            out (numpy.ndarray): the (n_selected_frames, n_selected_atoms, 3) output array. If None, a new array is
+                allocated.
+            dtype (numpy.dtype): the floating point type of the allocated output array
+
+        Returns:
+            numpy.ndarray: the coordinates
+        """
+
+        if out is None:
+            n_selected_atoms = self._n_atoms if indices is None else len(indices)
+            out = np.empty((len(frames), n_selected_atoms, 3), dtype=dtype)
+
+        for i, frame in enumerate(frames):
+            out[i] = self._read_frame(frame, indices, dtype=out.dtype, copy=False)
+
+        return out
+
+    def _read_pbcs(self, frames, out=None, dtype=np.float64):
+        """Read the bounding boxes at several frames bypassing the frame cache.
+
+        Args:
+            frames (list of int): the selected frames
+            out (numpy.ndarray): the (n_selected_frames, 3, 3) output array. If None, a new array is allocated.
+            dtype (numpy.dtype): the floating point type of the allocated output array
+
+        Returns:
+            numpy.ndarray: the bounding boxes
+        """
+
+        if out is None:
+            out = np.empty((len(frames), 3, 3), dtype=dtype)
+
+        for i, frame in enumerate(frames):
+            out[i] = self._read_pbc(frame)
+
+        return out
+
+    def iter_frames(self, start=0, stop=None, step=1, fields=FRAME_FIELDS, indices=None, out=None, dtype=np.float64,
+                    copy=True, pbc_dtype=None):
+        """Iterate sequentially over a range of frames.
+
+        The frames are read in increasing order without random access lookups, which is the fastest way to scan a
+        trajectory. The range follows the semantics of the builtin range applied to the frames of the trajectory.
+
+        Args:
+            start (int): the first frame
+            stop (int): the frame where to stop. If None, the iteration goes up to the last frame.
+            step (int): the step between two frames
+            fields (tuple of str): the fields to yield for each frame among 'coords', 'pbc' and 'time'
+            indices (list of int): the indexes of the atoms to read. If None, all the atoms are read.
+            out (numpy.ndarray): the (n_selected_atoms, 3) array in which the coordinates of every frame are written.
+                If None, a new array is yielded for each frame.
+            dtype (numpy.dtype): the floating point type of the coordinates and of the bounding boxes
+            pbc_dtype (numpy.dtype): the floating point type of the bounding boxes. If None, dtype is used.
+            copy (bool): if False, the reader may yield its internal buffers when they already have the requested
+                type. Such arrays are only valid until the next iteration.
+
+        Returns:
+            generator: the frame followed by the requested fields in the order given by fields
+        """
+
+        for field in fields:
+            if field not in FRAME_FIELDS:
+                raise ValueError('Unknown frame field {}. Must be one of {}'.format(field, FRAME_FIELDS))
+
+        frames = range(self._n_frames)[start:stop:step]
+
+        if indices is not None:
+            indices = self.check_indices(indices)
+
+        read_coords = 'coords' in fields
+        read_pbc = 'pbc' in fields
+
+        # Go through the frame cache when it is enabled. The subsets are streamed as the cache only holds full frames.
+        if self._cache is not None and indices is None:
+            stream = self._iter_batches(frames, indices, read_coords, read_pbc, dtype, self.read_frames, self.read_pbcs)
+        else:
+            stream = self._iter_frames(frames, indices, read_coords, read_pbc, dtype, copy)
+
+        pbc_dtype = dtype if pbc_dtype is None else pbc_dtype
+
+        for frame, coords, pbc in stream:
+            if out is not None and coords is not None:
+                out[:] = coords
+                coords = out
+            # The boxes are read in double precision whatever the type of the coordinates
+            if pbc is not None:
+                pbc = pbc.astype(pbc_dtype, copy=False)
+            values = {'coords': coords, 'pbc': pbc, 'time': self._times[frame] if 'time' in fields else None}
+            yield (frame,) + tuple(values[field] for field in fields)
+
+    def _iter_frames(self, frames, indices, read_coords, read_pbc, dtype=np.float64, copy=True):
+        """Iterate sequentially over a range of frames bypassing the frame cache.
+
+        The default implementation reads blocks of consecutive frames. Readers which can stream their trajectory
+        should override it.
+
+        Args:
+            frames (range): the frames
+            indices (numpy.ndarray): the indexes of the atoms to read. If None, all the atoms are read.
+            read_coords (bool): whether the coordinates should be read
+            read_pbc (bool): whether the bounding boxes should be read
+            dtype (numpy.dtype): the floating point type of the coordinates. The bounding boxes are always float64.
+            copy (bool): whether the reader must yield new arrays rather than its internal buffers
+
+        Returns:
+            generator: the frame, the coordinates (or None) and the bounding box (or None) of each frame
+        """
+
+        return self._iter_batches(frames, indices, read_coords, read_pbc, dtype, self._read_frames, self._read_pbcs)
+
+    def _iter_batches(self, frames, indices, read_coords, read_pbc, dtype, read_frames, read_pbcs):
+        """Iterate over a range of frames by reading blocks of frames.
+
+        Args:
+            frames (range): the frames
+            indices (numpy.ndarray): the indexes of the atoms to read. If None, all the atoms are read.
+            read_coords (bool): whether the coordinates should be read
+            read_pbc (bool): whether the bounding boxes should be read
+            dtype (numpy.dtype): the floating point type of the coordinates. The bounding boxes are always float64.
+            read_frames (callable): the function which reads the coordinates of a block of frames
+            read_pbcs (callable): the function which reads the bounding boxes of a block of frames
+
+        Returns:
+            generator: the frame, the coordinates (or None) and the bounding box (or None) of each frame
+        """
+
+        n_selected_atoms = self._n_atoms if indices is None else len(indices)
+        batch_size = max(ITER_BATCH_SIZE//max(24*n_selected_atoms, 1), 1)
+
+        for start in range(0, len(frames), batch_size):
+            batch = frames[start:start + batch_size]
+            coords = read_frames(batch, indices, dtype=dtype) if read_coords else [None]*len(batch)
+            pbcs = read_pbcs(batch, dtype=np.float64) if read_pbc else [None]*len(batch)
+            yield from zip(batch, coords, pbcs)
+
+    def check_indices(self, indices):
+        """Check a selection of atom indexes.
+
+        Args:
+            indices (list of int): the indexes of the atoms
+
+        Returns:
+            numpy.ndarray: the indexes
+
+        Raises:
+            InvalidAtomError: if one of the indexes is out of range
+        """
+
+        indices = np.asarray(indices, dtype=np.int64)
+
+        if indices.size and (indices.min() < 0 or indices.max() >= self._n_atoms):
+            raise InvalidAtomError('Invalid atom index')
+
+        return indices
+
     def get_atom_indexes(self, residue_names, atom_names):
         """Return the nested list of the indexes of the atoms whose residue and name are respectively in the provided 
         list of residue and atom names.
@@ -105,24 +609,34 @@ class IReader(abc.ABC):
             atom_names (list of str): the atoms to scan
         """
 
-        indexes = []
-        for i, at in enumerate(self._atom_names):
-            current_residue = self._residue_names[i]
-            if current_residue not in residue_names:
-                continue
+        offsets, atom_indices = self.get_molecule_layout(residue_names, atom_names)
 
-            if at in atom_names:
-                indexes.append(i)
+        atom_indices = atom_indices.tolist()
+        offsets = offsets.tolist()
 
-        indexes_per_molecule = collections.OrderedDict()
-        for idx in indexes:
-            resid = self._residue_ids[idx]
-            indexes_per_molecule.setdefault(resid, []).append(idx)
-
-        indexes_per_molecule = list(indexes_per_molecule.values())
+        indexes_per_molecule = [atom_indices[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
 
         return indexes_per_molecule
 
+    def get_molecule_layout(self, residue_names, atom_names):
+        """Return the atoms whose residue and name are respectively in the provided list of residue and atom names
+        grouped per molecule in a compressed sparse row layout.
+
+        Args:
+            residue_names (list of str): the residues to scan
+            atom_names (list of str): the atoms to scan
+
+        Returns:
+            2-tuple: the int32 offsets and atom indices (see molecule_layout)
+        """
+
+        # The selection is done through the inverted indexes of the topology rather than atom per atom
+        selection = self.selection
+        mask = selection.select_values('residue_names', residue_names) & \
+            selection.select_values('atom_names', atom_names)
+
+        return selection.group_by_molecule(mask)
+
     def guess_atom_types(self):
         """Guess the atom type (element) from their atom names.
 
@@ -131,48 +645,98 @@ class IReader(abc.ABC):
         For unknown residue, the strategy is opposite. Indeed, we start from the 
         right and search by decreasing length until a valid element is found. 
         The elemenents are searched in an internal YAML database.
+
+        The types are guessed once per distinct atom name and broadcast to the atoms (see
+        waterstay.readers.atom_types.guess_atom_types).
         """
 
-        # Retrieve all the chemical symbols from the internal database
-        symbols = [at['symbol'].upper() for at in CHEMICAL_ELEMENTS['atoms'].values()]
+        self._topology.atom_types = guess_atom_types(self._topology.residue_names, self._topology.atom_names)
 
-        self._atom_types = []
-        for i in range(self._n_atoms):
+        # The element index is stale
+        if self._selection is not None:
+            self._selection.clear()
 
-            atom_name = self._atom_names[i]
-            residue_name = self._residue_names[i]
+    def get_frame_property(self, name):
+        """Return a cached per-frame property.
 
-            # Remove the trailing and initial digits from the upperized atom names
-            upper_atom_name = atom_name.upper()
-            upper_atom_name = upper_atom_name.lstrip('0123456789').rstrip('0123456789')
+        The property is loaded from the index of the trajectory at the first access. The frames for which it is
+        unknown are NaN.
 
-            # Case of the an atom that belongs to a standard residue
-            # Guess the atom type by the starting from the first alpha letter from the left,
-            # increasing the word by one letter if there was no success in guessing the atom type
-            if residue_name in STANDARD_RESIDUES:
+        Args:
+            name (str): the name of the property (one of FRAME_PROPERTIES)
 
-                start = 1
-                while True:
-                    upper_atom_name = upper_atom_name[:start]
-                    if upper_atom_name in symbols:
-                        self._atom_types.append(upper_atom_name.capitalize())
-                        break
-                    if start > len(atom_name):
-                        raise ValueError('Unknown atom type: {}'.format(atom_name))
-                    start += 1
-            # Case of the an atom that does not belong to a standard residue
-            # Guess the atom type by the starting from whole atom name,
-            # decreasing the word by one letter from the right if there was no success in guessing the atom type
-            else:
-                start = len(upper_atom_name)
-                while True:
-                    upper_atom_name = upper_atom_name[:start]
-                    if upper_atom_name in symbols:
-                        self._atom_types.append(upper_atom_name.capitalize())
-                        break
-                    if start == 0:
-                        raise ValueError('Unknown atom type: {}'.format(atom_name))
-                    start -= 1
+        Returns:
+            numpy.ndarray: the (n_frames, ...) values of the property
+        """
+
+        values = self._frame_properties.get(name)
+        if values is not None and len(values) == self._n_frames:
+            return values
+
+        values = np.full((self._n_frames,) + FRAME_PROPERTIES[name], np.nan, dtype=np.float64)
+
+        # The index of a trajectory which has been appended to only holds the values of the former frames
+        if self._index is not None and name in self._index:
+            stored = self._index[name][:self._n_frames]
+            values[:len(stored)] = stored
+
+        self._frame_properties[name] = values
+
+        return values
+
+    def get_frame_bounds(self):
+        """Return the cached per-frame bounds of the coordinates.
+
+        Returns:
+            numpy.ndarray: the (n_frames, 2, 3) lower and upper bounds, NaN for the frames whose bounds are unknown
+        """
+
+        return self.get_frame_property('frame_bounds')
+
+    def get_frame_boxes(self):
+        """Return the cached per-frame bounding boxes.
+
+        Returns:
+            numpy.ndarray: the (n_frames, 3, 3) boxes, NaN for the frames whose box is unknown
+        """
+
+        return self.get_frame_property('frame_boxes')
+
+    def frame_bounds(self, frame, coords=None):
+        """Return the bounds of the coordinates at a given frame.
+
+        The bounds are computed once and cached.
+
+        Args:
+            frame (int): the selected frame
+            coords (numpy.ndarray): the coordinates of the frame if they have already been read
+
+        Returns:
+            2-tuple: the lower and upper bounds
+        """
+
+        frame %= self._n_frames
+
+        frame_bounds = self.get_frame_bounds()
+        if np.isnan(frame_bounds[frame, 0, 0]):
+            if coords is None:
+                coords = self.read_frame(frame, copy=False)
+            frame_bounds[frame, 0] = coords.min(axis=0)
+            frame_bounds[frame, 1] = coords.max(axis=0)
+
+        return frame_bounds[frame, 0].copy(), frame_bounds[frame, 1].copy()
+
+    def save_frame_properties(self):
+        """Save the cached per-frame properties to the index of the trajectory, if the reader has one.
+        """
+
+        if self._index is None:
+            return
+
+        for name, values in self._frame_properties.items():
+            self._index[name] = values
+
+        self._index.save()
 
     def read_atom_trajectory(self, index):
         """Read the trajectory of a single atom with a given index
@@ -184,22 +748,60 @@ class IReader(abc.ABC):
         if index < 0 or index >= self._n_atoms:
             raise InvalidAtomError('Invalid atom index')
 
-        coords = []
-        lower_bounds = []
-        upper_bounds = []
-        for f in range(self._n_frames):
-            frame = self.read_frame(f)
-            coords.append(frame[index, :])
-            lower_bounds.append(frame.min(axis=0))
-            upper_bounds.append(frame.max(axis=0))
+        coords, lower_bounds, upper_bounds = self.read_atom_trajectories([index])
+
+        return coords[:, 0, :], lower_bounds, upper_bounds
+
+    def read_atom_trajectories(self, indices, frames=None):
+        """Read the trajectories of several atoms in a single pass over the trajectory.
 
-        coords = np.array(coords)
-        lower_bounds = np.array(lower_bounds)
-        upper_bounds = np.array(upper_bounds)
+        The per-frame bounds of the coordinates of the whole system are returned alongside. They are computed during the
+        first full pass over a frame and cached, so that once they are known only the selected atoms are read.
 
-        return coords, lower_bounds, upper_bounds
+        Args:
+            indices (list of int): the indexes of the atoms
+            frames (list of int): the frames to read. If None, all the frames are read.
+
+        Returns:
+            3-tuple: the (n_selected_frames, n_selected_atoms, 3) coordinates of the atoms and the
+            (n_selected_frames, 3) lower and upper bounds of the coordinates of the system
+        """
 
-    def residues_in_shell(self, residue_names, atom_names, center, radius, *, selected_frames=None):
+        indices = self.check_indices(indices)
+
+        if frames is None:
+            frames = range(self._n_frames)
+        else:
+            # Frames forming a range are streamed sequentially
+            frames = as_range(frames, self._n_frames)
+
+        frame_bounds = self.get_frame_bounds()
+
+        coords = np.empty((len(frames), len(indices), 3), dtype=np.float64)
+
+        # Only the selected atoms have to be read if the bounds of all the frames are known
+        frame_array = np.asarray(frames, dtype=np.int64)
+        if not np.isnan(frame_bounds[frame_array, 0, 0]).any():
+            for f, (_, frame, _) in enumerate(Prefetcher(self, frames, indices=indices)):
+                coords[f] = frame
+        else:
+            # The next frames are read in the background while the bounds of the current one are computed
+            frame_boxes = self.get_frame_boxes()
+            for f, (frame_index, frame, pbc) in enumerate(Prefetcher(self, frames)):
+                coords[f] = frame[indices, :]
+                frame_bounds[frame_index, 0] = frame.min(axis=0)
+                frame_bounds[frame_index, 1] = frame.max(axis=0)
+                frame_boxes[frame_index] = pbc
+
+            # The bounds and the boxes are persisted so that the next sessions do not have to read the full frames
+            self.save_frame_properties()
+
+        bounds = frame_bounds[frame_array]
+
+        return coords, bounds[:, 0, :].copy(), bounds[:, 1, :].copy()
+
+    def residues_in_shell(self, residue_names, atom_names, center, radius, *, selected_frames=None, dtype=np.float64,
+                          num_threads=0, n_workers=1):
         """Compute the residence time of molecules of a given type which are within a shell around an atomic center.
 
         Args:
@@ -207,42 +809,149 @@ class IReader(abc.ABC):
             target_atoms (list of str): the atoms to scan
             center (int): the index of the atomic center
             radius (float): the radius to scan around the atomic center
+            selected_frames (list of int): the frames to scan. If None, all the frames are scanned.
+            dtype (numpy.dtype): the floating point type of the coordinates used for the scan. numpy.float32 halves
+                the memory traffic at the cost of the precision.
+            num_threads (int): the number of threads used to scan each block of frames. If <= 0, the OpenMP default
+                is used, split between the worker processes.
+            n_workers (int): the number of worker processes. If > 1, the frames are split in contiguous shards, each
+                one scanned by a worker process with its own reader.
         """
 
         if selected_frames is None:
-            selected_frames = list(range(self._n_frames))
+            selected_frames = range(self._n_frames)
+        else:
+            # Frames forming a range are streamed sequentially
+            selected_frames = as_range(selected_frames, self._n_frames)
 
         # Retrieve the indexes of the atoms which belongs to each molecule of the selected type
-        target_indexes = self.get_atom_indexes(residue_names, atom_names)
-        if not target_indexes:
+        target_offsets, target_indices = self.get_molecule_layout(residue_names, atom_names)
+        n_molecules = len(target_offsets) - 1
+        if n_molecules == 0:
             logging.warning('No atom found that matches {}@{}'.format(atom_names, residue_names))
             return None
 
-        # Initialize the output array
-        occupancies = np.zeros((len(target_indexes), len(selected_frames)), dtype=np.int32)
+        # Only the atomic center and the target atoms are read. Their indexes are remapped to their position in the
+        # selection.
+        selection = np.unique(np.append(target_indices, center))
+        local_target_indices = np.searchsorted(selection, target_indices).astype(np.int32)
+        local_center = int(np.searchsorted(selection, center))
+
+        layout = (selection, target_offsets, local_target_indices, local_center)
 
         progress_bar.reset(len(selected_frames))
 
-        # Loop over the frame of the trajectory
-        for i, frame in enumerate(selected_frames):
+        n_scanned = 0
 
-            # Read the frame at time=frame
-            coords = self.read_frame(frame)
+        def report(n_frames):
+            nonlocal n_scanned
+            n_scanned += n_frames
+            progress_bar.update(n_scanned)
 
-            # Read the direct cell at time=frame
-            cell = self.read_pbc(frame)
+        n_workers = min(n_workers, len(selected_frames))
+        if n_workers > 1:
+            occupancies = self._scan_shell_parallel(selected_frames, layout, radius, dtype, num_threads, n_workers,
+                                                    report)
+        else:
+            # Initialize the output array. It is stored frame-major so that the kernel fills a contiguous row per
+            # frame.
+            occupancies = np.zeros((len(selected_frames), n_molecules), dtype=np.int32)
+            self._scan_shell(selected_frames, layout, radius, occupancies, dtype, num_threads, report)
 
-            # Compute the reverse cell at time=frame
-            rcell = np.linalg.inv(cell)
+        mol_ids = self._topology.residue_ids[target_indices[target_offsets[:-1]]].tolist()
 
-            # Scan for the molecules of the selected type which are found around the atomic center by the selected radius
-            atoms_in_shell(coords, cell, rcell, target_indexes, center, radius, occupancies[:, i])
+        selected_times = [self._times[f] for f in selected_frames]
+        occupancies = pd.DataFrame(occupancies.T, index=mol_ids, columns=selected_times)
 
-            progress_bar.update(i+1)
+        return occupancies
 
-        mol_ids = [self._residue_ids[v[0]] for v in target_indexes]
+    def _scan_shell(self, frames, layout, radius, occupancies, dtype, num_threads, report):
+        """Fill the occupancies of the molecules within a shell around an atomic center for a sequence of frames.
 
-        selected_times = [self._times[f] for f in selected_frames]
-        occupancies = pd.DataFrame(occupancies, index=mol_ids, columns=selected_times)
+        Args:
+            frames (list of int or range): the frames to scan
+            layout (tuple): the indexes of the atoms to read, the offsets of the molecules, the indexes of their atoms
+                and the index of the atomic center, the latter two being positions in the atoms to read
+            radius (float): the radius of the shell
+            occupancies (numpy.ndarray): the (n_frames, n_molecules) int32 output occupancies
+            dtype (numpy.dtype): the floating point type of the coordinates used for the scan
+            num_threads (int): the number of threads used to scan each block of frames
+            report (callable): the function called with the number of frames scanned after each block
+        """
+
+        selection, target_offsets, local_target_indices, local_center = layout
+
+        # Loop over the blocks of frames of the trajectory. The next blocks of frames and direct cells are read in the
+        # background while the current one is scanned.
+        first = 0
+        for batch, coords, cells in Prefetcher(self, frames, indices=selection, dtype=dtype).iter_blocks():
+
+            last = first + len(batch)
+
+            # Compute the reverse cells of the block
+            rcells = np.linalg.inv(cells)
+
+            # Scan for the molecules of the selected type which are found around the atomic center by the selected
+            # radius. The frames and the molecules of the block are scanned in parallel.
+            atoms_in_shell_batch(coords, cells, rcells, target_offsets, local_target_indices, local_center, radius,
+                                 occupancies[first:last], num_threads)
+
+            first = last
+
+            report(len(batch))
+
+    def _scan_shell_parallel(self, frames, layout, radius, dtype, num_threads, n_workers, report):
+        """Compute the occupancies of the molecules within a shell around an atomic center with a pool of worker
+        processes.
+
+        The frames are split in contiguous shards so that the ranges of frames are still streamed. Each worker reopens
+        the trajectory and writes the occupancies of its shard in an occupancy matrix held in shared memory. The
+        progress of the workers is sent back through a queue.
+
+        Args:
+            frames (list of int or range): the frames to scan
+            layout (tuple): see _scan_shell
+            radius (float): the radius of the shell
+            dtype (numpy.dtype): the floating point type of the coordinates used for the scan
+            num_threads (int): the number of threads used by each worker. If <= 0, the OpenMP default is split
+                between the workers.
+            n_workers (int): the number of worker processes
+            report (callable): the function called with the number of frames scanned by the workers
+
+        Returns:
+            numpy.ndarray: the (n_frames, n_molecules) int32 occupancies
+        """
+
+        shape = (len(frames), len(layout[1]) - 1)
+
+        if num_threads <= 0:
+            num_threads = max(max_threads()//n_workers, 1)
+
+        reader_args, reader_kwargs = self.open_arguments()
+
+        bounds = np.linspace(0, len(frames), n_workers + 1).astype(np.int64).tolist()
+
+        # A new shared memory block is filled with zeros
+        shared = shared_memory.SharedMemory(create=True, size=max(4*shape[0]*shape[1], 1))
+        try:
+            tasks = [(type(self), reader_args, reader_kwargs, shared.name, shape, start, frames[start:end], layout,
+                      radius, dtype, num_threads) for start, end in zip(bounds[:-1], bounds[1:])]
+
+            progress = multiprocessing.Queue()
+            with multiprocessing.Pool(n_workers, initializer=_init_shell_worker, initargs=(progress,)) as pool:
+                result = pool.map_async(_scan_shell_shard, tasks)
+                while True:
+                    try:
+                        report(progress.get(timeout=PROGRESS_POLLING_INTERVAL))
+                    except queue.Empty:
+                        if result.ready():
+                            break
+                # Raise the error of a failed worker if any
+                result.get()
+
+            occupancies = np.ndarray(shape, dtype=np.int32, buffer=shared.buf).copy()
+        finally:
+            shared.close()
+            shared.unlink()
 
         return occupancies
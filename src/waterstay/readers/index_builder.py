@@ -0,0 +1,175 @@
+import multiprocessing
+import os
+import re
+
+import numpy as np
+
+from waterstay.readers.i_reader import InvalidFileError
+
+# The default size of the byte ranges scanned by each task
+CHUNK_SIZE = 64*1024*1024
+
+# The amount of data read past the end of a byte range to complete the title lines which overlap two ranges
+OVERLAP_SIZE = 64*1024
+
+TIME_PATTERN = re.compile(b'.* t= (.*) step=')
+
+
+def find_title_lines(fin, start, end, title_prefix=b''):
+    """Find the title lines (the lines containing a ' t= ' field) which start in a given byte range of a file.
+
+    Args:
+        fin (file): the trajectory file opened in binary mode
+        start (int): the starting offset of the byte range
+        end (int): the ending offset of the byte range
+        title_prefix (bytes): the prefix that a title line must start with
+
+    Returns:
+        list of tuple: the offset and the contents of the title lines
+    """
+
+    # Read one byte before the range to know whether the range starts with a new line
+    block_start = max(start - 1, 0)
+    fin.seek(block_start)
+    block = fin.read(end - block_start + OVERLAP_SIZE)
+
+    title_lines = []
+    pos = block.find(b' t= ')
+    while pos != -1:
+        line_start = block.rfind(b'\n', 0, pos) + 1
+        # A line starting before the range belongs to the previous range
+        if line_start == 0 and block_start != 0:
+            pos = block.find(b' t= ', pos + 1)
+            continue
+        if block_start + line_start >= end:
+            break
+        line_end = block.find(b'\n', pos)
+        if line_end == -1:
+            line_end = len(block)
+        line = block[line_start:line_end]
+        if line.startswith(title_prefix):
+            title_lines.append((block_start + line_start, line))
+        pos = block.find(b' t= ', line_end)
+
+    return title_lines
+
+
+def scan_chunk(filename, start, end, frame_layout, title_prefix, n_atoms, coords_size):
+    """Locate the frames whose title line starts in a given byte range of a trajectory file.
+
+    Args:
+        filename (str): the trajectory filename
+        start (int): the starting offset of the byte range
+        end (int): the ending offset of the byte range
+        frame_layout (callable): the function which returns the layout of a frame given the offset of its title line
+        title_prefix (bytes): the prefix that a title line must start with
+        n_atoms (int): the number of atoms
+        coords_size (int): the size of an atom record
+
+    Returns:
+        list of tuple: the starting offset, the time, the offsets of the coordinates and of the box and the ending
+        offset of the frames found in the range
+    """
+
+    with open(filename, 'rb') as fin:
+        return scan_stream(fin, start, end, frame_layout, title_prefix, n_atoms, coords_size)
+
+
+def scan_stream(fin, start, end, frame_layout, title_prefix, n_atoms, coords_size):
+    """Locate the frames whose title line starts in a given byte range of an opened trajectory file.
+
+    Args:
+        fin (file): the trajectory file opened in binary mode
+        start (int): the starting offset of the byte range
+        end (int): the ending offset of the byte range
+        frame_layout (callable): the function which returns the layout of a frame given the offset of its title line
+        title_prefix (bytes): the prefix that a title line must start with
+        n_atoms (int): the number of atoms
+        coords_size (int): the size of an atom record
+
+    Returns:
+        list of tuple: the starting offset, the time, the offsets of the coordinates and of the box and the ending
+        offset of the frames found in the range
+    """
+
+    frames = []
+    for title_start, title in find_title_lines(fin, start, end, title_prefix):
+        match = TIME_PATTERN.search(title)
+        if match is None:
+            continue
+        layout = frame_layout(fin, title_start, n_atoms, coords_size)
+        if layout is None:
+            continue
+        unit_start, frame_start, pbc_start, frame_end = layout
+        frames.append((unit_start, float(match.groups()[0]), frame_start, pbc_start, frame_end))
+
+    return frames
+
+
+def _scan_chunk(args):
+    return scan_chunk(*args)
+
+
+def build_index(filename, start, frame_layout, title_prefix, n_atoms, coords_size, n_workers=1, chunk_size=CHUNK_SIZE,
+                fin=None):
+    """Build the frame index of an ASCII trajectory file.
+
+    The file is split in byte ranges which are scanned in parallel by a pool of worker processes. The frames found in
+    each range are then merged and checked to form a contiguous sequence.
+
+    If an opened stream is provided (e.g. the decompressed stream of a compressed trajectory), the byte ranges are
+    scanned sequentially from that stream until its end, whose offset does not have to be known beforehand.
+
+    Args:
+        filename (str): the trajectory filename
+        start (int): the offset of the first frame to index
+        frame_layout (callable): the function which returns the layout of a frame given the offset of its title line
+        title_prefix (bytes): the prefix that a title line must start with
+        n_atoms (int): the number of atoms
+        coords_size (int): the size of an atom record
+        n_workers (int): the number of worker processes
+        chunk_size (int): the size of the byte ranges
+        fin (file): the opened stream to scan. If None, the file is scanned by path.
+
+    Returns:
+        4-tuple: the times, the offsets of the coordinates, the offsets of the boxes of the indexed frames alongside
+        with the offset of the end of the last complete frame
+    """
+
+    if fin is not None:
+        chunks = []
+        chunk_start = start
+        while True:
+            chunks.append(scan_stream(fin, chunk_start, chunk_start + chunk_size, frame_layout, title_prefix, n_atoms,
+                                      coords_size))
+            chunk_start += chunk_size
+            fin.seek(chunk_start)
+            if not fin.read(1):
+                break
+    else:
+        size = os.path.getsize(filename)
+
+        bounds = list(range(start, size, chunk_size)) + [size]
+        tasks = [(filename, bounds[i], bounds[i+1], frame_layout, title_prefix, n_atoms, coords_size)
+                 for i in range(len(bounds) - 1)]
+
+        if n_workers > 1 and len(tasks) > 1:
+            with multiprocessing.Pool(min(n_workers, len(tasks))) as pool:
+                chunks = pool.map(_scan_chunk, tasks)
+        else:
+            chunks = [_scan_chunk(task) for task in tasks]
+
+    frames = [frame for chunk in chunks for frame in chunk]
+
+    # Each frame must start where the previous one ended. Anything else is garbage in the trajectory
+    end_offset = start
+    for unit_start, _, _, _, frame_end in frames:
+        if unit_start != end_offset:
+            raise InvalidFileError('Invalid trajectory file {}: unexpected data at offset {}'.format(filename, end_offset))
+        end_offset = frame_end
+
+    times = np.array([frame[1] for frame in frames], dtype=np.float64)
+    frame_starts = np.array([frame[2] for frame in frames], dtype=np.int64)
+    pbc_starts = np.array([frame[3] for frame in frames], dtype=np.int64)
+
+    return times, frame_starts, pbc_starts, end_offset
@@ -0,0 +1,162 @@
+import os
+
+import numpy as np
+
+import MDAnalysis
+
+from waterstay.readers.i_reader import InvalidFileError, IReader
+from waterstay.readers.topology import Topology
+
+
+class MDAnalysisReader(IReader):
+    """This class implements the base class of the readers of GROMACS binary trajectories read through MDAnalysis.
+
+    The topology is read from the .tpr file next to the trajectory. The concrete readers must set the universe and may
+    read the frames by their own means, in which case they only fall back on the methods of this class when the frames
+    are read through the universe.
+    """
+
+    def tpr_file(self):
+        """Return the .tpr file next to the trajectory.
+
+        Returns:
+            str: the path of the .tpr file
+
+        Raises:
+            InvalidFileError: if the .tpr file does not exist
+        """
+
+        basename, _ = os.path.splitext(self._filename)
+
+        tpr_file = basename + '.tpr'
+
+        if not os.path.exists(tpr_file):
+            raise InvalidFileError('Could not find tpr file {}'.format(tpr_file))
+
+        return tpr_file
+
+    def open_universe(self, with_trajectory=True):
+        """Open the MDAnalysis universe of the trajectory and set the topology of the reader from it.
+
+        Args:
+            with_trajectory (bool): if False, only the topology is read by MDAnalysis
+        """
+
+        tpr_file = self.tpr_file()
+
+        if with_trajectory:
+            self._universe = MDAnalysis.Universe(tpr_file, self._filename)
+        else:
+            self._universe = MDAnalysis.Universe(tpr_file)
+
+        atoms = self._universe.atoms
+
+        self._topology = Topology(atoms.resnums, atoms.resnames, atoms.ids, atoms.names)
+
+        self._n_atoms = len(atoms)
+
+    def _read_frame(self, frame, indices=None, dtype=np.float64, copy=True):
+        """Read the coordinates at a given frame.
+
+        Args:
+            frame (int): the selected frame
+            indices (list of int): the indexes of the atoms to read. If None, all the atoms are read.
+            dtype (numpy.dtype): the floating point type of the coordinates
+            copy (bool): if False and dtype is float32, the positions buffer of the MDAnalysis timestep is returned for
+                a full frame. It is overwritten by the next read.
+        """
+
+        positions = self._universe.trajectory[frame].positions
+
+        if indices is not None:
+            return positions[self.check_indices(indices)].astype(dtype, copy=False)
+
+        return positions.astype(dtype, copy=copy)
+
+    def _read_pbc(self, frame):
+        """Read the bounding box at a given frame.
+
+        Args:
+            frame (int): the selected frame
+        """
+
+        return self._universe.trajectory[frame].triclinic_dimensions
+
+    def _read_frames(self, frames, indices=None, out=None, dtype=np.float64):
+        """Read the coordinates at several frames.
+
+        Args:
+            frames (list of int): the selected frames
+            indices (list of int): the indexes of the atoms to read. If None, all the atoms are read.
+            out (numpy.ndarray): the (n_selected_frames, n_selected_atoms, 3) output array. If None, a new array is
+                allocated.
+            dtype (numpy.dtype): the floating point type of the allocated output array
+
+        Returns:
+            numpy.ndarray: the coordinates
+        """
+
+        if indices is not None:
+            indices = self.check_indices(indices)
+
+        if out is None:
+            n_selected_atoms = self._n_atoms if indices is None else len(indices)
+            out = np.empty((len(frames), n_selected_atoms, 3), dtype=dtype)
+
+        # Iterate over the selected frames through a sliced trajectory rather than through random-access lookups
+        for i, ts in enumerate(self._universe.trajectory[np.asarray(frames)]):
+            out[i] = ts.positions if indices is None else ts.positions[indices]
+
+        return out
+
+    def _read_pbcs(self, frames, out=None, dtype=np.float64):
+        """Read the bounding boxes at several frames.
+
+        Args:
+            frames (list of int): the selected frames
+            out (numpy.ndarray): the (n_selected_frames, 3, 3) output array. If None, a new array is allocated.
+            dtype (numpy.dtype): the floating point type of the allocated output array
+
+        Returns:
+            numpy.ndarray: the bounding boxes
+        """
+
+        if out is None:
+            out = np.empty((len(frames), 3, 3), dtype=dtype)
+
+        for i, ts in enumerate(self._universe.trajectory[np.asarray(frames)]):
+            out[i] = ts.triclinic_dimensions
+
+        return out
+
+    def _iter_frames(self, frames, indices, read_coords, read_pbc, dtype=np.float64, copy=True):
+        """Iterate sequentially over a range of frames.
+
+        Args:
+            frames (range): the frames
+            indices (numpy.ndarray): the indexes of the atoms to read. If None, all the atoms are read.
+            read_coords (bool): whether the coordinates should be read
+            read_pbc (bool): whether the bounding boxes should be read
+            dtype (numpy.dtype): the floating point type of the coordinates. The bounding boxes are always float64.
+            copy (bool): if False and dtype is float32, the positions buffer of the MDAnalysis timestep is yielded
+                for full frames. It is overwritten at the next iteration.
+
+        Returns:
+            generator: the frame, the coordinates (or None) and the bounding box (or None) of each frame
+        """
+
+        if not frames:
+            return
+
+        # A sliced trajectory is read sequentially by MDAnalysis. A descending range ending at the first frame has a
+        # stop of -1, which MDAnalysis would read as the last frame.
+        stop = frames.stop if frames.stop >= 0 else None
+        for frame, ts in zip(frames, self._universe.trajectory[frames.start:stop:frames.step]):
+            coords = None
+            if read_coords:
+                if indices is None:
+                    coords = ts.positions.astype(dtype, copy=copy)
+                else:
+                    coords = ts.positions[indices].astype(dtype, copy=False)
+            pbc = ts.triclinic_dimensions.astype(np.float64) if read_pbc else None
+            yield frame, coords, pbc
@@ -1,66 +1,99 @@
 import logging
-import re
 
 import numpy as np
 
+from waterstay.extensions.parse_coordinates import parse_coordinates, parse_selected_coordinates
 from waterstay.readers.ascii_reader import ASCIIReader
 from waterstay.readers.i_reader import InvalidFileError
 from waterstay.readers.reader_registry import register_reader
+from waterstay.readers.topology import Topology
+
+
+def pdb_frame_layout(fin, title_start, n_atoms, coords_size):
+    """Return the layout of the PDB frame whose TITLE line starts at a given offset.
+
+    A frame is made of a REMARK, a TITLE, a REMARK, a CRYST1 and a MODEL lines followed by the atom records and by a TER
+    and an ENDMDL lines.
+
+    Args:
+        fin (file): the trajectory file opened in binary mode
+        title_start (int): the offset of the TITLE line
+        n_atoms (int): the number of atoms
+        coords_size (int): the size of an atom record
+
+    Returns:
+        4-tuple: the starting offset, the offsets of the coordinates and of the box and the ending offset of the frame
+        or None if the frame is incomplete or if the line is not a frame title
+    """
+
+    # The frame starts with the line preceding the TITLE line
+    if title_start == 0:
+        return None
+    back = min(title_start, 4096)
+    fin.seek(title_start - back)
+    data = fin.read(back)
+    frame_unit_start = title_start - back + data.rfind(b'\n', 0, back - 1) + 1
+
+    fin.seek(title_start)
+    for _ in range(2):
+        if not fin.readline().endswith(b'\n'):
+            return None
+
+    pbc_start = fin.tell()
+    if not fin.readline().startswith(b'CRYST1'):
+        return None
+
+    if not fin.readline().startswith(b'MODEL'):
+        return None
+
+    frame_start = fin.tell()
+
+    fin.seek(frame_start + n_atoms*coords_size)
+    if not fin.readline().startswith(b'TER'):
+        return None
+
+    # Only the ENDMDL line of the last frame of the file may lack its newline character
+    if not fin.readline().startswith(b'ENDMDL'):
+        return None
+
+    return frame_unit_start, frame_start, pbc_start, fin.tell()
 
 
 @register_reader('.pdb')
+@register_reader('.pdb.gz')
+@register_reader('.pdb.xz')
 class PDBReader(ASCIIReader):
 
-    def __init__(self, filename):
+    # The function which locates the different parts of a frame from its TITLE line
+    frame_layout = staticmethod(pdb_frame_layout)
+
+    # The prefix of the lines which hold the time of a frame
+    title_prefix = b'TITLE'
 
-        super(PDBReader, self).__init__(filename)
+    def __init__(self, filename, use_mmap=False, index_workers=None):
+
+        super(PDBReader, self).__init__(filename, use_mmap=use_mmap)
 
         # Compute the number of atoms
         self._n_atoms = 0
         while True:
             line = self._fin.readline()
-            if line[:3] == "TER":
+            if not line:
+                raise InvalidFileError('Invalid PDB file: no TER record found')
+            if line[:3] == b"TER":
                 break
             self._n_atoms += 1
 
         # Substract the first lines of the files
         self._n_atoms -= 5
 
-        self._fin.seek(0)
-
-        # Loop over the file to get the length of all title lines (:-( they change over the file)
-        # Compute also the number of frames
-        self._times = []
-        self._pbc_starts = []
-        self._frame_starts = []
-        self._n_frames = 0
-        eof = False
-        while True:
-            for i in range(self._n_atoms + 7):
-                line = self._fin.readline()
-                if not line:
-                    eof = True
-                    break
-                if i == 1:
-                    match = re.search('.* t= (.*) step=', line)
-                    if match is None:
-                        raise InvalidFileError('Invalid PDB file')
-                    self._times.append(float(match.groups()[0]))
-                if i == 2:
-                    self._pbc_starts.append(self._fin.tell())
-                elif i == 4:
-                    self._frame_starts.append(self._fin.tell())
-            if eof:
-                break
-
-            self._n_frames += 1
-
-        self._fin.seek(self._frame_starts[0])
-
         self._coords_size = 79
 
         self._frame_size = self._n_atoms*self._coords_size
 
+        # Build the frames index or reload it from its sidecar file
+        self.index_frames(index_workers)
+
         self.parse_first_frame()
 
         logging.info('Read {} successfully'.format(filename))
@@ -69,56 +102,31 @@ class PDBReader(ASCIIReader):
         """Parse the first frame to get resp. the residue ids and names and the atoms ids and names.
         """
 
-        # Rewind the file to the beginning of the first frame
-        self._fin.seek(self._frame_starts[0])
-        data = self._fin.read(self._frame_size)
-
-        self._atom_names = []
-        self._atom_ids = []
-        self._atom_types = []
-        self._residue_names = []
-        self._residue_ids = []
-
-        for i in range(self._n_atoms):
-            start = i*self._coords_size
-            end = start + self._coords_size
-            line = data[start:end]
-            self._atom_ids.append(int(line[6:11]))
-            self._atom_names.append(line[12:16].strip())
-            self._residue_names.append(line[17:20].strip())
-            self._residue_ids.append(int(line[22:26]))
+        # Parse the fixed-width columns of all the atom records of the first frame at once
+        self._topology = Topology.from_records(self.read_frame_records(0),
+                                               residue_id_columns=slice(22, 26),
+                                               residue_name_columns=slice(17, 20),
+                                               atom_id_columns=slice(6, 11),
+                                               atom_name_columns=slice(12, 16))
 
         self.guess_atom_types()
 
-    def read_frame(self, frame):
-        """Read the coordinates at a given frame.
+    def parse_frame(self, data, coords, indices=None):
+        """Parse the atom records of a frame.
 
         Args:
-            frame (int): the selected frame
+            data (bytes-like): the atom records
+            coords (numpy.ndarray): the (n_atoms, 3) output coordinates
+            indices (numpy.ndarray): the indexes of the records to parse. If None, all the records are parsed.
         """
 
-        # Fold the frame
-        frame %= self._n_frames
-
-        # Rewind the file to the beginning of the frame
-        self._fin.seek(self._frame_starts[frame])
-
-        data = self._fin.read(self._frame_size)
-
-        coords = np.empty((self._n_atoms, 3), dtype=np.float)
-
-        for i in range(self._n_atoms):
-            start = i*self._coords_size
-            end = start + self._coords_size
-            line = data[start:end]
-            x = float(line[30:38])
-            y = float(line[38:46])
-            z = float(line[46:54])
-            coords[i, :] = [x, y, z]
-
-        return coords
+        # Parse the x, y and z fixed-width columns of all the (selected) atoms at once
+        if indices is None:
+            parse_coordinates(data, self._coords_size, 30, 8, coords)
+        else:
+            parse_selected_coordinates(data, indices, self._coords_size, 30, 8, coords)
 
-    def read_pbc(self, frame):
+    def _read_pbc(self, frame):
         """Read the bounding box at a given frame.
 
         Args:
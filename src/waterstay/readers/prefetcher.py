@@ -0,0 +1,147 @@
+import queue
+import threading
+
+import numpy as np
+
+# The default size in bytes of the blocks of frames read at once by the background thread
+PREFETCH_BATCH_SIZE = 16*1024*1024
+
+# The default number of blocks of frames which can be read ahead of the consumer
+PREFETCH_DEPTH = 4
+
+
+class _Stop:
+    """This class implements the marker put in the queue by the background thread once all the frames have been read.
+    """
+
+
+class Prefetcher:
+    """This class implements an iterator over the frames of a trajectory which reads ahead in a background thread.
+
+    The frames are read by blocks with IReader.read_frames and IReader.read_pbcs in a background thread while the
+    consumer processes the current block. At most depth blocks are read ahead of the consumer, so that the reading
+    thread blocks when the consumer lags behind. The blocks are written in a ring of preallocated buffers, hence the
+    yielded arrays are only valid until the next iteration.
+
+    When the frames form a range, they are streamed with IReader.iter_frames rather than read by random access.
+
+    The reader must not be used by the consumer during the iteration.
+    """
+
+    def __init__(self, reader, frames, indices=None, depth=PREFETCH_DEPTH, batch_bytes=PREFETCH_BATCH_SIZE,
+                 dtype=np.float64):
+        """Constructor.
+
+        Args:
+            reader (IReader): the trajectory reader
+            frames (list of int or range): the frames to iterate over
+            indices (list of int): the indexes of the atoms to read. If None, all the atoms are read.
+            depth (int): the maximum number of blocks read ahead of the consumer
+            batch_bytes (int): the size in bytes of the blocks of frames read at once
+            dtype (numpy.dtype): the floating point type of the coordinates. The bounding boxes are always float64.
+        """
+
+        self._reader = reader
+
+        self._frames = frames if isinstance(frames, range) else list(frames)
+
+        self._indices = None if indices is None else reader.check_indices(indices)
+
+        self._depth = max(depth, 1)
+
+        n_selected_atoms = reader.n_atoms if self._indices is None else len(self._indices)
+
+        self._dtype = np.dtype(dtype)
+
+        self._batch_size = max(batch_bytes//max(3*self._dtype.itemsize*n_selected_atoms, 1), 1)
+
+        # The ring of buffers. The consumer holds one of them, the queue at most depth of them and the reading thread
+        # writes into another one.
+        n_buffers = self._depth + 2
+        batch_size = min(self._batch_size, max(len(self._frames), 1))
+        self._coords_buffers = [np.empty((batch_size, n_selected_atoms, 3), dtype=self._dtype) for _ in range(n_buffers)]
+        self._pbc_buffers = [np.empty((batch_size, 3, 3), dtype=np.float64) for _ in range(n_buffers)]
+
+    def __iter__(self):
+        """Iterate over the frames.
+
+        Returns:
+            generator: the frame, the coordinates and the bounding box of each frame
+        """
+
+        for batch, coords, pbcs in self.iter_blocks():
+            for frame, frame_coords, pbc in zip(batch, coords, pbcs):
+                yield frame, frame_coords, pbc
+
+    def iter_blocks(self):
+        """Iterate over the blocks of frames.
+
+        Each block holds as many frames as fit in batch_bytes. The blocks are only valid until the next iteration.
+
+        Returns:
+            generator: the frames, the (n_frames, n_atoms, 3) coordinates and the (n_frames, 3, 3) bounding boxes of each
+            block
+        """
+
+        blocks = queue.Queue(maxsize=self._depth)
+        stop = threading.Event()
+
+        thread = threading.Thread(target=self._read_ahead, args=(blocks, stop), daemon=True)
+        thread.start()
+
+        try:
+            while True:
+                block = blocks.get()
+                if block is _Stop:
+                    break
+                if isinstance(block, BaseException):
+                    raise block
+                yield block
+        finally:
+            # Release the reading thread if the consumer stopped early
+            stop.set()
+            while thread.is_alive():
+                try:
+                    blocks.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            thread.join()
+
+    def _read_ahead(self, blocks, stop):
+        """Read the blocks of frames and put them in the queue.
+
+        Args:
+            blocks (queue.Queue): the queue of blocks
+            stop (threading.Event): the event set by the consumer to stop the reading
+        """
+
+        stream = None
+        if isinstance(self._frames, range):
+            stream = self._reader.iter_frames(self._frames.start, self._frames.stop, self._frames.step,
+                                              fields=('coords', 'pbc'), indices=self._indices, dtype=self._dtype,
+                                              copy=False, pbc_dtype=np.float64)
+
+        try:
+            for i, start in enumerate(range(0, len(self._frames), self._batch_size)):
+                if stop.is_set():
+                    return
+                batch = self._frames[start:start + self._batch_size]
+                slot = i % len(self._coords_buffers)
+                coords = self._coords_buffers[slot][:len(batch)]
+                pbcs = self._pbc_buffers[slot][:len(batch)]
+                if stream is None:
+                    coords = self._reader.read_frames(batch, self._indices, out=coords)
+                    pbcs = self._reader.read_pbcs(batch, out=pbcs)
+                else:
+                    for j, (_, frame_coords, pbc) in zip(range(len(batch)), stream):
+                        coords[j] = frame_coords
+                        pbcs[j] = pbc
+                blocks.put((batch, coords, pbcs))
+        except BaseException as error:
+            blocks.put(error)
+            return
+        finally:
+            if stream is not None:
+                stream.close()
+
+        blocks.put(_Stop)
@@ -1,8 +1,163 @@
+import importlib
+import importlib.metadata
+import logging
+
+# The entry point group through which third-party packages register their readers. The name of an entry point is the
+# filename extension handled by the reader and its value the reader class, e.g.
+#   entry_points={'waterstay.readers': ['.foo = mypackage.foo_reader:FooReader']}
+ENTRY_POINT_GROUP = 'waterstay.readers'
+
+# The readers shipped with waterstay given as 'module:class' paths so that a reader module, and its dependencies, are
+# only imported when a file with a matching extension is opened
+BUILTIN_READERS = {'.gro': 'waterstay.readers.gro_reader:GroReader',
+                   '.gro.gz': 'waterstay.readers.gro_reader:GroReader',
+                   '.gro.xz': 'waterstay.readers.gro_reader:GroReader',
+                   '.pdb': 'waterstay.readers.pdb_reader:PDBReader',
+                   '.pdb.gz': 'waterstay.readers.pdb_reader:PDBReader',
+                   '.pdb.xz': 'waterstay.readers.pdb_reader:PDBReader',
+                   '.trr': 'waterstay.readers.trr_reader:TRRReader',
+                   '.wst': 'waterstay.readers.wst_reader:WSTReader',
+                   '.xtc': 'waterstay.readers.xtc_reader:XTCReader'}
+
+
+class ReaderRegistry(dict):
+    """This class implements the map between the filename extensions and their readers.
+
+    A reader which has not been imported yet is stored as its 'module:class' path or as its entry point, and is imported
+    when it is looked up. The values, the items and the copies of the registry are reader classes as for a plain dict,
+    hence they import all the registered readers.
+    """
+
+    def __getitem__(self, extension):
+        reader = dict.__getitem__(self, extension)
+        if isinstance(reader, type):
+            return reader
+
+        if isinstance(reader, str):
+            module_name, class_name = reader.split(':')
+            reader = getattr(importlib.import_module(module_name), class_name)
+        else:
+            reader = reader.load()
+
+        self[extension] = reader
+
+        return reader
+
+    def get(self, extension, default=None):
+        return self[extension] if extension in self else default
+
+    def values(self):
+        """Return the registered reader classes, importing them if needed.
+
+        Returns:
+            list of class: the reader classes
+        """
+
+        return [self[extension] for extension in self]
+
+    def items(self):
+        """Return the registered extensions with their reader class, importing the readers if needed.
+
+        Returns:
+            list of 2-tuple: the extensions and their reader class
+        """
+
+        return [(extension, self[extension]) for extension in self]
+
+    def copy(self):
+        """Return a copy of the registry as a plain dict of reader classes, importing the readers if needed.
+
+        Returns:
+            dict: the map between the extensions and their reader class
+        """
+
+        return dict(self.items())
+
+
 # This dict will store a map between a filename extension and the actual reader corresponding to that file extension
-REGISTERED_READERS = {}
+REGISTERED_READERS = ReaderRegistry(BUILTIN_READERS)
+
+# Whether the entry points have been scanned
+_entry_points_loaded = False
+
 
 def register_reader(typ):
     def decorator_register(cls):
-        REGISTERED_READERS[typ] = cls 
+        REGISTERED_READERS[typ] = cls
         return cls
     return decorator_register
+
+
+def load_entry_points():
+    """Register the readers declared by the installed packages through the waterstay.readers entry point group.
+
+    The entry points are only scanned once. The readers they declare are not imported until they are needed. A builtin
+    reader is not overridden by an entry point.
+    """
+
+    global _entry_points_loaded
+
+    if _entry_points_loaded:
+        return
+
+    _entry_points_loaded = True
+
+    entry_points = importlib.metadata.entry_points()
+    if hasattr(entry_points, 'select'):
+        entry_points = entry_points.select(group=ENTRY_POINT_GROUP)
+    else:
+        entry_points = entry_points.get(ENTRY_POINT_GROUP, [])
+
+    for entry_point in entry_points:
+        REGISTERED_READERS.setdefault(entry_point.name, entry_point)
+
+
+def registered_extensions():
+    """Return the filename extensions for which a reader is registered.
+
+    Returns:
+        list of str: the extensions
+    """
+
+    load_entry_points()
+
+    return list(REGISTERED_READERS)
+
+
+def load_reader(extension):
+    """Return the reader class registered for a given extension, importing it if needed.
+
+    Args:
+        extension (str): the extension
+
+    Returns:
+        class: the reader class or None if it could not be imported
+    """
+
+    try:
+        return REGISTERED_READERS[extension]
+    except (ImportError, AttributeError) as error:
+        logging.error('Could not load the reader for {} files: {}'.format(extension, error))
+        return None
+
+
+def find_reader(filename):
+    """Return the reader registered for the extension of a given file.
+
+    The longest matching extension wins so that e.g. a .gro.gz file is read by the reader registered for .gro.gz rather
+    than by the one registered for .gz. The reader module is imported at the first use.
+
+    Args:
+        filename (str): the trajectory filename
+
+    Returns:
+        class: the reader class or None if no reader is registered for the extension of the file
+    """
+
+    load_entry_points()
+
+    matches = [ext for ext in REGISTERED_READERS if filename.endswith(ext)]
+    if not matches:
+        return None
+
+    return load_reader(max(matches, key=len))
@@ -0,0 +1,442 @@
+import collections
+import fnmatch
+import re
+
+import numpy as np
+
+# The maximum number of compiled selections whose mask is kept in memory
+MAX_CACHED_SELECTIONS = 64
+
+# The selection keywords matching the categorical fields of the topology
+CATEGORICAL_KEYWORDS = {'resname': 'residue_names', 'name': 'atom_names', 'element': 'atom_types',
+                        'type': 'atom_types'}
+
+# The selection keywords matching the integer fields of the topology. index is the 0-based position of the atom.
+NUMERIC_KEYWORDS = {'resid': 'residue_ids', 'id': 'atom_ids', 'index': None}
+
+RESERVED_WORDS = {'and', 'or', 'not', 'all', 'none', '(', ')'} | set(CATEGORICAL_KEYWORDS) | set(NUMERIC_KEYWORDS)
+
+TOKEN_PATTERN = re.compile(r'\(|\)|[^\s()]+')
+
+RANGE_PATTERN = re.compile(r'^(-?\d+)(?:(?:-|:)(-?\d+))?$')
+
+
+class InvalidSelectionError(Exception):
+    """This class implements an exception raised in case of an invalid selection expression.
+    """
+
+
+def tokenize(expression):
+    """Split a selection expression in tokens.
+
+    Args:
+        expression (str): the selection expression
+
+    Returns:
+        list of str: the tokens
+    """
+
+    return TOKEN_PATTERN.findall(expression)
+
+
+def parse_selection(expression):
+    """Parse a selection expression.
+
+    The grammar is:
+
+        expression := term ('or' term)*
+        term := factor ('and' factor)*
+        factor := 'not' factor | '(' expression ')' | 'all' | 'none' | keyword value+
+
+    where keyword is one of resname, name, element (or type), resid, id and index. The values of resname, name and
+    element may contain shell-style wildcards (e.g. H*). The values of resid, id and index are integers or inclusive
+    ranges (e.g. 1-10 or 1:10). Several values are or-ed (e.g. resname SOL WAT).
+
+    Args:
+        expression (str): the selection expression
+
+    Returns:
+        tuple: the syntax tree of the expression
+
+    Raises:
+        InvalidSelectionError: if the expression is invalid
+    """
+
+    tokens = tokenize(expression)
+    position = 0
+
+    def peek():
+        return tokens[position] if position < len(tokens) else None
+
+    def consume():
+        nonlocal position
+        token = peek()
+        if token is None:
+            raise InvalidSelectionError('Unexpected end of selection {!r}'.format(expression))
+        position += 1
+        return token
+
+    def parse_expression():
+        node = parse_term()
+        while peek() == 'or':
+            consume()
+            node = ('or', node, parse_term())
+        return node
+
+    def parse_term():
+        node = parse_factor()
+        while peek() == 'and':
+            consume()
+            node = ('and', node, parse_factor())
+        return node
+
+    def parse_factor():
+        token = consume()
+        if token == 'not':
+            return ('not', parse_factor())
+        if token == '(':
+            node = parse_expression()
+            if consume() != ')':
+                raise InvalidSelectionError('Missing closing parenthesis in selection {!r}'.format(expression))
+            return node
+        if token in ('all', 'none'):
+            return (token,)
+        if token in CATEGORICAL_KEYWORDS or token in NUMERIC_KEYWORDS:
+            values = []
+            while peek() is not None and peek() not in RESERVED_WORDS:
+                values.append(consume())
+            if not values:
+                raise InvalidSelectionError('Missing value after {!r} in selection {!r}'.format(token, expression))
+            if token in NUMERIC_KEYWORDS:
+                return (token, tuple(parse_range(v) for v in values))
+            return (token, tuple(values))
+        raise InvalidSelectionError('Unexpected token {!r} in selection {!r}'.format(token, expression))
+
+    if not tokens:
+        raise InvalidSelectionError('Empty selection')
+
+    tree = parse_expression()
+    if peek() is not None:
+        raise InvalidSelectionError('Unexpected token {!r} in selection {!r}'.format(peek(), expression))
+
+    return tree
+
+
+def parse_range(value):
+    """Parse an integer or an inclusive range of integers.
+
+    Args:
+        value (str): the value (e.g. 5, 1-10 or 1:10)
+
+    Returns:
+        2-tuple: the first and last integers of the range
+    """
+
+    match = RANGE_PATTERN.match(value)
+    if match is None:
+        raise InvalidSelectionError('Invalid integer or range {!r}'.format(value))
+
+    first = int(match.group(1))
+    last = first if match.group(2) is None else int(match.group(2))
+
+    return first, last
+
+
+def group_by_molecule(indexes, residue_ids):
+    """Group atom indexes per molecule in a compressed sparse row layout.
+
+    The molecules are sorted by the first appearance of their residue id in indexes and the atoms keep their order
+    within each molecule.
+
+    Args:
+        indexes (numpy.ndarray): the sorted atom indexes
+        residue_ids (numpy.ndarray): the residue id of each atom of the system
+
+    Returns:
+        2-tuple: the (n_molecules + 1,) int32 offsets and the int32 atom indexes such that the atoms of the molecule i
+        are atom_indices[offsets[i]:offsets[i+1]]
+    """
+
+    if len(indexes) == 0:
+        return np.zeros(1, dtype=np.int32), np.empty(0, dtype=np.int32)
+
+    _, first_positions, groups = np.unique(residue_ids[indexes], return_index=True, return_inverse=True)
+    ranks = np.empty(len(first_positions), dtype=np.int64)
+    ranks[np.argsort(first_positions)] = np.arange(len(first_positions))
+    group_ranks = ranks[groups]
+
+    atom_indices = indexes[np.argsort(group_ranks, kind='stable')].astype(np.int32)
+
+    offsets = np.zeros(len(first_positions) + 1, dtype=np.int32)
+    np.cumsum(np.bincount(group_ranks), out=offsets[1:])
+
+    return offsets, atom_indices
+
+
+class SelectionIndex:
+    """This class implements a selection engine over the topology of a system.
+
+    The atoms are looked up through inverted indexes built lazily from the topology: the atoms of each residue name,
+    atom name and element are contiguous runs of an argsort of the categorical codes, and the residue and atom ids are
+    searched in sorted copies of the ids. Selection expressions are compiled to boolean masks which are cached with
+    their per-molecule layout.
+    """
+
+    def __init__(self, topology, max_cached_selections=MAX_CACHED_SELECTIONS):
+        """Constructor.
+
+        Args:
+            topology (waterstay.readers.topology.Topology): the topology
+            max_cached_selections (int): the maximum number of selections kept in memory
+        """
+
+        self._topology = topology
+
+        self._max_cached_selections = max_cached_selections
+
+        # The inverted indexes keyed by topology field
+        self._inverted_indexes = {}
+
+        # The masks and molecules of the compiled selections keyed by their normalized expression
+        self._masks = collections.OrderedDict()
+        self._molecules = collections.OrderedDict()
+
+    @property
+    def n_atoms(self):
+        return len(self._topology)
+
+    def inverted_index(self, field):
+        """Return the inverted index of a topology field.
+
+        For a categorical field, the index is the atom indexes sorted by category and the offsets of each category in
+        that array. For an integer field, the index is the sorted values and the atom indexes sorted accordingly.
+
+        Args:
+            field (str): the topology field (e.g. residue_names or residue_ids)
+
+        Returns:
+            2-tuple: the index
+        """
+
+        index = self._inverted_indexes.get(field)
+        if index is not None:
+            return index
+
+        values = getattr(self._topology, field)
+        if values is None:
+            raise InvalidSelectionError('The topology has no {}'.format(field))
+
+        if field in CATEGORICAL_KEYWORDS.values():
+            order = np.argsort(values.codes, kind='stable').astype(np.int32)
+            offsets = np.zeros(len(values.categories) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(values.codes, minlength=len(values.categories)), out=offsets[1:])
+            index = (order, offsets)
+        else:
+            order = np.argsort(values, kind='stable').astype(np.int32)
+            index = (values[order], order)
+
+        self._inverted_indexes[field] = index
+
+        return index
+
+    def categories(self, field, values, wildcards=False):
+        """Return the categories of a categorical field matching a set of values.
+
+        Args:
+            field (str): the categorical topology field
+            values (iterable of str): the values
+            wildcards (bool): if True, the values containing shell-style wildcards are matched as patterns
+
+        Returns:
+            list of int: the matching category codes
+        """
+
+        categories = getattr(self._topology, field).categories
+        positions = {v: i for i, v in enumerate(categories)}
+
+        codes = set()
+        for value in values:
+            if wildcards and any(c in value for c in '*?['):
+                codes.update(i for i, v in enumerate(categories) if fnmatch.fnmatchcase(v, value))
+            elif value in positions:
+                codes.add(positions[value])
+
+        return sorted(codes)
+
+    def select_values(self, field, values, wildcards=False):
+        """Return the mask of the atoms whose categorical field is one of a set of values.
+
+        Args:
+            field (str): the categorical topology field (residue_names, atom_names or atom_types)
+            values (iterable of str): the values
+            wildcards (bool): if True, the values containing shell-style wildcards are matched as patterns
+
+        Returns:
+            numpy.ndarray: the boolean mask
+        """
+
+        order, offsets = self.inverted_index(field)
+
+        mask = np.zeros(self.n_atoms, dtype=bool)
+        for code in self.categories(field, values, wildcards):
+            mask[order[offsets[code]:offsets[code + 1]]] = True
+
+        return mask
+
+    def select_ranges(self, field, ranges):
+        """Return the mask of the atoms whose integer field is within a set of inclusive ranges.
+
+        Args:
+            field (str): the integer topology field (residue_ids or atom_ids) or None for the atom indexes
+            ranges (iterable of 2-tuple): the inclusive ranges
+
+        Returns:
+            numpy.ndarray: the boolean mask
+        """
+
+        mask = np.zeros(self.n_atoms, dtype=bool)
+
+        if field is None:
+            for first, last in ranges:
+                mask[max(first, 0):max(last + 1, 0)] = True
+            return mask
+
+        sorted_values, order = self.inverted_index(field)
+        for first, last in ranges:
+            start = np.searchsorted(sorted_values, first, side='left')
+            end = np.searchsorted(sorted_values, last, side='right')
+            mask[order[start:end]] = True
+
+        return mask
+
+    def distinct(self, field, mask=None):
+        """Return the sorted distinct values of a categorical field over the whole system or a selection.
+
+        Args:
+            field (str): the categorical topology field
+            mask (numpy.ndarray): the boolean mask of the selection. If None, all the atoms are considered.
+
+        Returns:
+            list of str: the values
+        """
+
+        values = getattr(self._topology, field)
+
+        codes = values.codes if mask is None else values.codes[mask]
+
+        return sorted(values.categories[c] for c in np.unique(codes).tolist())
+
+    def _evaluate(self, node):
+        """Evaluate a syntax tree to a boolean mask.
+
+        Args:
+            node (tuple): the syntax tree
+
+        Returns:
+            numpy.ndarray: the boolean mask
+        """
+
+        operator = node[0]
+        if operator == 'or':
+            return self._evaluate(node[1]) | self._evaluate(node[2])
+        if operator == 'and':
+            return self._evaluate(node[1]) & self._evaluate(node[2])
+        if operator == 'not':
+            return ~self._evaluate(node[1])
+        if operator == 'all':
+            return np.ones(self.n_atoms, dtype=bool)
+        if operator == 'none':
+            return np.zeros(self.n_atoms, dtype=bool)
+        if operator in CATEGORICAL_KEYWORDS:
+            return self.select_values(CATEGORICAL_KEYWORDS[operator], node[1], wildcards=True)
+
+        return self.select_ranges(NUMERIC_KEYWORDS[operator], node[1])
+
+    def select(self, expression):
+        """Compile a selection expression to a boolean mask over the atoms.
+
+        The masks are cached by expression and are read-only.
+
+        Args:
+            expression (str): the selection expression (e.g. 'resname SOL and name OW')
+
+        Returns:
+            numpy.ndarray: the boolean mask
+        """
+
+        key = ' '.join(tokenize(expression))
+
+        mask = self._masks.get(key)
+        if mask is not None:
+            self._masks.move_to_end(key)
+            return mask
+
+        mask = self._evaluate(parse_selection(expression))
+        mask.setflags(write=False)
+
+        self._masks[key] = mask
+        while len(self._masks) > self._max_cached_selections:
+            self._masks.popitem(last=False)
+
+        return mask
+
+    def select_indexes(self, expression):
+        """Return the sorted indexes of the atoms matching a selection expression.
+
+        Args:
+            expression (str): the selection expression
+
+        Returns:
+            numpy.ndarray: the int32 atom indexes
+        """
+
+        return np.flatnonzero(self.select(expression)).astype(np.int32)
+
+    def select_molecules(self, expression):
+        """Return the atoms matching a selection expression grouped per molecule.
+
+        Args:
+            expression (str): the selection expression
+
+        Returns:
+            2-tuple: the offsets and the atom indexes of the compressed sparse row layout (see group_by_molecule)
+        """
+
+        key = ' '.join(tokenize(expression))
+
+        molecules = self._molecules.get(key)
+        if molecules is not None:
+            self._molecules.move_to_end(key)
+            return molecules
+
+        molecules = self.group_by_molecule(self.select(expression))
+
+        self._molecules[key] = molecules
+        while len(self._molecules) > self._max_cached_selections:
+            self._molecules.popitem(last=False)
+
+        return molecules
+
+    def group_by_molecule(self, mask):
+        """Group the atoms of a mask per molecule.
+
+        Args:
+            mask (numpy.ndarray): the boolean mask
+
+        Returns:
+            2-tuple: the offsets and the atom indexes of the compressed sparse row layout (see group_by_molecule)
+        """
+
+        offsets, atom_indices = group_by_molecule(np.flatnonzero(mask), self._topology.residue_ids)
+        offsets.setflags(write=False)
+        atom_indices.setflags(write=False)
+
+        return offsets, atom_indices
+
+    def clear(self):
+        """Clear the cached masks and inverted indexes, e.g. after the atom types have changed.
+        """
+
+        self._inverted_indexes.clear()
+        self._masks.clear()
+        self._molecules.clear()
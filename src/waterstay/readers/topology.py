@@ -0,0 +1,200 @@
+import numpy as np
+
+
+class CategoricalArray:
+    """This class implements a read-only array of strings stored as integer codes into a vocabulary of unique strings.
+
+    A system of millions of atoms has only a handful of distinct residue and atom names, hence storing the codes is
+    much more compact than storing one Python string per atom and allows for vectorized selections. The array behaves
+    as a sequence of str for compatibility with the code which used plain lists.
+    """
+
+    def __init__(self, codes, categories):
+        """Constructor.
+
+        Args:
+            codes (numpy.ndarray): the int32 codes of the values
+            categories (list of str): the vocabulary of the values
+        """
+
+        self._codes = np.asarray(codes, dtype=np.int32)
+
+        self._categories = list(categories)
+
+    @classmethod
+    def from_values(cls, values):
+        """Build a categorical array from a sequence of values.
+
+        Args:
+            values (sequence or numpy.ndarray): the str or bytes values
+
+        Returns:
+            CategoricalArray: the categorical array
+        """
+
+        values = np.asarray(values)
+
+        if len(values) == 0:
+            return cls(np.empty(0, dtype=np.int32), [])
+
+        categories, codes = np.unique(values, return_inverse=True)
+
+        # Only the vocabulary has to be decoded
+        if categories.dtype.kind == 'S':
+            categories = [v.decode('ascii') for v in categories]
+        else:
+            categories = [str(v) for v in categories]
+
+        return cls(codes, categories)
+
+    def __len__(self):
+        return len(self._codes)
+
+    def __iter__(self):
+        categories = self._categories
+        return (categories[c] for c in self._codes.tolist())
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return self._categories[self._codes[index]]
+
+        return CategoricalArray(self._codes[index], self._categories)
+
+    def __eq__(self, other):
+        return len(self) == len(other) and np.array_equal(np.asarray(self), np.asarray(other))
+
+    def __array__(self, dtype=None):
+        categories = np.array(self._categories if self._categories else [''])
+        array = categories[self._codes]
+        return array if dtype is None else array.astype(dtype)
+
+    def __repr__(self):
+        return 'CategoricalArray({})'.format(self.tolist())
+
+    @property
+    def codes(self):
+        return self._codes
+
+    @property
+    def categories(self):
+        return self._categories
+
+    def isin(self, values):
+        """Return the mask of the elements which are in a given set of values.
+
+        Args:
+            values (iterable of str): the values
+
+        Returns:
+            numpy.ndarray: the boolean mask
+        """
+
+        values = set(values)
+
+        selected_categories = np.array([v in values for v in self._categories], dtype=bool)
+
+        return selected_categories[self._codes] if len(selected_categories) else np.zeros(len(self), dtype=bool)
+
+    def tolist(self):
+        """Return the values as a list of str.
+
+        Returns:
+            list of str: the values
+        """
+
+        categories = self._categories
+        return [categories[c] for c in self._codes.tolist()]
+
+
+class Topology:
+    """This class implements a columnar storage of the topology of a system.
+
+    The ids are stored as int32 arrays and the names and the types as categorical arrays.
+    """
+
+    def __init__(self, residue_ids, residue_names, atom_ids, atom_names, atom_types=None):
+        """Constructor.
+
+        Args:
+            residue_ids (sequence of int): the residue id of each atom
+            residue_names (sequence of str or CategoricalArray): the residue name of each atom
+            atom_ids (sequence of int): the id of each atom
+            atom_names (sequence of str or CategoricalArray): the name of each atom
+            atom_types (sequence of str or CategoricalArray): the type (element) of each atom. If None, the types have
+                to be set afterwards.
+        """
+
+        self._residue_ids = np.asarray(residue_ids, dtype=np.int32)
+
+        self._residue_names = self.as_categorical(residue_names)
+
+        self._atom_ids = np.asarray(atom_ids, dtype=np.int32)
+
+        self._atom_names = self.as_categorical(atom_names)
+
+        self._atom_types = None if atom_types is None else self.as_categorical(atom_types)
+
+    @staticmethod
+    def as_categorical(values):
+        return values if isinstance(values, CategoricalArray) else CategoricalArray.from_values(values)
+
+    @classmethod
+    def from_records(cls, records, residue_id_columns, residue_name_columns, atom_id_columns, atom_name_columns):
+        """Parse the topology from the fixed-width atom records of a frame.
+
+        Args:
+            records (numpy.ndarray): the (n_atoms, record size) uint8 array of records
+            residue_id_columns (slice): the columns of the residue ids
+            residue_name_columns (slice): the columns of the residue names
+            atom_id_columns (slice): the columns of the atom ids
+            atom_name_columns (slice): the columns of the atom names
+
+        Returns:
+            Topology: the topology
+        """
+
+        def column(columns):
+            width = columns.stop - columns.start
+            field = np.ascontiguousarray(records[:, columns])
+            return np.char.strip(field.view('S{}'.format(width)).ravel())
+
+        return cls(column(residue_id_columns).astype(np.int32),
+                   CategoricalArray.from_values(column(residue_name_columns)),
+                   column(atom_id_columns).astype(np.int32),
+                   CategoricalArray.from_values(column(atom_name_columns)))
+
+    def __len__(self):
+        return len(self._residue_ids)
+
+    def __eq__(self, other):
+        """Return True if two topologies have the same ids and names. The atom types are not compared.
+        """
+
+        return np.array_equal(self._residue_ids, other.residue_ids) and \
+            np.array_equal(self._atom_ids, other.atom_ids) and \
+            self._residue_names == other.residue_names and \
+            self._atom_names == other.atom_names
+
+    @property
+    def residue_ids(self):
+        return self._residue_ids
+
+    @property
+    def residue_names(self):
+        return self._residue_names
+
+    @property
+    def atom_ids(self):
+        return self._atom_ids
+
+    @property
+    def atom_names(self):
+        return self._atom_names
+
+    @property
+    def atom_types(self):
+        return self._atom_types
+
+    @atom_types.setter
+    def atom_types(self, atom_types):
+        self._atom_types = self.as_categorical(atom_types)
@@ -0,0 +1,300 @@
+import hashlib
+import logging
+import os
+import tempfile
+
+import numpy as np
+
+# The version of the on-disk index layout. Bump it each time the layout changes so that stale indexes get rebuilt.
+INDEX_VERSION = 1
+
+# The size of the blocks of the trajectory file used to compute the partial hash of the trajectory
+DIGEST_BLOCK_SIZE = 65536
+
+
+def default_file_mode():
+    """Return the mode of a new regular file according to the current umask.
+
+    Returns:
+        int: the mode
+    """
+
+    # The umask can only be read by setting it
+    umask = os.umask(0)
+    os.umask(umask)
+
+    return 0o666 & ~umask
+
+
+def file_digest(filename, start, end):
+    """Compute the SHA1 digest of a region of a file.
+
+    Args:
+        filename (str): the file
+        start (int): the starting offset of the region
+        end (int): the ending offset of the region
+
+    Returns:
+        str: the hexadecimal digest
+    """
+
+    sha1 = hashlib.sha1()
+    with open(filename, 'rb') as fin:
+        fin.seek(start)
+        sha1.update(fin.read(max(end - start, 0)))
+
+    return sha1.hexdigest()
+
+
+class TrajectoryIndex:
+    """This class implements a persistent on-disk index of the frames of a trajectory file.
+
+    The index is a set of named arrays (typically the frames offsets, the box offsets and the times) saved to a
+    NumPy .npz sidecar file alongside with a fingerprint of the trajectory (size, modification time and digests of its
+    head and of the end of the indexed region). The fingerprint is used to validate the index when it is reloaded: an
+    index whose fingerprint does not match anymore is discarded whereas an index of a trajectory which has been appended
+    to is kept so that only the new frames have to be scanned.
+    """
+
+    def __init__(self, filename, end_offset=0, **arrays):
+        """Constructor.
+
+        Args:
+            filename (str): the trajectory filename
+            end_offset (int): the offset up to which the trajectory has been indexed
+            arrays (dict): the indexed arrays
+        """
+
+        self._filename = filename
+
+        self._end_offset = end_offset
+
+        self._arrays = {k: np.asarray(v) for k, v in arrays.items()}
+
+    def __contains__(self, key):
+        return key in self._arrays
+
+    def __getitem__(self, key):
+        return self._arrays[key]
+
+    def __setitem__(self, key, value):
+        self._arrays[key] = np.asarray(value)
+
+    @property
+    def end_offset(self):
+        return self._end_offset
+
+    @property
+    def is_complete(self):
+        """Return True if the whole trajectory file has been indexed.
+        """
+
+        return self._end_offset >= os.path.getsize(self._filename)
+
+    def extend(self, end_offset, **arrays):
+        """Append new entries to the indexed arrays.
+
+        Args:
+            end_offset (int): the offset up to which the trajectory has been indexed
+            arrays (dict): the arrays to append
+        """
+
+        for k, v in arrays.items():
+            v = np.asarray(v)
+            if k in self._arrays:
+                self._arrays[k] = np.concatenate([self._arrays[k], v.astype(self._arrays[k].dtype)])
+            else:
+                self._arrays[k] = v
+
+        self._end_offset = end_offset
+
+    @staticmethod
+    def index_paths(filename):
+        """Return the candidate paths of the index file of a trajectory.
+
+        The index is preferably stored next to the trajectory as a hidden file. If the directory of the trajectory is
+        not writable, it is stored in $HOME/.waterstay/indexes.
+
+        Args:
+            filename (str): the trajectory filename
+
+        Returns:
+            list of str: the candidate paths
+        """
+
+        filename = os.path.abspath(filename)
+        dirname, basename = os.path.split(filename)
+
+        local_path = os.path.join(dirname, '.{}.idx.npz'.format(basename))
+
+        key = hashlib.sha1(filename.encode('utf-8')).hexdigest()
+        home_path = os.path.join(os.path.expanduser('~'), '.waterstay', 'indexes', '{}.idx.npz'.format(key))
+
+        return [local_path, home_path]
+
+    def fingerprint(self):
+        """Compute the fingerprint of the trajectory for the indexed region.
+
+        Returns:
+            dict: the fingerprint
+        """
+
+        stat = os.stat(self._filename)
+
+        head_end = min(DIGEST_BLOCK_SIZE, self._end_offset)
+        tail_start = max(self._end_offset - DIGEST_BLOCK_SIZE, 0)
+
+        fingerprint = {'version': INDEX_VERSION,
+                       'size': stat.st_size,
+                       'mtime': stat.st_mtime_ns,
+                       'end_offset': self._end_offset,
+                       'head_digest': file_digest(self._filename, 0, head_end),
+                       'tail_digest': file_digest(self._filename, tail_start, self._end_offset)}
+
+        return fingerprint
+
+    @classmethod
+    def load(cls, filename):
+        """Load the index of a trajectory.
+
+        Args:
+            filename (str): the trajectory filename
+
+        Returns:
+            TrajectoryIndex: the index if a valid one could be found, None otherwise
+        """
+
+        for path in cls.index_paths(filename):
+
+            if not os.path.exists(path):
+                continue
+
+            try:
+                with np.load(path, allow_pickle=False) as data:
+                    arrays = {k: data[k] for k in data.files}
+            except (OSError, ValueError) as error:
+                logging.warning('Could not load index file {}: {}'.format(path, error))
+                continue
+
+            stored = {k[len('_fingerprint_'):]: arrays.pop(k).item() for k in list(arrays) if k.startswith('_fingerprint_')}
+
+            if stored.get('version') != INDEX_VERSION:
+                continue
+
+            index = cls(filename, int(stored['end_offset']), **arrays)
+
+            if index.matches(stored):
+                return index
+
+        return None
+
+    def matches(self, stored):
+        """Check whether the trajectory still matches a stored fingerprint.
+
+        Args:
+            stored (dict): the fingerprint saved with the index
+
+        Returns:
+            bool: True if the index is still valid for the trajectory
+        """
+
+        stat = os.stat(self._filename)
+
+        # The trajectory has been truncated
+        if stat.st_size < self._end_offset:
+            return False
+
+        # The trajectory has not grown: it has either not been touched since the index was saved or been rewritten in
+        # place, possibly outside of the regions covered by the digests
+        if stat.st_size == stored['size']:
+            return stat.st_mtime_ns == stored['mtime']
+
+        # The trajectory has grown. If the indexed region is unchanged, the trajectory has been appended to and the
+        # index is kept, otherwise it has been rewritten and the index must be rebuilt
+        current = self.fingerprint()
+
+        return current['head_digest'] == stored['head_digest'] and current['tail_digest'] == stored['tail_digest']
+
+    def save(self):
+        """Save the index to its sidecar file.
+
+        Returns:
+            str: the path of the saved index file or None if it could not be saved
+        """
+
+        arrays = dict(self._arrays)
+        for k, v in self.fingerprint().items():
+            arrays['_fingerprint_' + k] = np.array(v)
+
+        for path in self.index_paths(self._filename):
+
+            dirname = os.path.dirname(path)
+
+            tmp_path = None
+            try:
+                os.makedirs(dirname, exist_ok=True)
+                # Write to a temporary file first so that a concurrent reader never sees a partially written index
+                fd, tmp_path = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+                with os.fdopen(fd, 'wb') as fout:
+                    np.savez(fout, **arrays)
+                # mkstemp creates the file readable by its owner only. The index must be readable by the other users
+                # of a shared trajectory as any other file.
+                os.chmod(tmp_path, default_file_mode())
+                os.replace(tmp_path, path)
+                tmp_path = None
+            except OSError:
+                continue
+            finally:
+                # Do not leave a partially written index behind
+                if tmp_path is not None:
+                    try:
+                        os.unlink(tmp_path)
+                    except OSError:
+                        pass
+
+            return path
+
+        logging.warning('Could not save index file for {}'.format(self._filename))
+
+        return None
+
+
+class CompressedTrajectoryIndex(TrajectoryIndex):
+    """This class implements a persistent on-disk index of the frames of a compressed trajectory file.
+
+    The offsets are offsets in the decompressed stream. A compressed trajectory is always indexed up to its end in a
+    single scan, and is not expected to be appended to, hence the index is only valid as long as the size and the
+    modification time of the compressed file are unchanged.
+    """
+
+    @property
+    def is_complete(self):
+        """Return True if the trajectory has been indexed.
+        """
+
+        return self._end_offset > 0
+
+    def fingerprint(self):
+        """Compute the fingerprint of the compressed trajectory.
+
+        Returns:
+            dict: the fingerprint
+        """
+
+        stat = os.stat(self._filename)
+
+        return {'version': INDEX_VERSION, 'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'end_offset': self._end_offset}
+
+    def matches(self, stored):
+        """Check whether the compressed trajectory still matches a stored fingerprint.
+
+        Args:
+            stored (dict): the fingerprint saved with the index
+
+        Returns:
+            bool: True if the index is still valid for the trajectory
+        """
+
+        stat = os.stat(self._filename)
+
+        return stat.st_size == stored['size'] and stat.st_mtime_ns == stored['mtime']
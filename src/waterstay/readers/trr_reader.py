@@ -1,65 +1,150 @@
 import logging
 import os
+import struct
 
 import numpy as np
 
-import MDAnalysis
-
-from waterstay.readers.i_reader import InvalidFileError, IReader
+from waterstay.readers.i_reader import InvalidFileError
+from waterstay.readers.mdanalysis_reader import MDAnalysisReader
 from waterstay.readers.reader_registry import register_reader
+from waterstay.readers.trajectory_index import TrajectoryIndex
 
+# The magic number which starts each frame of a TRR file
+TRR_MAGIC = 1993
 
-@register_reader('.trr')
-class TRRReader(IReader):
+# The size of the block read to decode a frame header. It is larger than any TRR frame header.
+TRR_HEADER_BLOCK_SIZE = 256
 
-    def __init__(self, filename):
 
-        super(TRRReader, self).__init__(filename)
+def read_trr_header(block):
+    """Decode the header of a TRR frame.
+
+    A TRR frame is made of a XDR header (magic number, version string, the sizes of the payload sections, the number of
+    atoms, the step, the time and lambda) followed by the box, virial, pressure, positions, velocities and forces.
+
+    Args:
+        block (bytes): the bytes starting at the beginning of the frame
+
+    Returns:
+        3-tuple: the size of the header, the size of the payload and the time of the frame
+    """
+
+    magic, _, version_length = struct.unpack('>3i', block[:12])
+    if magic != TRR_MAGIC:
+        raise ValueError('Invalid TRR magic number {}'.format(magic))
+
+    # The XDR strings are padded to a multiple of 4 bytes
+    offset = 12 + (version_length + 3)//4*4
+
+    sizes = struct.unpack('>13i', block[offset:offset + 52])
+    offset += 52
+
+    _, _, box_size, vir_size, pres_size, _, _, x_size, v_size, f_size, n_atoms, _, _ = sizes
+
+    # The precision of the reals is deduced from the size of the box or of one of the atomic sections
+    if box_size:
+        real_size = box_size//9
+    elif n_atoms and (x_size or v_size or f_size):
+        real_size = (x_size or v_size or f_size)//(3*n_atoms)
+    else:
+        raise ValueError('Can not guess the precision of the TRR frame')
+
+    if real_size not in (4, 8):
+        raise ValueError('Invalid TRR precision {}'.format(real_size))
 
-        basename, _ = os.path.splitext(filename)
+    time, = struct.unpack('>f' if real_size == 4 else '>d', block[offset:offset + real_size])
+    offset += 2*real_size
 
-        tpr_file = basename + '.tpr'
+    return offset, box_size + vir_size + pres_size + x_size + v_size + f_size, time
 
-        if not os.path.exists(tpr_file):
-            raise InvalidFileError('Could not find tpr file {}'.format(tpr_file))
 
-        self._universe = MDAnalysis.Universe(tpr_file, self._filename)
+def scan_trr_times(filename, start=0):
+    """Read the times of the frames of a TRR file by decoding only the frame headers.
 
-        self._residue_ids = [at.resnum for at in self._universe.atoms]
+    The payload of each frame (positions, velocities, forces) is skipped.
 
-        self._residue_names = [at.resname for at in self._universe.atoms]
+    Args:
+        filename (str): the TRR filename
+        start (int): the offset of the first frame to scan
 
-        self._atom_ids = [at.id for at in self._universe.atoms]
+    Returns:
+        2-tuple: the times of the complete frames and the offset of the end of the last complete frame
+    """
 
-        self._atom_names = [at.name for at in self._universe.atoms]
+    size = os.path.getsize(filename)
+
+    times = []
+    offset = start
+    with open(filename, 'rb') as fin:
+        while offset < size:
+            fin.seek(offset)
+            block = fin.read(TRR_HEADER_BLOCK_SIZE)
+            try:
+                header_size, payload_size, time = read_trr_header(block)
+            except (ValueError, struct.error) as error:
+                # A truncated header at the end of the file is a frame being written
+                if len(block) < TRR_HEADER_BLOCK_SIZE:
+                    break
+                raise InvalidFileError('Invalid TRR file {} at offset {}: {}'.format(filename, offset, error))
+            frame_end = offset + header_size + payload_size
+            if frame_end > size:
+                break
+            times.append(time)
+            offset = frame_end
+
+    return np.array(times, dtype=np.float64), offset
+
+
+@register_reader('.trr')
+class TRRReader(MDAnalysisReader):
+
+    def __init__(self, filename):
+
+        super(TRRReader, self).__init__(filename)
+
+        self.open_universe()
 
         self._n_atoms = self._universe.trajectory.n_atoms
 
         self._n_frames = self._universe.trajectory.n_frames
 
-        self._times = [self._universe.trajectory[i].time for i in range(self._universe.trajectory.n_frames)]
+        self._times = self.index_times()
 
         self.guess_atom_types()
 
         logging.info('Read {} successfully'.format(filename))
 
-    def read_frame(self, frame):
-        """Read the coordinates at a given frame.
+    def index_times(self):
+        """Return the times of the frames.
 
-        Args:
-            frame (int): the selected frame
+        The times are read from the frame headers only and cached in the sidecar index of the trajectory so that the
+        next opening does not have to scan the file again. If the trajectory has been appended to, only the new frames
+        are scanned.
+
+        Returns:
+            numpy.ndarray: the times
         """
 
-        return self._universe.trajectory[frame].positions.astype(np.float)
+        index = TrajectoryIndex.load(self._filename)
+        if index is None:
+            index = TrajectoryIndex(self._filename, times=np.empty(0, dtype=np.float64))
 
-    def read_pbc(self, frame):
-        """Read the bounding box at a given frame.
+        if not index.is_complete:
+            times, end_offset = scan_trr_times(self._filename, index.end_offset)
+            if len(times) or end_offset != index.end_offset:
+                index.extend(end_offset, times=times)
+                index.save()
 
-        Args:
-            frame (int): the selected frame
-        """
+        # The index also stores the per-frame properties computed during the full passes over the trajectory
+        self._index = index
+
+        times = index['times']
+        if len(times) != self._n_frames:
+            raise InvalidFileError('Inconsistent number of frames in {}: {} read vs {} expected'.format(self._filename,
+                                                                                                         len(times),
+                                                                                                         self._n_frames))
 
-        return self._universe.trajectory[frame].triclinic_dimensions.astype(np.float)
+        return times
 
 
 if __name__ == '__main__':
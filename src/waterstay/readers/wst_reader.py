@@ -0,0 +1,278 @@
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import zlib
+
+import numpy as np
+
+from waterstay.readers.i_reader import InvalidFileError, IReader
+from waterstay.readers.prefetcher import Prefetcher
+from waterstay.readers.reader_registry import register_reader
+from waterstay.readers.topology import Topology
+from waterstay.readers.trajectory_index import default_file_mode, TrajectoryIndex
+from waterstay.utils.progress_bar import progress_bar
+
+# The magic number which starts and ends a waterstay binary trajectory file
+MAGIC = b'WSTRAJ\x00\x01'
+
+# The version of the file layout
+WST_VERSION = 1
+
+# The default number of frames stored per chunk of coordinates
+DEFAULT_CHUNK_SIZE = 64
+
+# The alignment of the arrays in the file
+ALIGNMENT = 64
+
+COMPRESSIONS = (None, 'zlib')
+
+
+def write_wst(reader, filename, chunk_size=DEFAULT_CHUNK_SIZE, compression=None):
+    """Convert a trajectory to the waterstay binary trajectory format.
+
+    The file is made of the topology arrays, the times, the boxes and the coordinates stored as float32 chunks of frames
+    (each chunk being optionally compressed) followed by a JSON header describing where each array is stored.
+    Uncompressed chunks are memory-mapped by WSTReader, hence the frames are read at the cost of the I/O only.
+
+    Args:
+        reader (IReader): the reader of the trajectory to convert
+        filename (str): the output filename
+        chunk_size (int): the number of frames per chunk
+        compression (str): the compression of the chunks (None or 'zlib')
+    """
+
+    if compression not in COMPRESSIONS:
+        raise ValueError('Unknown compression {}. Must be one of {}'.format(compression, COMPRESSIONS))
+
+    chunk_size = max(int(chunk_size), 1)
+
+    n_frames = reader.n_frames
+
+    arrays = {}
+
+    def write_array(fout, name, array):
+        fout.write(b'\x00'*(-fout.tell() % ALIGNMENT))
+        array = np.ascontiguousarray(array)
+        arrays[name] = {'offset': fout.tell(), 'dtype': array.dtype.str, 'shape': list(array.shape)}
+        fout.write(array.tobytes())
+
+    # Write to a temporary file first so that a failed conversion never leaves a partial trajectory behind and that
+    # concurrent conversions do not collide
+    dirname = os.path.dirname(os.path.abspath(filename))
+    fd, tmp_filename = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as fout:
+
+            fout.write(MAGIC)
+
+            write_array(fout, 'residue_ids', np.asarray(reader.residue_ids, dtype='<i4'))
+            write_array(fout, 'residue_names', np.asarray(reader.residue_names, dtype='S'))
+            write_array(fout, 'atom_ids', np.asarray(reader.atom_ids, dtype='<i4'))
+            write_array(fout, 'atom_names', np.asarray(reader.atom_names, dtype='S'))
+            write_array(fout, 'atom_types', np.asarray(reader.atom_types, dtype='S'))
+            write_array(fout, 'times', np.asarray(reader.times, dtype='<f8'))
+
+            boxes = np.empty((n_frames, 3, 3), dtype='<f8')
+            chunks = []
+
+            progress_bar.reset(n_frames)
+
+            # Write the coordinates chunk by chunk while the next frames are read in the background
+            chunk = np.empty((min(chunk_size, n_frames), reader.n_atoms, 3), dtype='<f4')
+            n_in_chunk = 0
+            for i, (_, coords, pbc) in enumerate(Prefetcher(reader, range(n_frames))):
+                chunk[n_in_chunk] = coords
+                boxes[i] = pbc
+                n_in_chunk += 1
+                if n_in_chunk == len(chunk) or i == n_frames - 1:
+                    data = chunk[:n_in_chunk].tobytes()
+                    if compression == 'zlib':
+                        data = zlib.compress(data, 1)
+                    fout.write(b'\x00'*(-fout.tell() % ALIGNMENT))
+                    chunks.append((fout.tell(), len(data), n_in_chunk))
+                    fout.write(data)
+                    n_in_chunk = 0
+                progress_bar.update(i+1)
+
+            write_array(fout, 'boxes', boxes)
+
+            header = {'version': WST_VERSION,
+                      'n_atoms': reader.n_atoms,
+                      'n_frames': n_frames,
+                      'chunk_size': chunk_size,
+                      'compression': compression,
+                      'chunks': chunks,
+                      'arrays': arrays}
+
+            header_offset = fout.tell()
+            fout.write(json.dumps(header).encode('utf-8'))
+            fout.write(struct.pack('<Q', header_offset))
+            fout.write(MAGIC)
+
+        os.chmod(tmp_filename, default_file_mode())
+        os.replace(tmp_filename, filename)
+        tmp_filename = None
+    finally:
+        if tmp_filename is not None:
+            try:
+                os.unlink(tmp_filename)
+            except OSError:
+                pass
+
+    logging.info('Converted {} to {}'.format(reader.filename, filename))
+
+
+@register_reader('.wst')
+class WSTReader(IReader):
+    """This class implements a reader for the waterstay binary trajectory format written by write_wst.
+
+    The file is memory-mapped: the topology, the times, the boxes and the uncompressed chunks of coordinates are
+    zero-copy views of the mapped file.
+    """
+
+    def __init__(self, filename):
+
+        super(WSTReader, self).__init__(filename)
+
+        self._fin = open(self._filename, 'rb')
+
+        try:
+            self._mmap = mmap.mmap(self._fin.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise InvalidFileError('Invalid waterstay trajectory file {}'.format(filename))
+
+        trailer_size = len(MAGIC) + 8
+        if len(self._mmap) < len(MAGIC) + trailer_size or \
+                self._mmap[:len(MAGIC)] != MAGIC or self._mmap[-len(MAGIC):] != MAGIC:
+            raise InvalidFileError('Invalid waterstay trajectory file {}'.format(filename))
+
+        # A truncated or corrupted header or array table is reported as an invalid file
+        try:
+            header_offset, = struct.unpack('<Q', self._mmap[-trailer_size:-len(MAGIC)])
+            header = json.loads(self._mmap[header_offset:-trailer_size].decode('utf-8'))
+
+            if header['version'] != WST_VERSION:
+                raise InvalidFileError('Unsupported waterstay trajectory version {}'.format(header['version']))
+
+            self._n_atoms = header['n_atoms']
+
+            self._n_frames = header['n_frames']
+
+            self._chunk_size = header['chunk_size']
+
+            self._compression = header['compression']
+
+            self._chunks = header['chunks']
+
+            self._arrays = header['arrays']
+
+            self._topology = Topology(self.get_array('residue_ids'),
+                                      self.get_array('residue_names'),
+                                      self.get_array('atom_ids'),
+                                      self.get_array('atom_names'),
+                                      self.get_array('atom_types'))
+
+            self._times = self.get_array('times')
+
+            self._boxes = self.get_array('boxes')
+        except (KeyError, IndexError, TypeError, ValueError, struct.error) as error:
+            raise InvalidFileError('Invalid waterstay trajectory file {}: {}'.format(filename, error))
+
+        # The last decompressed chunk
+        self._current_chunk = (None, None)
+
+        # The sidecar index only stores the per-frame properties computed during the full passes over the trajectory
+        self._index = TrajectoryIndex.load(filename) or TrajectoryIndex(filename, os.path.getsize(filename))
+
+        logging.info('Read {} successfully'.format(filename))
+
+    def __del__(self):
+        """Called when the object is destructed.
+        """
+
+        if getattr(self, '_mmap', None) is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass
+
+        if getattr(self, '_fin', None) is not None:
+            self._fin.close()
+
+    def get_array(self, name):
+        """Return a zero-copy view of an array stored in the file.
+
+        Args:
+            name (str): the name of the array
+
+        Returns:
+            numpy.ndarray: the read-only array
+        """
+
+        info = self._arrays[name]
+
+        dtype = np.dtype(info['dtype'])
+        count = int(np.prod(info['shape']))
+
+        return np.frombuffer(self._mmap, dtype=dtype, count=count, offset=info['offset']).reshape(info['shape'])
+
+    def read_chunk(self, chunk_index):
+        """Return the coordinates stored in a given chunk.
+
+        Args:
+            chunk_index (int): the index of the chunk
+
+        Returns:
+            numpy.ndarray: the (n_frames_in_chunk, n_atoms, 3) float32 coordinates
+        """
+
+        if self._current_chunk[0] == chunk_index:
+            return self._current_chunk[1]
+
+        offset, size, n_in_chunk = self._chunks[chunk_index]
+
+        if self._compression == 'zlib':
+            data = zlib.decompress(self._mmap[offset:offset + size])
+            chunk = np.frombuffer(data, dtype='<f4').reshape(n_in_chunk, self._n_atoms, 3)
+        else:
+            chunk = np.frombuffer(self._mmap, dtype='<f4', count=n_in_chunk*self._n_atoms*3, offset=offset)
+            chunk = chunk.reshape(n_in_chunk, self._n_atoms, 3)
+
+        self._current_chunk = (chunk_index, chunk)
+
+        return chunk
+
+    def _read_frame(self, frame, indices=None, dtype=np.float64, copy=True):
+        """Read the coordinates at a given frame.
+
+        Args:
+            frame (int): the selected frame
+            indices (list of int): the indexes of the atoms to read. If None, all the atoms are read.
+            dtype (numpy.dtype): the floating point type of the coordinates
+            copy (bool): if False and dtype is float32, a read-only view of the file is returned for a full frame
+        """
+
+        # Fold the frame
+        frame %= self._n_frames
+
+        coords = self.read_chunk(frame//self._chunk_size)[frame % self._chunk_size]
+
+        if indices is not None:
+            coords = coords[self.check_indices(indices)]
+
+        return coords.astype(dtype, copy=copy and indices is None)
+
+    def _read_pbc(self, frame):
+        """Read the bounding box at a given frame.
+
+        Args:
+            frame (int): the selected frame
+        """
+
+        # Fold the frame
+        frame %= self._n_frames
+
+        return self._boxes[frame].copy()
@@ -1,66 +1,348 @@
 import logging
+import mmap
 import os
+import struct
 
 import numpy as np
 
-import MDAnalysis
-
 from waterstay.readers.i_reader import InvalidFileError, IReader
+from waterstay.readers.mdanalysis_reader import MDAnalysisReader
 from waterstay.readers.reader_registry import register_reader
+from waterstay.readers.trajectory_index import TrajectoryIndex
 
+try:
+    from waterstay.extensions.xtc_decoder import XTCDecodingError, decode_frame
+except ImportError:
+    XTCDecodingError = ValueError
+    decode_frame = None
 
-@register_reader('.xtc')
-class XTCReader(IReader):
+# The magic number which starts each frame of a XTC file
+XTC_MAGIC = 1995
 
-    def __init__(self, filename):
+# The size of the block read to decode a frame header. It covers the header of the compressed coordinates.
+XTC_HEADER_BLOCK_SIZE = 92
 
-        super(XTCReader, self).__init__(filename)
+# The conversion factor from nm (XTC units) to angstrom
+NM_TO_ANGSTROM = 10.0
+
+
+def read_xtc_header(block):
+    """Decode the header of a XTC frame.
+
+    A XTC frame is made of a XDR header (magic number, number of atoms, step, time and box) followed by the coordinates.
+    The coordinates of more than 9 atoms are compressed, their size being stored in the header of the compressed block.
+
+    Args:
+        block (bytes): the bytes starting at the beginning of the frame
+
+    Returns:
+        3-tuple: the size of the frame, the number of atoms and the time of the frame
+    """
+
+    magic, n_atoms, _, time = struct.unpack('>3if', block[:16])
+    if magic != XTC_MAGIC:
+        raise ValueError('Invalid XTC magic number {}'.format(magic))
+
+    # Small systems are stored uncompressed
+    if n_atoms <= 9:
+        return 56 + 12*n_atoms, n_atoms, time
+
+    byte_count, = struct.unpack('>i', block[88:92])
+    if byte_count < 0:
+        raise ValueError('Invalid XTC compressed size {}'.format(byte_count))
 
-        basename, _ = os.path.splitext(filename)
+    # The XDR opaque data are padded to a multiple of 4 bytes
+    return 92 + (byte_count + 3)//4*4, n_atoms, time
 
-        tpr_file = basename + '.tpr'
 
-        if not os.path.exists(tpr_file):
-            raise InvalidFileError('Could not find tpr file {}'.format(tpr_file))
+def scan_xtc_frames(filename, start=0):
+    """Read the offsets and the times of the frames of a XTC file by decoding only the frame headers.
 
-        self._universe = MDAnalysis.Universe(tpr_file, self._filename)
+    Args:
+        filename (str): the XTC filename
+        start (int): the offset of the first frame to scan
 
-        self._residue_ids = [at.resnum for at in self._universe.atoms]
+    Returns:
+        3-tuple: the offsets and the times of the complete frames and the offset of the end of the last complete frame
+    """
+
+    size = os.path.getsize(filename)
+
+    frame_starts = []
+    times = []
+    offset = start
+    with open(filename, 'rb') as fin:
+        while offset < size:
+            fin.seek(offset)
+            block = fin.read(XTC_HEADER_BLOCK_SIZE)
+            try:
+                frame_size, _, time = read_xtc_header(block)
+            except (ValueError, struct.error) as error:
+                # A truncated header at the end of the file is a frame being written
+                if len(block) < XTC_HEADER_BLOCK_SIZE:
+                    break
+                raise InvalidFileError('Invalid XTC file {} at offset {}: {}'.format(filename, offset, error))
+            if offset + frame_size > size:
+                break
+            frame_starts.append(offset)
+            times.append(time)
+            offset += frame_size
+
+    return np.array(frame_starts, dtype=np.int64), np.array(times, dtype=np.float64), offset
+
+
+@register_reader('.xtc')
+class XTCReader(MDAnalysisReader):
+    """This class implements a reader for GROMACS XTC trajectories.
+
+    The frames are decoded by a native extension which supports random access through a frame index, partial decoding
+    of the first atoms of a frame and decoding into preallocated float32 buffers. If the extension is not available,
+    the frames are read through MDAnalysis. The topology is read from the .tpr file next to the trajectory.
+    """
+
+    def __init__(self, filename, use_native=True):
+        """Constructor.
+
+        Args:
+            filename (str): the trajectory filename
+            use_native (bool): if False, the frames are read through MDAnalysis even if the native decoder is available
+        """
 
-        self._residue_names = [at.resname for at in self._universe.atoms]
+        super(XTCReader, self).__init__(filename)
 
-        self._atom_ids = [at.id for at in self._universe.atoms]
+        self._use_native = use_native
 
-        self._atom_names = [at.name for at in self._universe.atoms]
+        self._native = use_native and decode_frame is not None
 
-        self._n_atoms = self._universe.trajectory.n_atoms
+        # With the native decoder, MDAnalysis is only used for reading the topology
+        self.open_universe(with_trajectory=not self._native)
 
-        self._n_frames = self._universe.trajectory.n_frames
+        self.index_frames()
 
-        self._times = [i*self._universe.trajectory.dt for i in range(self._universe.trajectory.n_frames)]
+        if self._native:
+            self._mmap = mmap.mmap(self._fin.fileno(), 0, access=mmap.ACCESS_READ) if self._n_frames else None
+            self._data = np.frombuffer(self._mmap, dtype=np.uint8) if self._n_frames else None
+            # The buffer in which the frames are decoded
+            self._buffer = np.empty((self._n_atoms, 3), dtype=np.float32)
+        elif self._universe.trajectory.n_frames != self._n_frames:
+            raise InvalidFileError('Inconsistent number of frames in {}: {} read vs {} expected'.format(
+                self._filename, self._n_frames, self._universe.trajectory.n_frames))
 
         self.guess_atom_types()
 
         logging.info('Read {} successfully'.format(filename))
 
-    def read_frame(self, frame):
+    def __del__(self):
+        """Called when the object is destructed.
+        """
+
+        if getattr(self, '_native', False):
+            self._data = None
+            if getattr(self, '_mmap', None) is not None:
+                try:
+                    self._mmap.close()
+                except BufferError:
+                    pass
+            if getattr(self, '_fin', None) is not None:
+                self._fin.close()
+
+    def open_arguments(self):
+        """Return the arguments with which the reader can be opened again, e.g. by a worker process.
+
+        Returns:
+            2-tuple: the positional and the keyword arguments of the constructor
+        """
+
+        return (self._filename,), {'use_native': self._use_native}
+
+    @property
+    def native(self):
+        return self._native
+
+    def index_frames(self):
+        """Index the frames of the trajectory.
+
+        The offsets and the times of the frames are read from the frame headers only and cached in the sidecar index
+        of the trajectory so that the next opening does not have to scan the file again. If the trajectory has been
+        appended to, only the new frames are scanned.
+        """
+
+        index = TrajectoryIndex.load(self._filename)
+        if index is None or 'frame_starts' not in index:
+            index = TrajectoryIndex(self._filename,
+                                    times=np.empty(0, dtype=np.float64),
+                                    frame_starts=np.empty(0, dtype=np.int64))
+
+        if not index.is_complete:
+            frame_starts, times, end_offset = scan_xtc_frames(self._filename, index.end_offset)
+            if len(times) or end_offset != index.end_offset:
+                index.extend(end_offset, times=times, frame_starts=frame_starts)
+                index.save()
+
+        # The index also stores the per-frame properties computed during the full passes over the trajectory
+        self._index = index
+
+        self._times = index['times']
+        self._n_frames = len(self._times)
+
+        # The boundaries of the frames in the file
+        self._frame_offsets = np.append(index['frame_starts'], index.end_offset)
+
+        if self._native:
+            self._fin = open(self._filename, 'rb')
+
+    def frame_bytes(self, frame):
+        """Return the bytes of a frame.
+
+        Args:
+            frame (int): the frame
+
+        Returns:
+            numpy.ndarray: the uint8 view on the bytes of the frame
+        """
+
+        frame = range(self._n_frames)[frame]
+
+        return self._data[self._frame_offsets[frame]:self._frame_offsets[frame + 1]]
+
+    def decode(self, frame, out=None, n_decode=-1):
+        """Decode the coordinates of a frame with the native decoder.
+
+        Args:
+            frame (int): the frame
+            out (numpy.ndarray): the (n_atoms, 3) C-contiguous float32 output array. If None, the internal buffer of the
+                reader is used.
+            n_decode (int): the number of atoms to decode from the first one. If -1, all the atoms are decoded.
+
+        Returns:
+            numpy.ndarray: the output array
+        """
+
+        if out is None:
+            out = self._buffer
+
+        try:
+            decode_frame(self.frame_bytes(frame), out, None, n_decode)
+        except XTCDecodingError as error:
+            raise InvalidFileError('Could not decode frame {} of {}: {}'.format(frame, self._filename, error))
+
+        return out
+
+    def _read_frame(self, frame, indices=None, dtype=np.float64, copy=True):
         """Read the coordinates at a given frame.
 
         Args:
             frame (int): the selected frame
+            indices (list of int): the indexes of the atoms to read. If None, all the atoms are read.
+            dtype (numpy.dtype): the floating point type of the coordinates
+            copy (bool): if False and dtype is float32, the decoding buffer of the reader (or the positions buffer of the
+                MDAnalysis timestep) is returned for a full frame. It is overwritten by the next read.
         """
 
-        return self._universe.trajectory[frame].positions.astype(np.float)
+        if self._native:
+            if indices is not None:
+                # The atoms are compressed sequentially, the atoms after the last selected one are not decoded
+                indices = self.check_indices(indices)
+                n_decode = int(indices.max()) + 1 if len(indices) else 0
+                return self.decode(frame, n_decode=n_decode)[indices].astype(dtype, copy=False)
+            if copy or np.dtype(dtype) != np.float32:
+                return self.decode(frame, out=np.empty((self._n_atoms, 3), dtype=np.float32)).astype(dtype, copy=False)
+            return self.decode(frame)
+
+        return super(XTCReader, self)._read_frame(frame, indices, dtype, copy)
 
-    def read_pbc(self, frame):
+    def _read_pbc(self, frame):
         """Read the bounding box at a given frame.
 
         Args:
             frame (int): the selected frame
         """
 
-        return self._universe.trajectory[frame].triclinic_dimensions.astype(np.float)
+        if self._native:
+            offset = self._frame_offsets[range(self._n_frames)[frame]] + 16
+            return np.frombuffer(self._data, dtype='>f4', count=9, offset=offset).reshape(3, 3)*np.float32(NM_TO_ANGSTROM)
+
+        return super(XTCReader, self)._read_pbc(frame)
+
+    def _read_frames(self, frames, indices=None, out=None, dtype=np.float64):
+        """Read the coordinates at several frames.
+
+        Args:
+            frames (list of int): the selected frames
+            indices (list of int): the indexes of the atoms to read. If None, all the atoms are read.
+            out (numpy.ndarray): the (n_selected_frames, n_selected_atoms, 3) output array. If None, a new array is
+                allocated.
+            dtype (numpy.dtype): the floating point type of the allocated output array
+
+        Returns:
+            numpy.ndarray: the coordinates
+        """
+
+        if not self._native:
+            return super(XTCReader, self)._read_frames(frames, indices, out, dtype)
+
+        if indices is not None:
+            indices = self.check_indices(indices)
+
+        if out is None:
+            n_selected_atoms = self._n_atoms if indices is None else len(indices)
+            out = np.empty((len(frames), n_selected_atoms, 3), dtype=dtype)
+
+        n_decode = -1 if indices is None else (int(indices.max()) + 1 if len(indices) else 0)
+        for i, frame in enumerate(frames):
+            # Full frames are decoded straight into a float32 output
+            if indices is None and out.dtype == np.float32 and out[i].flags.c_contiguous:
+                self.decode(frame, out=out[i])
+            else:
+                coords = self.decode(frame, n_decode=n_decode)
+                out[i] = coords if indices is None else coords[indices]
+
+        return out
+
+    def _read_pbcs(self, frames, out=None, dtype=np.float64):
+        """Read the bounding boxes at several frames.
+
+        Args:
+            frames (list of int): the selected frames
+            out (numpy.ndarray): the (n_selected_frames, 3, 3) output array. If None, a new array is allocated.
+            dtype (numpy.dtype): the floating point type of the allocated output array
+
+        Returns:
+            numpy.ndarray: the bounding boxes
+        """
+
+        if not self._native:
+            return super(XTCReader, self)._read_pbcs(frames, out, dtype)
+
+        if out is None:
+            out = np.empty((len(frames), 3, 3), dtype=dtype)
+
+        for i, frame in enumerate(frames):
+            out[i] = self._read_pbc(frame)
+
+        return out
+
+    def _iter_frames(self, frames, indices, read_coords, read_pbc, dtype=np.float64, copy=True):
+        """Iterate sequentially over a range of frames.
+
+        With the native decoder, the frames are read by blocks. Otherwise they are streamed by MDAnalysis.
+
+        Args:
+            frames (range): the frames
+            indices (numpy.ndarray): the indexes of the atoms to read. If None, all the atoms are read.
+            read_coords (bool): whether the coordinates should be read
+            read_pbc (bool): whether the bounding boxes should be read
+            dtype (numpy.dtype): the floating point type of the coordinates. The bounding boxes are always float64.
+            copy (bool): whether the reader must yield new arrays rather than its internal buffers
+
+        Returns:
+            generator: the frame, the coordinates (or None) and the bounding box (or None) of each frame
+        """
+
+        if self._native:
+            return IReader._iter_frames(self, frames, indices, read_coords, read_pbc, dtype, copy)
 
+        return super(XTCReader, self)._iter_frames(frames, indices, read_coords, read_pbc, dtype, copy)
 
 if __name__ == '__main__':
 
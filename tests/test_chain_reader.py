@@ -0,0 +1,63 @@
+import os
+import shutil
+
+import numpy as np
+
+import pytest
+
+from waterstay.readers.chain_reader import ChainReader, reader_arguments
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), os.pardir, 'data')
+
+
+@pytest.fixture
+def chain(tmp_path):
+    """Return a chain of two copies of the test trajectory, the duplicates being kept.
+    """
+
+    filenames = []
+    for name in ('part1.gro', 'part2.gro'):
+        filename = str(tmp_path / name)
+        shutil.copy(os.path.join(DATA_DIR, 'frames.gro'), filename)
+        filenames.append(filename)
+
+    return ChainReader(filenames, remove_duplicates=False)
+
+
+@pytest.mark.parametrize('start, stop, step', [(0, None, 1),
+                                               (0, None, 2),
+                                               (None, None, -1),
+                                               (None, None, -2),
+                                               (4, 1, -1),
+                                               (5, 0, -3)])
+def test_iter_frames_across_parts(chain, start, stop, step):
+
+    frames = range(chain.n_frames)[slice(start, stop, step)]
+
+    start = frames.start
+    stop = None if frames.stop < 0 else frames.stop
+
+    iterated = list(chain.iter_frames(start, stop, step, fields=('coords',)))
+
+    assert [frame for frame, _ in iterated] == list(frames)
+    for frame, coords in iterated:
+        np.testing.assert_array_equal(coords, chain.read_frame(frame))
+
+
+def test_filenames_identify_the_chain(chain):
+
+    single = ChainReader(chain.filenames[:1])
+
+    assert chain.filename == single.filename
+    assert chain.filenames != single.filenames
+
+
+def test_reader_arguments_are_filtered_per_reader():
+
+    from waterstay.readers.gro_reader import GroReader
+    from waterstay.readers.xtc_reader import XTCReader
+
+    kwargs = {'use_mmap': True, 'use_native': False}
+
+    assert reader_arguments(GroReader, kwargs) == {'use_mmap': True}
+    assert reader_arguments(XTCReader, kwargs) == {'use_native': False}
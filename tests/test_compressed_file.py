@@ -0,0 +1,98 @@
+import functools
+import gzip
+import io
+import lzma
+import os
+
+import numpy as np
+
+import pytest
+
+from waterstay.readers import ascii_reader, compressed_file
+from waterstay.readers.compressed_file import open_compressed
+from waterstay.readers.gro_reader import GroReader
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), os.pardir, 'data')
+
+# A checkpoint interval much smaller than the test trajectory so that the decompressor has several checkpoints
+CHECKPOINT_INTERVAL = 64*1024
+
+
+@pytest.fixture
+def data():
+    with open(os.path.join(DATA_DIR, 'frames.gro'), 'rb') as fin:
+        return fin.read()
+
+
+@pytest.fixture(autouse=True)
+def small_blocks(monkeypatch):
+    """Feed the decompressor with small blocks and keep a small backward window so that the checkpoints and the
+    restarts of the decompression are exercised on the small test trajectory.
+    """
+
+    monkeypatch.setattr(compressed_file, 'INPUT_BLOCK_SIZE', 4096)
+    monkeypatch.setattr(compressed_file, 'BACKWARD_WINDOW', 16*1024)
+
+
+def compress(filename, data, fmt, n_members=1):
+    """Write a compressed file made of several members (gzip) or streams (xz) of about the same size.
+    """
+
+    compress_member = gzip.compress if fmt == 'gzip' else lzma.compress
+
+    bounds = np.linspace(0, len(data), n_members + 1).astype(int)
+
+    with open(filename, 'wb') as fout:
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            fout.write(compress_member(data[start:end]))
+
+
+@pytest.mark.parametrize('fmt, n_members', [('gzip', 1), ('gzip', 3), ('xz', 1), ('xz', 2)])
+def test_random_seeks(tmp_path, data, fmt, n_members):
+
+    filename = str(tmp_path / 'frames.gro.{}'.format('gz' if fmt == 'gzip' else 'xz'))
+    compress(filename, data, fmt, n_members)
+
+    stream = open_compressed(filename, fmt, checkpoint_interval=CHECKPOINT_INTERVAL)
+
+    assert stream.seek(0, io.SEEK_END) == len(data)
+    if fmt == 'gzip':
+        assert stream.raw.n_checkpoints > 2
+
+    # Backward out of the buffer, forward past a checkpoint, within the buffer and across the members
+    random = np.random.RandomState(0)
+    offsets = [len(data) - 100, 10, len(data)//2, len(data)//2 - 5, 3*len(data)//4, 0]
+    offsets += random.randint(0, len(data), 20).tolist()
+    for offset in offsets:
+        stream.seek(offset)
+        assert stream.read(5000) == data[offset:offset + 5000]
+
+    stream.seek(len(data))
+    assert stream.read(10) == b''
+
+    stream.close()
+
+
+@pytest.mark.parametrize('n_members', [1, 3])
+def test_read_frames_out_of_order(tmp_path, data, monkeypatch, n_members):
+
+    monkeypatch.setattr(ascii_reader,
+                        'open_compressed',
+                        functools.partial(open_compressed, checkpoint_interval=CHECKPOINT_INTERVAL))
+
+    filename = str(tmp_path / 'frames.gro.gz')
+    compress(filename, data, 'gzip', n_members)
+
+    reader = GroReader(filename)
+    reference = GroReader(os.path.join(DATA_DIR, 'frames.gro'))
+
+    assert reader.compression == 'gzip'
+    assert reader.n_frames == reference.n_frames
+    np.testing.assert_array_equal(reader.times, reference.times)
+
+    for frame in [2, 0, 1, 2, 1, 0, 0, 2]:
+        np.testing.assert_array_equal(reader.read_frame(frame), reference.read_frame(frame))
+        np.testing.assert_array_equal(reader.read_pbc(frame), reference.read_pbc(frame))
+
+    np.testing.assert_array_equal(reader.read_frames([2, 0, 1], indices=[0, 5, 8000]),
+                                  reference.read_frames([2, 0, 1], indices=[0, 5, 8000]))
@@ -0,0 +1,114 @@
+import fnmatch
+import os
+
+import numpy as np
+
+import pytest
+
+from waterstay.readers.gro_reader import GroReader
+from waterstay.readers.selection import InvalidSelectionError, parse_range
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), os.pardir, 'data')
+
+
+@pytest.fixture(scope='module')
+def reader():
+    return GroReader(os.path.join(DATA_DIR, 'frames.gro'))
+
+
+@pytest.fixture(scope='module')
+def atoms(reader):
+    """Return the per-atom residue names, atom names and residue ids as plain arrays.
+    """
+
+    return {'resname': np.array(list(reader.residue_names)),
+            'name': np.array(list(reader.atom_names)),
+            'resid': np.asarray(reader.residue_ids)}
+
+
+def scan(reader, residue_names, atom_names):
+    """Select the atoms one by one as get_atom_indexes used to do.
+    """
+
+    return [i for i, (residue_name, atom_name) in enumerate(zip(reader.residue_names, reader.atom_names))
+            if residue_name in residue_names and atom_name in atom_names]
+
+
+def matches(values, pattern):
+    return np.array([fnmatch.fnmatchcase(v, pattern) for v in values])
+
+
+def test_get_atom_indexes_matches_atom_scan(reader):
+
+    indexes = [i for molecule in reader.get_atom_indexes(['SOL'], ['OW', 'HW1']) for i in molecule]
+
+    assert sorted(indexes) == scan(reader, ['SOL'], ['OW', 'HW1'])
+
+
+def test_negated_wildcard(reader, atoms):
+
+    names = sorted(set(atoms['name'][atoms['resname'] == 'SOL']))
+    expected = scan(reader, ['SOL'], [name for name in names if not name.startswith('H')])
+
+    assert reader.selection.select_indexes('resname SOL and not name H*').tolist() == expected
+
+
+def test_ranges_and_index(reader, atoms):
+
+    expected = ((atoms['resid'] >= 1) & (atoms['resid'] <= 3))
+    expected[0] = True
+
+    np.testing.assert_array_equal(reader.select('resid 1-3 or index 0'), expected)
+    np.testing.assert_array_equal(reader.select('resid 1:3 or index 0'), expected)
+
+
+def test_precedence_and_parentheses(reader, atoms):
+
+    protein = atoms['resname'] != 'SOL'
+    hydrogen = matches(atoms['name'], 'H*')
+    first = atoms['resid'] == 1
+
+    # not binds tighter than and, which binds tighter than or
+    np.testing.assert_array_equal(reader.select('not resname SOL and name H* or resid 1'),
+                                  (protein & hydrogen) | first)
+    np.testing.assert_array_equal(reader.select('not resname SOL and (name H* or resid 1)'),
+                                  protein & (hydrogen | first))
+    np.testing.assert_array_equal(reader.select('not (resname SOL or name H*)'), protein & ~hydrogen)
+
+
+def test_all_and_none(reader):
+
+    assert reader.select('all').all()
+    assert not reader.select('none').any()
+    assert not reader.select('all and not all').any()
+
+
+def test_masks_are_read_only(reader):
+
+    with pytest.raises(ValueError):
+        reader.select('resname SOL')[0] = False
+
+
+@pytest.mark.parametrize('expression', ['',
+                                        '   ',
+                                        '(resname SOL',
+                                        'resname SOL)',
+                                        'resname',
+                                        'resname SOL and',
+                                        'foo SOL',
+                                        'resname SOL xor name OW',
+                                        'resid a-b'])
+def test_invalid_expressions(reader, expression):
+
+    with pytest.raises(InvalidSelectionError):
+        reader.select(expression)
+
+
+def test_parse_range():
+
+    assert parse_range('5') == (5, 5)
+    assert parse_range('1-10') == (1, 10)
+    assert parse_range('1:10') == (1, 10)
+
+    with pytest.raises(InvalidSelectionError):
+        parse_range('1-')
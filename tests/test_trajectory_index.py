@@ -0,0 +1,148 @@
+import os
+
+import numpy as np
+
+import pytest
+
+from waterstay.readers import trajectory_index
+from waterstay.readers.gro_reader import GroReader
+from waterstay.readers.trajectory_index import TrajectoryIndex
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), os.pardir, 'data')
+
+
+def read_frames():
+    """Return the frames of the test trajectory as a list of bytes, the title line included.
+    """
+
+    with open(os.path.join(DATA_DIR, 'frames.gro'), 'rb') as fin:
+        lines = fin.readlines()
+
+    frame_length = int(lines[1]) + 3
+
+    return [b''.join(lines[i:i + frame_length]) for i in range(0, len(lines), frame_length)]
+
+
+@pytest.fixture
+def frames():
+    return read_frames()
+
+
+@pytest.fixture
+def scans(monkeypatch):
+    """Record the starting offsets of the scans of the trajectory.
+    """
+
+    starts = []
+    scan_frames = GroReader.scan_frames
+
+    def spy(self, start, n_workers=1):
+        starts.append(start)
+        return scan_frames(self, start, n_workers)
+
+    monkeypatch.setattr(GroReader, 'scan_frames', spy)
+
+    return starts
+
+
+def write(filename, data, mode='wb'):
+    with open(filename, mode) as fout:
+        fout.write(data)
+
+
+def test_reuse_after_append(tmp_path, frames, scans):
+
+    filename = str(tmp_path / 'frames.gro')
+    write(filename, b''.join(frames[:2]))
+
+    reader = GroReader(filename)
+    assert reader.n_frames == 2
+    assert os.path.exists(TrajectoryIndex.index_paths(filename)[0])
+
+    # An untouched trajectory is not scanned again
+    assert GroReader(filename).n_frames == 2
+    assert scans == [0]
+
+    write(filename, frames[2], 'ab')
+
+    reader = GroReader(filename)
+    assert reader.n_frames == 3
+    # Only the appended frame has been scanned
+    assert scans == [0, len(frames[0]) + len(frames[1])]
+
+    reference = GroReader(os.path.join(DATA_DIR, 'frames.gro'))
+    np.testing.assert_array_equal(reader.times, reference.times)
+    np.testing.assert_array_equal(reader.read_frame(2), reference.read_frame(2))
+
+
+def test_truncated_trailing_frame_is_ignored(tmp_path, frames, scans):
+
+    filename = str(tmp_path / 'frames.gro')
+    half = len(frames[2])//2
+    write(filename, frames[0] + frames[1] + frames[2][:half])
+
+    reader = GroReader(filename)
+    assert reader.n_frames == 2
+
+    # Once completed, the trailing frame is indexed starting from the end of the last complete frame
+    write(filename, frames[2][half:], 'ab')
+
+    reader = GroReader(filename)
+    assert reader.n_frames == 3
+    assert scans == [0, len(frames[0]) + len(frames[1])]
+
+
+def test_rebuild_after_rewrite(tmp_path, frames, scans):
+
+    filename = str(tmp_path / 'frames.gro')
+    write(filename, b''.join(frames))
+
+    assert GroReader(filename).times[1] == 10.0
+
+    # Rewrite the time of the second frame with a field of the same width
+    data = b''.join(frames).replace(b't=  10.00000', b't=  15.00000')
+    assert len(data) == os.path.getsize(filename)
+    write(filename, data)
+    stat = os.stat(filename)
+    os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+
+    reader = GroReader(filename)
+    assert reader.n_frames == 3
+    assert reader.times[1] == 15.0
+    assert scans == [0, 0]
+
+
+def test_home_directory_fallback(tmp_path, frames, monkeypatch):
+
+    trajectory_dir = tmp_path / 'trajectories'
+    trajectory_dir.mkdir()
+    home_dir = tmp_path / 'home'
+    home_dir.mkdir()
+    monkeypatch.setenv('HOME', str(home_dir))
+
+    filename = str(trajectory_dir / 'frames.gro')
+    write(filename, b''.join(frames))
+
+    local_path, home_path = TrajectoryIndex.index_paths(filename)
+    assert home_path.startswith(str(home_dir))
+
+    # Make the directory of the trajectory unwritable. Changing its permissions would not do when running as root.
+    mkstemp = trajectory_index.tempfile.mkstemp
+
+    def unwritable_mkstemp(dir=None, **kwargs):
+        if os.path.abspath(dir) == str(trajectory_dir):
+            raise PermissionError('Permission denied: {}'.format(dir))
+        return mkstemp(dir=dir, **kwargs)
+
+    monkeypatch.setattr(trajectory_index.tempfile, 'mkstemp', unwritable_mkstemp)
+
+    reader = GroReader(filename)
+    assert reader.n_frames == 3
+
+    assert not os.path.exists(local_path)
+    assert os.path.exists(home_path)
+    assert os.listdir(str(trajectory_dir)) == ['frames.gro']
+
+    index = TrajectoryIndex.load(filename)
+    assert index is not None
+    np.testing.assert_array_equal(index['times'], reader.times)